@@ -1,9 +1,21 @@
 import streamlit as st
-import pandas as pd
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import asyncio
 import sys
-from scraper import get_train_route, scan_vacancies
-from solver import process_vacancies, find_all_seat_chains
+import uuid
+import logging
+import threading
+from scraper import get_train_route, scan_vacancies, ScanResult, ScanCancelled
+from solver import process_vacancies, find_all_seat_chains, best_partial_plan, ScanGoal
+from debug_sink import get_debug_sink, build_scan_record
+from vacancy_history import get_vacancy_history
+from scan_store import STORE, scan_key
+from metrics import span
+from profiling import get_memory_profiler
+from watch import app_watcher
+from prefetch import get_scan_prefetcher
+from utils import generate_ticket_pdf, render_visual_timeline, render_route_map, render_availability_profile
 
 # Fix for Windows Event Loop Policy (NotImplementedError)
 if sys.platform.startswith("win"):
@@ -11,24 +23,82 @@ if sys.platform.startswith("win"):
 
 st.set_page_config(page_title="Train Surfer", page_icon="🚆", layout="wide")
 
+# Opt-in per-stage memory profiling (MEMORY_PROFILE_DIR)
+get_memory_profiler()
+
 # --- Session State Management ---
-if 'station_list' not in st.session_state:
-    st.session_state.station_list = []
-if 'station_map' not in st.session_state:
-    st.session_state.station_map = {}
-if 'raw_vacancies' not in st.session_state:
-    st.session_state.raw_vacancies = []
+# Routes and scans live once in the process-wide STORE; sessions only keep their keys.
+if 'session_token' not in st.session_state:
+    st.session_state.session_token = uuid.uuid4().hex
+if 'route_key' not in st.session_state:
+    st.session_state.route_key = None
+if 'scan_key' not in st.session_state:
+    st.session_state.scan_key = None
 if 'route_fetched' not in st.session_state:
     st.session_state.route_fetched = False
+if 'watcher' not in st.session_state:
+    st.session_state.watcher = None
+# Cancel event of this session's running scan; set when a newer scan supersedes it
+if 'scan_cancel' not in st.session_state:
+    st.session_state.scan_cancel = None
+
+def hold_store_key(name, key):
+    """
+    Points the session at a new STORE key and releases the one it replaces.
+    """
+    old_key = st.session_state[name]
+    if old_key is not None and old_key != key:
+        STORE.release(old_key, st.session_state.session_token)
+    st.session_state[name] = key
+
+def stop_watching():
+    if st.session_state.watcher is not None:
+        st.session_state.watcher.stop()
+        st.session_state.watcher = None
+
+def session_alive():
+    """
+    A check, safe to call from other threads, of whether this browser session is still
+    connected; always True outside a served app.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is None or not Runtime.exists():
+        return lambda: True
+    session_id = ctx.session_id
+    return lambda: Runtime.instance().is_active_session(session_id)
+
+@st.fragment(run_every=10)
+def watch_feed(watcher, diffs, train_no, journey_date, start_code):
+    """
+    Change feed of a running chart watcher, refreshed on its own without rerunning the page.
+    """
+    state = "watching" if watcher.running else "stopped"
+    error = f" Last poll failed: {watcher.error}" if watcher.error else ""
+    st.caption(f"{state.capitalize()}: {watcher.polls} polls, {len(diffs)} changes.{error}")
+    for diff in reversed(diffs[-10:]):
+        lines = [f"**{diff['ts']}** · coaches {', '.join(diff['changed_coaches'])}"]
+        lines += [f"- 🟢 {v['Coach']}-{v['Berth']} ({v['Type']}) {v['From']} ➡️ {v['To']}" for v in diff['added']]
+        lines += [f"- 🔴 {v['Coach']}-{v['Berth']} ({v['Type']}) {v['From']} ➡️ {v['To']}" for v in diff['removed']]
+        st.markdown("\n".join(lines))
+    if diffs and st.button("Show latest chart in results"):
+        # Only this session asked for the watcher's chart, so it does not replace the shared scan
+        hold_store_key(
+            'scan_key',
+            STORE.put_scan(train_no, journey_date, start_code, watcher.latest, st.session_state.session_token,
+                           private=True)
+        )
+        st.rerun()
+
+route = STORE.get(st.session_state.route_key, st.session_state.session_token) if st.session_state.route_key else None
+if st.session_state.route_fetched and route is None:
+    # Evicted from the shared store while this session was idle
+    st.session_state.route_fetched = False
 
 # --- UI Header ---
 st.title("🚆 Train Surfer")
 st.markdown("### Maximize Comfort. Minimize Hassle.")
 st.markdown("Find the longest vacant seat segments or the optimal 'seat hopping' strategy for your journey.")
 
-# --- Sidebar: Phase 1 (Route Discovery) ---
-from utils import generate_ticket_pdf, render_visual_timeline, render_route_map
-
 # --- Sidebar: Phase 1 (Route Discovery) ---
 with st.sidebar:
     st.header("1. Journey Details")
@@ -44,10 +114,22 @@ with st.sidebar:
             try:
                 stations = get_train_route(train_no, headless=headless_mode)
                 if stations:
-                    st.session_state.station_list = stations
-                    st.session_state.station_map = {s['code']: s['dist'] for s in stations}
+                    hold_store_key('route_key', STORE.put_route(train_no, stations, st.session_state.session_token))
+                    route = STORE.get(st.session_state.route_key)
                     st.session_state.route_fetched = True
                     st.success(f"Route Loaded! {len(stations)} Stations found.")
+
+                    # Most users go on to "Find Seats" from the first station: start that scan now
+                    prefetcher = get_scan_prefetcher() if headless_mode else None
+                    if prefetcher:
+                        first_code = stations[0]["code"]
+                        prefetcher.release(st.session_state.session_token)
+                        earlier = STORE.get(scan_key(train_no, journey_date, first_code))
+                        prefetcher.start(
+                            train_no, journey_date, first_code, st.session_state.session_token,
+                            previous=earlier.raw_vacancies if earlier else None,
+                            capture_payloads=get_debug_sink() is not None
+                        )
                 else:
                     st.error("Failed to fetch route. Check logs.")
             except Exception as e:
@@ -75,6 +157,20 @@ with st.sidebar:
         index=0
     )
 
+    st.markdown("---")
+    st.header("⚡ Scan Goal")
+    goal_option = st.radio(
+        "Stop scanning once there is:",
+        ["Nothing (scan every coach)", "A single seat covering...", "A chain with at most..."],
+        index=0,
+        help="Coaches likeliest to have vacancies are scanned first"
+    )
+    goal_coverage = goal_swaps = None
+    if goal_option == "A single seat covering...":
+        goal_coverage = st.slider("Minimum coverage (%)", 10, 100, 80, step=5)
+    elif goal_option == "A chain with at most...":
+        goal_swaps = st.number_input("Maximum swaps", min_value=0, max_value=5, value=1)
+
     st.markdown("---")
     st.markdown("### ℹ️ How it Works")
     with st.expander("See Technical Details"):
@@ -96,23 +192,36 @@ with st.sidebar:
 if st.session_state.route_fetched:
     st.header("2. Select Your Segment")
     
-    # Create formatted options for dropdowns: "SBC - KSR BENGALURU"
-    station_options = [f"{s['code']} - {s['name']}" for s in st.session_state.station_list]
+    # Options are route positions, shown as "SBC - KSR BENGALURU"
+    route_index = route.index
+    station_positions = range(len(route_index))
     
     col1, col2 = st.columns(2)
     with col1:
-        start_option = st.selectbox("Boarding Station", station_options)
+        start_pos = st.selectbox("Boarding Station", station_positions, format_func=route_index.label)
     with col2:
-        end_option = st.selectbox("Destination Station", station_options, index=len(station_options)-1)
+        end_pos = st.selectbox("Destination Station", station_positions, index=len(route_index)-1, format_func=route_index.label)
         
-    start_code = start_option.split(" - ")[0]
-    end_code = end_option.split(" - ")[0]
+    # Codes key the chart (IRCTC charts are per boarding code); the journey itself is
+    # solved by position, so picking the second stop of a loop route's station counts
+    start_code = route_index.codes[start_pos]
+    end_code = route_index.codes[end_pos]
+
+    # A prefetch for another boarding station (or train/date) is no longer wanted
+    prefetcher = get_scan_prefetcher()
+    if prefetcher:
+        prefetcher.release(st.session_state.session_token, keep=scan_key(train_no, journey_date, start_code))
     
     # Show Route Map Context
     with st.expander("📍 Route Context: Full Station List", expanded=False):
-        st.markdown(render_route_map(st.session_state.station_list, start_code, end_code), unsafe_allow_html=True)
+        st.markdown(render_route_map(route.index, start_pos, end_pos), unsafe_allow_html=True)
     
     if st.button("Find Seats"):
+        # A scan from an earlier click may still hold a browser; only the newest one counts
+        if st.session_state.scan_cancel is not None:
+            st.session_state.scan_cancel.set()
+        cancel = st.session_state.scan_cancel = threading.Event()
+
         st.markdown("### 🔍 Scanning for Vacancies...")
         
         # Progress Bar
@@ -124,48 +233,167 @@ if st.session_state.route_fetched:
             progress_bar.progress(progress)
             status_text.text(f"Scanning Coach {coach_name}... ({current}/{total})")
 
+        # Raw payloads are only kept when the debug sink is enabled for this environment
+        debug_sink = get_debug_sink()
+        payloads = [] if debug_sink else None
+        
+        def record_payload(coach_name, data):
+            payloads.append({"coach": coach_name, "data": data})
+
+        # Coaches this scan cannot fetch fall back to the last scan of the same chart, marked stale
+        previous_scan = STORE.get(scan_key(train_no, journey_date, start_code))
+
+        goal = coach_priority = None
+        if goal_coverage is not None or goal_swaps is not None:
+            goal = ScanGoal(
+                route.index, start_pos, end_pos,
+                min_coverage_pct=goal_coverage, max_swaps=goal_swaps,
+                berth_preferences=berth_prefs, ac_only=filter_ac
+            )
+            # Order coaches by what earlier scans of this train found, when there is history
+            history = get_vacancy_history()
+            if history:
+                try:
+                    coach_priority = history.coach_vacancy_counts(train_no, boarding=start_code)
+                except Exception as e:
+                    logging.warning(f"Could not read vacancy history for {train_no}: {e}")
+
         try:
-            # Scan vacancies
-            raw_data = scan_vacancies(
-                train_no, 
-                journey_date, 
-                start_code, 
-                headless=headless_mode,
-                progress_callback=update_progress
+            raw_data = None
+            # Attach to the scan prefetched when the route loaded, if it is for this chart
+            prefetch = prefetcher.attach(train_no, journey_date, start_code, st.session_state.session_token) \
+                if prefetcher and headless_mode else None
+            if prefetch is not None:
+                status_text.text("Picking up the scan started when the route loaded...")
+                while not prefetch.done.wait(0.2):
+                    if cancel.is_set():
+                        # Superseded; the newer run attaches to the same prefetch itself
+                        raise ScanCancelled("Superseded while waiting for the prefetch")
+                    if prefetch.progress:
+                        update_progress(*prefetch.progress)
+                prefetcher.take(prefetch, st.session_state.session_token)
+                if prefetch.usable:
+                    raw_data = prefetch.result
+                    if prefetch.payloads is not None:
+                        payloads = prefetch.payloads
+
+            if raw_data is None:
+                if prefetcher:
+                    prefetcher.preempt(st.session_state.session_token)
+                # Scan vacancies
+                raw_data = scan_vacancies(
+                    train_no, 
+                    journey_date, 
+                    start_code, 
+                    headless=headless_mode,
+                    progress_callback=update_progress,
+                    payload_callback=record_payload if debug_sink else None,
+                    previous=previous_scan.raw_vacancies if previous_scan else None,
+                    goal=goal,
+                    coach_priority=coach_priority,
+                    cancel=cancel
+                )
+            # A scan stopped at its goal skipped coaches; it must not replace the full shared scan
+            hold_store_key(
+                'scan_key',
+                STORE.put_scan(train_no, journey_date, start_code, raw_data, st.session_state.session_token,
+                               private=bool(raw_data.skipped))
             )
-            st.session_state.raw_vacancies = raw_data
             
-            # Dump to JSON for debugging
-            import json
-            with open("vacancies_debug.json", "w") as f:
-                json.dump(raw_data, f, indent=4)
-            st.toast("Debug logs saved to vacancies_debug.json")
+            if debug_sink:
+                scan_id = debug_sink.submit(
+                    build_scan_record(
+                        train_no, journey_date, start_code, raw_data, payloads,
+                        stations=[dict(s) for s in route.station_list]
+                    )
+                )
+                st.toast(f"Debug scan queued as {scan_id}")
+
+            # Opt-in time series of every scan (VACANCY_HISTORY_DIR)
+            history = get_vacancy_history()
+            if history:
+                history.record(train_no, journey_date, start_code, raw_data)
             
             status_text.text("Scanning Complete!")
             progress_bar.progress(100)
             
             if not raw_data:
                 st.warning("No vacancies found on this train.")
-            else:
+            elif raw_data.skipped:
+                st.success(
+                    f"Found {goal.describe()} after {len(raw_data.coaches) - len(raw_data.skipped)} coaches "
+                    f"({len(raw_data)} vacant segments). Skipped {len(raw_data.skipped)} coaches."
+                )
+            elif raw_data.complete:
                 st.success(f"Scan Complete! Found {len(raw_data)} vacant segments.")
+            else:
+                st.success(f"Scan finished with gaps. Found {len(raw_data)} vacant segments.")
+        except ScanCancelled:
+            st.warning("Scan cancelled.")
         except Exception as e:
             st.error(f"Scanning failed: {e}")
+        finally:
+            # Also reached when Streamlit stops this run (tab closed, another click), so
+            # the scan's browser page is closed instead of running to the last coach
+            cancel.set()
 
     # --- Phase 4: Results (Dynamic) ---
     # This runs on every rerun, so filters apply immediately
-    if st.session_state.raw_vacancies:
+    scan = STORE.get(st.session_state.scan_key, st.session_state.session_token) if st.session_state.scan_key else None
+    if scan and scan.skipped:
+        st.info(
+            f"⚡ Stopped at the scan goal: {len(scan.skipped)} of {len(scan.coaches)} coaches were not scanned "
+            f"({', '.join(scan.skipped)}). Choose \"Nothing\" under Scan Goal for a full scan."
+        )
+    if scan and not scan.complete:
+        if scan.missing:
+            st.warning(
+                f"⚠️ Incomplete scan: no data for {len(scan.missing)} of {len(scan.coaches)} coaches "
+                f"({', '.join(scan.missing)}). Seats in these coaches are not shown."
+            )
+        if scan.stale:
+            st.info(f"ℹ️ Coaches {', '.join(scan.stale)} could not be refreshed; showing their vacancies from the previous scan.")
+
+    # --- Watch Mode: poll this chart and list only what changed ---
+    watch_target = (train_no, journey_date, start_code)
+    if st.session_state.watcher is not None and st.session_state.get('watch_target') != watch_target:
+        stop_watching()
+    if scan and st.toggle("👀 Watch this chart for changes", key="watch_enabled",
+                          help="Rescans in the background and lists berths freed or taken since this scan"):
+        if st.session_state.watcher is None:
+            # The background thread only appends to this list; it never touches session state
+            st.session_state.watch_diffs = []
+            st.session_state.watch_target = watch_target
+            st.session_state.watcher = app_watcher(
+                train_no, journey_date, start_code, st.session_state.watch_diffs.append,
+                baseline=ScanResult([v.to_dict() for v in scan.raw_vacancies], coaches=scan.coaches),
+                headless=headless_mode, alive=session_alive()
+            )
+        watch_feed(st.session_state.watcher, st.session_state.watch_diffs, train_no, journey_date, start_code)
+    elif st.session_state.watcher is not None:
+        stop_watching()
+
+    if scan and scan.raw_vacancies:
         st.divider()
         st.header("3. Optimization Results")
+
+        # Route-wide, before any filters: where along the train seats free up
+        with st.expander("📊 Free Berths Along the Route", expanded=False):
+            st.markdown(
+                render_availability_profile(scan.raw_vacancies, route.index, start_pos, end_pos),
+                unsafe_allow_html=True
+            )
         
         # Process data with Filters
-        processed_data = process_vacancies(
-            st.session_state.raw_vacancies, 
-            st.session_state.station_map, 
-            start_code, 
-            end_code,
-            berth_preferences=berth_prefs,
-            ac_only=filter_ac
-        )
+        with span("process_vacancies", op="solve", train_no=train_no):
+            processed_data = process_vacancies(
+                scan.raw_vacancies, 
+                route.index, 
+                start_pos, 
+                end_pos,
+                berth_preferences=berth_prefs,
+                ac_only=filter_ac
+            )
         
         if not processed_data:
             st.warning("No vacancies found matching your Comfort Filters.")
@@ -221,7 +449,8 @@ if st.session_state.route_fetched:
                 st.subheader("🔗 Hacker Chain")
                 
                 # Find ALL valid chains
-                all_chains = find_all_seat_chains(processed_data, st.session_state.station_map, start_code, end_code)
+                with span("find_all_seat_chains", op="solve", train_no=train_no):
+                    all_chains = find_all_seat_chains(processed_data, route.index, start_pos, end_pos)
                 
                 if all_chains:
                     # Initialize Chain Selection State
@@ -237,7 +466,7 @@ if st.session_state.route_fetched:
                     
                     # Visual Timeline (Now with Intermediates)
                     st.markdown(
-                        render_visual_timeline(selected_chain, st.session_state.station_list), 
+                        render_visual_timeline(selected_chain, route.index), 
                         unsafe_allow_html=True
                     )
                     
@@ -269,6 +498,24 @@ if st.session_state.route_fetched:
                     st.error("Cannot cover the full journey even with seat hopping.")
                     selected_chain = [] # Empty chain
 
+                    # Next best thing: the most kilometres a few swaps can cover
+                    with span("best_partial_plan", op="solve", train_no=train_no):
+                        plan = best_partial_plan(processed_data, route.index, start_pos, end_pos)
+                    if plan and plan['legs']:
+                        st.warning(
+                            f"Best partial plan: **{plan['covered_km']} km ({plan['coverage_pct']}%)** "
+                            f"of the journey with {plan['swaps']} Swaps."
+                        )
+                        st.markdown(
+                            render_visual_timeline(plan['legs'], route.index),
+                            unsafe_allow_html=True
+                        )
+                        with st.expander("View Plan Details"):
+                            for idx, leg in enumerate(plan['legs']):
+                                st.write(f"**Leg {idx+1}:** {leg['From']} ➡️ {leg['To']} | **{leg['Coach']} - {leg['Berth']}**")
+                            for gap in plan['gaps']:
+                                st.write(f"⚠️ No seat from **{gap['From']}** to **{gap['To']}** ({gap['Km']} km)")
+
             # --- Central Download Section ---
             st.divider()
             st.subheader("🎟️ Download Ticket")
@@ -300,10 +547,14 @@ if st.session_state.route_fetched:
             
             # Download Button
             if download_chain:
-                ticket_pdf = generate_ticket_pdf(download_chain, train_no, journey_date, start_code, end_code)
+                def build_pdf():
+                    with span("pdf", op="render", train_no=train_no):
+                        return generate_ticket_pdf(download_chain, train_no, journey_date, start_code, end_code)
+
+                # Deferred: the PDF is only built when the button is clicked, not on every rerun
                 st.download_button(
                     label="⬇️ Download PDF Ticket",
-                    data=ticket_pdf,
+                    data=build_pdf,
                     file_name=file_name,
                     mime="application/pdf",
                     use_container_width=True
@@ -311,12 +562,15 @@ if st.session_state.route_fetched:
 
             # --- Data Table ---
             st.subheader("📊 All Options")
-            df = pd.DataFrame(processed_data)
-            display_cols = ["Coach", "Berth", "Type", "From", "To", "Distance", "Coverage_Pct"]
-            st.dataframe(
-                df[display_cols].style.background_gradient(subset=['Coverage_Pct'], cmap="Greens"),
-                use_container_width=True
-            )
+            # pandas (and matplotlib, via the gradient) load only once there is a table to show
+            with span("dataframe_render", op="render", train_no=train_no):
+                import pandas as pd
+                df = pd.DataFrame(processed_data)
+                display_cols = ["Coach", "Berth", "Type", "From", "To", "Distance", "Coverage_Pct"]
+                st.dataframe(
+                    df[display_cols].style.background_gradient(subset=['Coverage_Pct'], cmap="Greens"),
+                    use_container_width=True
+                )
 
 else:
     st.info("👈 Please fetch the train route from the sidebar to begin.")
@@ -0,0 +1,233 @@
+"""
+End-to-end benchmark suite for the scraper parsing, solver, renderers and PDF.
+
+    python benchmarks/bench.py run --out bench_results.json
+    python benchmarks/bench.py compare benchmarks/baselines/default.json bench_results.json
+    python benchmarks/bench.py run --out benchmarks/baselines/default.json   # refresh the baseline
+
+The full scan case drives the real scraper against a local mock_charts.py server
+and is skipped (not failed) when Chromium is not installed.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+
+# Add parent directory to path to import project modules
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from synthetic import make_train
+
+# name -> (coaches, berths per coach, stations)
+SIZES = {
+    "small": (5, 24, 20),
+    "medium": (15, 64, 60),
+    "large": (30, 80, 150)
+}
+
+DEFAULT_PREFS = ["LB", "L", "SL", "SU", "R", "P", "UB", "U", "MB", "M", "SM"]
+
+def timed(fn, runs, warmup=1, min_sample_ms=20):
+    """
+    Returns per-call timing stats in milliseconds over `runs` samples.
+    Fast functions are called several times per sample (like timeit's autorange),
+    so each sample takes at least min_sample_ms and timer noise stays small.
+    """
+    for _ in range(warmup):
+        fn()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if (time.perf_counter() - start) * 1000 >= min_sample_ms or number >= 10000:
+            break
+        number *= 2
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) * 1000 / number)
+    return {
+        "median_ms": round(statistics.median(samples), 4),
+        "min_ms": round(min(samples), 4),
+        "runs": runs,
+        "number": number
+    }
+
+def bench_size(size, runs):
+    from scraper import parse_coach_composition
+    from solver import process_vacancies, find_all_seat_chains
+    from scan_store import RouteEntry
+    import utils
+    from utils import render_route_map, render_visual_timeline, generate_ticket_pdf
+
+    n_coaches, n_berths, n_stations = SIZES[size]
+    train = make_train(n_coaches, n_berths, n_stations, seed=42)
+    route = RouteEntry(train["stations"])
+    start_code = route.station_list[0]["code"]
+    end_code = route.station_list[-1]["code"]
+
+    def cold(render, *args):
+        # Empty the render memo and what the renderers derived from the route, so nothing
+        # is reused between calls. The RouteIndex itself is built once when the route is
+        # stored, as in the app.
+        route.index._derived.clear()
+        utils._render_cache.clear()
+        return render(*args)
+
+    def parse_all():
+        out = []
+        for coach, payload in train["coaches"].items():
+            out.extend(parse_coach_composition(coach, payload))
+        return out
+
+    raw = parse_all()
+    processed = process_vacancies(raw, route.index, start_code, end_code, berth_preferences=DEFAULT_PREFS)
+    chains = find_all_seat_chains(processed, route.index, start_code, end_code)
+    chain = chains[0] if chains else sorted(processed, key=lambda v: v["Coverage_Km"], reverse=True)[:3]
+
+    results = {
+        "parse_coach_composition": timed(parse_all, runs),
+        "process_vacancies": timed(
+            lambda: process_vacancies(raw, route.index, start_code, end_code, berth_preferences=DEFAULT_PREFS),
+            runs
+        ),
+        "find_all_seat_chains": timed(
+            lambda: find_all_seat_chains(processed, route.index, start_code, end_code), runs
+        ),
+        "render_route_map_cold": timed(
+            lambda: cold(render_route_map, route.index, start_code, end_code), runs
+        ),
+        "render_route_map_warm": timed(lambda: render_route_map(route.index, start_code, end_code), runs),
+        "render_visual_timeline_cold": timed(
+            lambda: cold(render_visual_timeline, chain, route.index), runs
+        ),
+        "generate_ticket_pdf": timed(
+            lambda: generate_ticket_pdf(chain, "99999", "2025-12-15", start_code, end_code), runs
+        )
+    }
+    return {f"{size}/{case}": stats for case, stats in results.items()}, len(raw)
+
+def bench_full_scan(size, runs):
+    """
+    Full scan_vacancies run against a mock charts server holding a synthetic train.
+    """
+    import scraper
+    from mock_charts import MockChartsServer, synthetic_train
+
+    n_coaches, n_berths, n_stations = SIZES[size]
+    train = synthetic_train(f"99999:{n_coaches}x{n_berths}x{n_stations}", seed=42)
+    server = MockChartsServer({"99999": train}).start()
+    os.environ[scraper.CHARTS_URL_ENV] = server.url
+    try:
+        boarding = train["stations"][0]["code"]
+        found = scraper.scan_vacancies("99999", "2025-12-15", boarding)
+        if not found:
+            raise RuntimeError("scan returned no vacancies (is Chromium installed?)")
+        stats = timed(lambda: scraper.scan_vacancies("99999", "2025-12-15", boarding), runs, warmup=0, min_sample_ms=0)
+        stats["coach_requests"] = server.requests.get("coachComposition", 0)
+        return stats
+    finally:
+        server.stop()
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def run(args):
+    results = {}
+    for size in args.sizes.split(","):
+        size_results, n_vacancies = bench_size(size, args.runs)
+        results.update(size_results)
+        print(f"[{size}] {SIZES[size][0]} coaches x {SIZES[size][1]} berths x {SIZES[size][2]} stations, {n_vacancies} vacancies")
+        for case, stats in size_results.items():
+            print(f"  {case:<40}{stats['median_ms']:>12.3f} ms")
+
+    if not args.skip_scan:
+        try:
+            results[f"{args.scan_size}/full_scan"] = bench_full_scan(args.scan_size, args.scan_runs)
+            print(f"  {args.scan_size + '/full_scan':<40}{results[args.scan_size + '/full_scan']['median_ms']:>12.1f} ms")
+        except Exception as e:
+            print(f"  {args.scan_size + '/full_scan':<40}{'skipped':>12} ({e})")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.out}")
+
+def compare(args):
+    """
+    Flags every case whose best sample is more than `threshold` slower than the baseline.
+    The minimum is compared rather than the median since it is the least sensitive to a
+    busy machine. Differences below the noise floor (absolute ms) are ignored.
+    """
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = []
+    print(f"{'case':<44}{'baseline ms':>14}{'current ms':>14}{'change':>10}")
+    for case in sorted(set(baseline) | set(current)):
+        if case not in baseline or case not in current:
+            print(f"{case:<44}{'(only in one run)':>38}")
+            continue
+        old = baseline[case]["min_ms"]
+        new = current[case]["min_ms"]
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > args.threshold and new - old > args.noise_floor_ms:
+            flag = "  REGRESSION"
+            regressions.append(case)
+        print(f"{case:<44}{old:>14.3f}{new:>14.3f}{change:>+10.0%}{flag}")
+
+    if regressions:
+        print(f"FAIL: {len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+    print("OK")
+
+def main():
+    parser = argparse.ArgumentParser(description="Scraper and solver benchmark suite.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--sizes", default="small,medium,large", help=f"Comma-separated, from: {', '.join(SIZES)}")
+    run_parser.add_argument("--runs", type=int, default=7)
+    run_parser.add_argument("--out", help="Write results JSON here")
+    run_parser.add_argument("--skip-scan", action="store_true", help="Skip the browser scan against the mock server")
+    run_parser.add_argument("--scan-size", default="medium", choices=list(SIZES))
+    run_parser.add_argument("--scan-runs", type=int, default=3)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = sub.add_parser("compare", help="Compare results against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.5, help="Allowed slowdown, e.g. 0.5 = 50%%")
+    compare_parser.add_argument("--noise-floor-ms", type=float, default=0.05)
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
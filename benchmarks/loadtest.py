@@ -0,0 +1,223 @@
+"""
+Concurrent-user load test for the Find Seats flow.
+
+Each simulated session does what app.py does for a user: fetch the route (through the
+shared scan store), scan every coach, then run process_vacancies and find_all_seat_chains.
+Sessions run against a local mock_charts.py server, and concurrency is ramped level by
+level, e.g. to size BROWSER_POOL_SIZE and replica counts for a 250m / 512Mi pod:
+
+    python benchmarks/loadtest.py --levels 1,2,4,8 --pool-size 2 --duration 120 --latency-ms 80
+"""
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import threading
+import statistics
+
+# Add parent directory to path to import project modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiling import chromium_rss
+from browser_pool import default_pool_size
+
+DEFAULT_PREFS = ["LB", "L", "SL", "SU", "R", "P", "UB", "U", "MB", "M", "SM"]
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+class ChromiumSampler:
+    """
+    Polls Chromium RSS under this process (Linux only) and tracks the peak of
+    each browser tree and of all of them.
+    """
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.peak_total = 0
+        self.peak_per_browser = 0
+        self.peak_browsers = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def start(self):
+        if os.path.isdir("/proc"):
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def reset_peaks(self):
+        self.peak_total = self.peak_per_browser = self.peak_browsers = 0
+
+    def sample(self):
+        sizes = chromium_rss()
+        self.peak_total = max(self.peak_total, sum(sizes))
+        self.peak_per_browser = max(self.peak_per_browser, max(sizes, default=0))
+        self.peak_browsers = max(self.peak_browsers, len(sizes))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                pass
+
+def find_seats_session(train_no, journey_date, token):
+    """
+    One user's Find Seats: route (cached per process, as in the app), scan, solve.
+    Returns the number of chains found; raises if the scan produced nothing.
+    """
+    from scraper import get_train_route, scan_vacancies
+    from solver import process_vacancies, find_all_seat_chains
+    from scan_store import STORE, route_key
+
+    route = STORE.get(route_key(train_no), token)
+    if route is None:
+        stations = get_train_route(train_no)
+        if not stations:
+            raise RuntimeError("route fetch returned no stations")
+        route = STORE.get(STORE.put_route(train_no, stations, token), token)
+
+    start_code = route.station_list[0]["code"]
+    end_code = route.station_list[-1]["code"]
+    raw = scan_vacancies(train_no, journey_date, start_code)
+    if not raw:
+        raise RuntimeError("scan returned no vacancies")
+    processed = process_vacancies(raw, route.station_map, start_code, end_code, berth_preferences=DEFAULT_PREFS)
+    return len(find_all_seat_chains(processed, route.station_map, start_code, end_code))
+
+def run_level(concurrency, trains, args, sampler):
+    """
+    Runs `concurrency` looping sessions for args.duration seconds (or args.sessions each).
+    """
+    latencies = []
+    failures = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def user(n):
+        rng = random.Random(n)
+        done = 0
+        while time.monotonic() < deadline and (not args.sessions or done < args.sessions):
+            train_no = rng.choice(trains)
+            start = time.perf_counter()
+            try:
+                find_seats_session(train_no, args.date, f"load-{concurrency}-{n}")
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                reason = str(e).splitlines()[0][:80]
+                with lock:
+                    failures[reason] = failures.get(reason, 0) + 1
+                if args.think_time == 0:
+                    time.sleep(0.5)  # don't spin on an instant failure
+            done += 1
+            time.sleep(args.think_time)
+
+    sampler.reset_peaks()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(n,), daemon=True) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    sampler.sample()
+
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 1),
+        "completed": len(latencies),
+        "failed": sum(failures.values()),
+        "failures": failures,
+        "throughput_per_min": round(len(latencies) / elapsed * 60, 2) if elapsed else 0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "mean_s": statistics.mean(latencies) if latencies else None,
+        "peak_browsers": sampler.peak_browsers,
+        "peak_rss_per_browser_mb": round(sampler.peak_per_browser / 2**20, 1),
+        "peak_rss_chromium_total_mb": round(sampler.peak_total / 2**20, 1)
+    }
+
+def fmt(seconds):
+    return "-" if seconds is None else f"{seconds:.2f}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp concurrent Find Seats sessions against a mock charts server.")
+    parser.add_argument("--levels", default="1,2,4", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per level")
+    parser.add_argument("--sessions", type=int, default=0, help="Stop each user after this many sessions (0 = run for --duration)")
+    parser.add_argument("--think-time", type=float, default=0, help="Seconds a user waits between sessions")
+    parser.add_argument("--pool-size", type=int, help="BROWSER_POOL_SIZE for this run (0 = browser per scan)")
+    parser.add_argument("--trains", default="99991:22x72x40,99992:18x72x60,99993:12x64x30",
+                        help="Synthetic trains the users pick from, as train:CxBxS")
+    parser.add_argument("--date", default="2025-12-15")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=30)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--charts-url", help="Use an already running charts server instead of starting one")
+    parser.add_argument("--json", help="Write the report JSON here")
+    args = parser.parse_args()
+
+    if args.pool_size is not None:
+        os.environ["BROWSER_POOL_SIZE"] = str(args.pool_size)
+    from mock_charts import MockChartsServer, synthetic_train
+    import scraper
+    import logging
+    # Keep scraper progress lines out of the report
+    logging.getLogger().setLevel(logging.WARNING)
+
+    server = None
+    trains = [spec.split(":")[0] for spec in args.trains.split(",")]
+    if args.charts_url:
+        os.environ[scraper.CHARTS_URL_ENV] = args.charts_url
+    else:
+        server = MockChartsServer(
+            {spec.split(":")[0]: synthetic_train(spec, seed=i) for i, spec in enumerate(args.trains.split(","))},
+            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate, throttle_rate=args.throttle_rate
+        ).start()
+        os.environ[scraper.CHARTS_URL_ENV] = server.url
+
+    sampler = ChromiumSampler().start()
+    results = []
+    try:
+        print(f"{'users':>6}{'done':>7}{'fail':>6}{'per min':>9}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'browsers':>10}{'RSS/browser MB':>16}{'RSS total MB':>14}")
+        for level in [int(n) for n in args.levels.split(",")]:
+            r = run_level(level, trains, args, sampler)
+            results.append(r)
+            print(f"{r['concurrency']:>6}{r['completed']:>7}{r['failed']:>6}{r['throughput_per_min']:>9}"
+                  f"{fmt(r['p50_s']):>8}{fmt(r['p95_s']):>8}{fmt(r['p99_s']):>8}{r['peak_browsers']:>10}"
+                  f"{r['peak_rss_per_browser_mb']:>16}{r['peak_rss_chromium_total_mb']:>14}")
+            for reason, count in r["failures"].items():
+                print(f"{'':>6}  {count} x {reason}")
+    finally:
+        sampler.stop()
+        if server:
+            server.stop()
+
+    report = {
+        "pool_size": os.environ.get("BROWSER_POOL_SIZE") or str(default_pool_size()),
+        "trains": args.trains,
+        "latency_ms": args.latency_ms,
+        "levels": results,
+        "mock_requests": dict(server.requests) if server else None
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+if __name__ == "__main__":
+    main()
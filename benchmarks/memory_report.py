@@ -0,0 +1,82 @@
+import sys
+import os
+import json
+import argparse
+import tracemalloc
+
+# Add parent directory to path to import project modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper import parse_coach_composition
+from scan_store import ScanStore
+from synthetic import make_train
+
+def measure(fn):
+    """
+    Returns the bytes still allocated after fn() runs (the objects it keeps alive), and fn's result.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-session memory overhead: session_state copies vs shared ScanStore.")
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions viewing the same train")
+    parser.add_argument("--coaches", type=int, default=22)
+    parser.add_argument("--berths", type=int, default=72)
+    parser.add_argument("--stations", type=int, default=40)
+    args = parser.parse_args()
+
+    train = make_train(args.coaches, args.berths, args.stations, seed=1)
+    vacancies = []
+    for coach, payload in train["coaches"].items():
+        vacancies.extend(parse_coach_composition(coach, payload))
+    # Each session's scan and route fetch used to produce its own freshly parsed objects
+    scan_json = json.dumps(vacancies)
+    route_json = json.dumps(train["stations"])
+
+    def before():
+        sessions = []
+        for _ in range(args.sessions):
+            stations = json.loads(route_json)
+            sessions.append({
+                "station_list": stations,
+                "station_map": {s["code"]: s["dist"] for s in stations},
+                "raw_vacancies": json.loads(scan_json)
+            })
+        return sessions
+
+    store = ScanStore()
+
+    def shared():
+        return (
+            store.put_route("12627", json.loads(route_json)),
+            store.put_scan("12627", "2025-12-15", train["stations"][0]["code"], json.loads(scan_json))
+        )
+
+    def after():
+        sessions = []
+        for i in range(args.sessions):
+            token = f"session-{i}"
+            store.get(route_key, token)
+            store.get(scan_key, token)
+            sessions.append({"route_key": route_key, "scan_key": scan_key, "session_token": token})
+        return sessions
+
+    before_bytes, _ = measure(before)
+    shared_bytes, (route_key, scan_key) = measure(shared)
+    after_bytes, _ = measure(after)
+
+    print(f"Train: {args.coaches} coaches x {args.berths} berths x {args.stations} stations, "
+          f"{len(vacancies)} vacancies, {args.sessions} sessions")
+    print(f"{'':<28}{'total KiB':>12}{'per session KiB':>18}")
+    print(f"{'Before (session_state)':<28}{before_bytes / 1024:>12.1f}{before_bytes / 1024 / args.sessions:>18.1f}")
+    print(f"{'After (keys only)':<28}{after_bytes / 1024:>12.1f}{after_bytes / 1024 / args.sessions:>18.2f}")
+    print(f"{'After (shared entries, once)':<28}{shared_bytes / 1024:>12.1f}")
+    print(f"Single-copy footprint: {shared_bytes / max(1, before_bytes / args.sessions):.0%} of one session's old copy")
+
+if __name__ == "__main__":
+    main()
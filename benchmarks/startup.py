@@ -0,0 +1,99 @@
+import sys
+import os
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be loaded until a scan, PDF or styled table actually needs them
+HEAVY_MODULES = ("playwright", "pandas", "fpdf", "matplotlib")
+
+FIRST_RENDER_SNIPPET = """
+import time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=60).run()
+elapsed = (time.perf_counter() - start) * 1000
+print(f"{elapsed:.1f}")
+if at.exception:
+    raise SystemExit(f"App raised on first render: {at.exception[0].message}")
+"""
+
+def import_profile():
+    """
+    Runs app.py once under `python -X importtime` (Streamlit bare mode) and returns
+    ({top-level module: cumulative ms}, total ms, set of all imported module names).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "app.py"],
+        cwd=ROOT, capture_output=True, text=True, timeout=300
+    )
+    top_level = {}
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        module = name.rstrip()
+        imported.add(module.strip())
+        # Nested imports are indented; only top-level ones add up to the total
+        if not module.startswith("  "):
+            root = module.strip().split(".")[0]
+            top_level[root] = top_level.get(root, 0) + int(cumulative) / 1000
+    return top_level, sum(top_level.values()), imported
+
+def first_render_ms():
+    """
+    Time for a fresh interpreter to import and run app.py to its first complete render.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_RENDER_SNIPPET],
+        cwd=ROOT, capture_output=True, text=True, timeout=300
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time budget for app.py.")
+    parser.add_argument("--budget-import-ms", type=float, default=2500, help="Max total import time")
+    parser.add_argument("--budget-render-ms", type=float, default=4000, help="Max time to first render")
+    parser.add_argument("--runs", type=int, default=3, help="First-render runs (median is reported)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    top_level, import_ms, imported = import_profile()
+    renders = sorted(first_render_ms() for _ in range(args.runs))
+    render_ms = renders[len(renders) // 2]
+    heavy = sorted(m for m in HEAVY_MODULES if any(name == m or name.startswith(m + ".") for name in imported))
+
+    print(f"Slowest top-level imports (python -X importtime app.py):")
+    for module, ms in sorted(top_level.items(), key=lambda x: x[1], reverse=True)[:args.top]:
+        print(f"  {module:<30}{ms:>10.1f} ms")
+    print(f"Total import time:     {import_ms:>8.1f} ms (budget {args.budget_import_ms:.0f} ms)")
+    print(f"Time to first render:  {render_ms:>8.1f} ms (median of {args.runs}, budget {args.budget_render_ms:.0f} ms)")
+    print(f"Heavy modules at startup: {', '.join(heavy) if heavy else 'none'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"import_ms": import_ms, "first_render_ms": render_ms, "heavy_modules": heavy, "top_level": top_level},
+                      f, indent=2)
+
+    failures = []
+    if import_ms > args.budget_import_ms:
+        failures.append("import time over budget")
+    if render_ms > args.budget_render_ms:
+        failures.append("first render over budget")
+    if heavy:
+        failures.append(f"heavy modules imported eagerly: {', '.join(heavy)}")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# 0 disables the pool: every scan launches (and closes) its own browser as before
+BROWSER_POOL_SIZE_ENV = "BROWSER_POOL_SIZE"
+# Unset, the pool is sized from the memory limit: each warm Chromium (browser plus
+# renderer) holds about BROWSER_MEMORY_BYTES even when idle, and the app keeps
+# APP_MEMORY_BYTES for itself. Every browser is one more scan that runs instead of
+# queueing; scans mostly wait on the network, so memory rather than CPU is the limit.
+BROWSER_MEMORY_BYTES = 160 * 2**20
+APP_MEMORY_BYTES = 160 * 2**20
+DEFAULT_POOL_MIN = 2
+DEFAULT_POOL_MAX = 4
+# Relaunch a pooled browser after this many jobs to cap Chromium memory growth
+BROWSER_POOL_RECYCLE_ENV = "BROWSER_POOL_RECYCLE_AFTER"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+class BrowserPool:
+    """
+    Fixed set of worker threads, each owning one warm Chromium.
+    Playwright's sync API objects only work on the thread that created them, so browser
+    work is submitted as a job fn(browser, ...) and runs on a worker; the caller waits.
+    """
+    def __init__(self, size=1, headless=True, recycle_after=50):
+        self.size = size
+        self.headless = headless
+        self.recycle_after = recycle_after
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._warm = set()  # worker names whose browser is launched and connected
+        self._running = {}  # worker name -> monotonic start time of its current job
+        self._launch_seconds = None
+        self._last_error = None
+        self._jobs_done = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return self
+            for i in range(self.size):
+                thread = threading.Thread(target=self._worker, name=f"browser-pool-{i}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        return self
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues fn(browser, *args, **kwargs) and returns a Future for its result.
+        """
+        future = Future()
+        self._jobs.put((fn, args, kwargs, future))
+        return future
+
+    def run(self, fn, *args, progress_callback=None, **kwargs):
+        """
+        Submits fn and blocks until it finishes. progress_callback calls made on the
+        worker are relayed and invoked on the calling thread, since Streamlit UI
+        updates must come from the script thread.
+        A job whose `cancel` event (a kwarg of fn) is set while it is still queued is
+        dropped, and future.result() raises CancelledError.
+        """
+        cancel = kwargs.get("cancel")
+        events = queue.Queue()
+        if progress_callback:
+            kwargs["progress_callback"] = lambda *event: events.put(event)
+        future = self.submit(fn, *args, **kwargs)
+
+        while True:
+            try:
+                event = events.get(timeout=0.1)
+            except queue.Empty:
+                if future.done():
+                    break
+                if not any(t.is_alive() for t in self._threads) and future.cancel():
+                    raise RuntimeError(f"Browser pool is down: {self._last_error}")
+                if cancel is not None and cancel.is_set():
+                    # Only succeeds while queued; a running job notices the event itself
+                    future.cancel()
+                continue
+            progress_callback(*event)
+        while not events.empty():
+            progress_callback(*events.get_nowait())
+        return future.result()
+
+    def status(self):
+        """
+        Snapshot for health checks: warm browsers, in-flight jobs and queue depth.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "size": self.size,
+                "alive": sum(1 for t in self._threads if t.is_alive()),
+                "warm": len(self._warm),
+                "in_flight": len(self._running),
+                "queue_depth": self._jobs.qsize(),
+                "oldest_job_seconds": round(max((now - t for t in self._running.values()), default=0), 1),
+                "jobs_done": self._jobs_done,
+                "last_launch_seconds": self._launch_seconds,
+                "last_error": self._last_error
+            }
+
+    def _launch(self, p):
+        from scraper import launch_chromium
+
+        name = threading.current_thread().name
+        start = time.monotonic()
+        browser = launch_chromium(p, self.headless)
+        # Open and close a page so the first real job does not pay for renderer start-up
+        browser.new_page().close()
+        with self._lock:
+            self._launch_seconds = round(time.monotonic() - start, 2)
+            self._last_error = None
+            self._warm.add(name)
+        logging.info(f"{name}: browser warm in {self._launch_seconds}s")
+        return browser
+
+    def _mark_cold(self, name, error=None):
+        with self._lock:
+            self._warm.discard(name)
+            if error is not None:
+                self._last_error = str(error)
+
+    def _worker(self):
+        name = threading.current_thread().name
+        try:
+            self._serve(name)
+        except Exception as e:
+            # Playwright itself failed to start; liveness reports the dead worker
+            logging.error(f"{name}: worker stopped: {e}")
+            self._mark_cold(name, e)
+
+    def _serve(self, name):
+        from playwright.sync_api import sync_playwright
+
+        backoff = 1
+        with sync_playwright() as p:
+            browser = None
+            jobs_on_browser = 0
+            while True:
+                if browser is None or not browser.is_connected():
+                    self._mark_cold(name)
+                    try:
+                        browser = self._launch(p)
+                        jobs_on_browser = 0
+                        backoff = 1
+                    except Exception as e:
+                        logging.error(f"{name}: browser launch failed: {e}")
+                        self._mark_cold(name, e)
+                        browser = None
+                        # Fail one waiting job instead of leaving callers hanging, then retry
+                        try:
+                            _, _, _, future = self._jobs.get(timeout=backoff)
+                            if future.set_running_or_notify_cancel():
+                                future.set_exception(RuntimeError(f"Browser unavailable: {e}"))
+                        except queue.Empty:
+                            pass
+                        backoff = min(backoff * 2, 60)
+                        continue
+
+                fn, args, kwargs, future = self._jobs.get()
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                with self._lock:
+                    self._running[name] = time.monotonic()
+                try:
+                    future.set_result(fn(browser, *args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    with self._lock:
+                        del self._running[name]
+                        self._jobs_done += 1
+
+                jobs_on_browser += 1
+                if self.recycle_after and jobs_on_browser >= self.recycle_after:
+                    logging.info(f"{name}: recycling browser after {jobs_on_browser} jobs")
+                    self._mark_cold(name)
+                    try:
+                        browser.close()
+                    except Exception:
+                        pass
+                    browser = None
+
+def _memory_limit():
+    """
+    Bytes of memory available to this process: the cgroup limit when there is one,
+    else physical memory. None when neither can be read.
+    """
+    limits = []
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit():
+            limits.append(int(value))
+    try:
+        limits.append(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"))
+    except (ValueError, OSError, AttributeError):
+        pass
+    return min(limits) if limits else None
+
+def default_pool_size():
+    """
+    Browsers that fit next to the app in the memory limit, kept within
+    DEFAULT_POOL_MIN..DEFAULT_POOL_MAX (2 for a 512Mi pod).
+    """
+    memory = _memory_limit()
+    if memory is None:
+        return DEFAULT_POOL_MIN
+    fits = (memory - APP_MEMORY_BYTES) // BROWSER_MEMORY_BYTES
+    return max(DEFAULT_POOL_MIN, min(DEFAULT_POOL_MAX, fits))
+
+def get_browser_pool():
+    """
+    Returns the process-wide pool (starting it on first use), or None if disabled.
+    """
+    global _pool
+    size = os.environ.get(BROWSER_POOL_SIZE_ENV)
+    size = int(size) if size else default_pool_size()
+    if size <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(
+                size=size,
+                recycle_after=int(os.environ.get(BROWSER_POOL_RECYCLE_ENV, "50"))
+            ).start()
+        return _pool
@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+# Opt-in: persist cookies/localStorage and known chart URLs here across restarts
+BROWSER_STATE_FILE_ENV = "BROWSER_STATE_FILE"
+
+_state = None
+_state_lock = threading.Lock()
+
+class BrowserState:
+    """
+    What a scan learns that the next one can reuse:
+    - storage_state: the Playwright cookies and localStorage of the last good scan
+    - chart URLs: the vacant berth page reached for a (train, date, boarding) tuple,
+      so a repeat scan can open it directly instead of filling in the form
+    Shared by every scan in the process, and saved to `path` when one is given.
+    """
+    def __init__(self, path=None, max_charts=256):
+        self.path = path
+        self.max_charts = max_charts
+        self._storage_state = None
+        self._charts = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    @staticmethod
+    def _chart_key(train_no, journey_date, boarding_stn_code):
+        return f"{train_no}|{journey_date}|{boarding_stn_code}"
+
+    @property
+    def storage_state(self):
+        with self._lock:
+            return self._storage_state
+
+    def update_storage_state(self, storage_state):
+        with self._lock:
+            self._storage_state = storage_state
+        self._save()
+
+    def chart_url(self, train_no, journey_date, boarding_stn_code):
+        key = self._chart_key(train_no, journey_date, boarding_stn_code)
+        with self._lock:
+            url = self._charts.get(key)
+            if url is not None:
+                self._charts.move_to_end(key)
+            return url
+
+    def remember_chart(self, train_no, journey_date, boarding_stn_code, url):
+        with self._lock:
+            self._charts[self._chart_key(train_no, journey_date, boarding_stn_code)] = url
+            while len(self._charts) > self.max_charts:
+                self._charts.popitem(last=False)
+        self._save()
+
+    def forget_chart(self, train_no, journey_date, boarding_stn_code):
+        with self._lock:
+            self._charts.pop(self._chart_key(train_no, journey_date, boarding_stn_code), None)
+        self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable browser state {self.path}: {e}")
+            return
+        self._storage_state = saved.get("storage_state")
+        self._charts = OrderedDict(saved.get("charts", {}))
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            payload = {"storage_state": self._storage_state, "charts": dict(self._charts)}
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save browser state to {self.path}: {e}")
+
+def get_browser_state():
+    """
+    Returns the process-wide BrowserState, persisted to BROWSER_STATE_FILE when set.
+    """
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = BrowserState(os.environ.get(BROWSER_STATE_FILE_ENV))
+        return _state
@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Per-pod limits shared by every session's scan
+COACH_MAX_IN_FLIGHT_ENV = "COACH_MAX_IN_FLIGHT"
+COACH_MIN_INTERVAL_MS_ENV = "COACH_MIN_INTERVAL_MS"
+COACH_MAX_INTERVAL_MS_ENV = "COACH_MAX_INTERVAL_MS"
+COACH_TARGET_LATENCY_MS_ENV = "COACH_TARGET_LATENCY_MS"
+
+# Waits for a slot or a start time check the caller's cancellation this often
+CANCEL_POLL_SECONDS = 0.25
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+class _Ticket:
+    __slots__ = ("outcome",)
+
+    def __init__(self):
+        self.outcome = None
+
+class CoachScheduler:
+    """
+    Gates coachComposition requests from all scans in the pod, AIMD style.
+
+    Two knobs adapt to what the server tells us:
+    - limit: requests allowed in flight at once (across all browsers)
+    - interval: minimum gap between request starts, pod-wide
+
+    A fast success raises the limit by about one per window of requests and trims the
+    interval a little. A throttle (HTTP 429), an error, or a response slower than
+    target_latency halves the limit and widens the interval, so we back off before
+    the site starts blocking.
+    """
+    def __init__(self, max_in_flight=4, min_interval=0.1, max_interval=5.0, target_latency=1.5,
+                 initial_in_flight=2, initial_interval=0.2, decrease_factor=0.5, interval_step=0.01):
+        self.max_in_flight = max_in_flight
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.interval_step = interval_step
+        self.limit = float(min(initial_in_flight, max_in_flight))
+        self.interval = min(max(initial_interval, min_interval), max_interval)
+        self.in_flight = 0
+        self.counts = {"ok": 0, "slow": 0, "throttled": 0, "error": 0}
+        self._latencies = deque(maxlen=200)  # recent successful response times, for hedging
+        self._next_start = 0.0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self, check_cancelled=None):
+        """
+        Waits for a free slot and the next start time, then yields a ticket for one request.
+        The outcome is taken from how the block exits: an exception with status 429 is a
+        throttle, any other exception an error. Callers can also set ticket.outcome.
+        check_cancelled: Optional callable run every CANCEL_POLL_SECONDS while waiting;
+        whatever it raises abandons the wait without counting against the server.
+        """
+        poll = CANCEL_POLL_SECONDS if check_cancelled else None
+        with self._cond:
+            while self.in_flight >= max(1, int(self.limit)):
+                if check_cancelled:
+                    check_cancelled()
+                self._cond.wait(poll)
+            self.in_flight += 1
+            start_at = max(time.monotonic(), self._next_start)
+            self._next_start = start_at + self.interval
+
+        try:
+            while True:
+                if check_cancelled:
+                    check_cancelled()
+                remaining = start_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, poll or remaining))
+        except BaseException:
+            # No request was made, so only the slot is given back
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+            raise
+
+        ticket = _Ticket()
+        started = time.monotonic()
+        try:
+            yield ticket
+        except BaseException as e:
+            if ticket.outcome is None:
+                ticket.outcome = "throttled" if getattr(e, "status", None) == 429 else "error"
+            raise
+        finally:
+            self._record(ticket.outcome or "ok", time.monotonic() - started)
+
+    def _record(self, outcome, latency):
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self._latencies.append(latency)
+                if latency > self.target_latency:
+                    outcome = "slow"
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+            if outcome == "ok":
+                # Additive increase: about +1 in-flight per `limit` successes
+                self.limit = min(self.max_in_flight, self.limit + 1 / self.limit)
+                self.interval = max(self.min_interval, self.interval - self.interval_step)
+            else:
+                old_limit, old_interval = self.limit, self.interval
+                self.limit = max(1.0, self.limit * self.decrease_factor)
+                growth = 2.0 if outcome == "throttled" else 1.5
+                self.interval = min(self.max_interval, self.interval * growth)
+                # Push back the next start too, so queued requests feel the backoff at once
+                self._next_start = max(self._next_start, time.monotonic() + self.interval)
+                logging.info(
+                    f"Coach scheduler backing off ({outcome}): limit {old_limit:.1f} -> {self.limit:.1f}, "
+                    f"interval {old_interval * 1000:.0f} -> {self.interval * 1000:.0f} ms"
+                )
+            self._cond.notify_all()
+
+    def latency_percentile(self, p, min_samples=20):
+        """
+        p-th percentile of recent successful latencies in seconds, or None until
+        there are enough samples to trust it.
+        """
+        with self._cond:
+            samples = sorted(self._latencies)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    def status(self):
+        p95 = self.latency_percentile(95)
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "interval_ms": round(self.interval * 1000),
+                "in_flight": self.in_flight,
+                "counts": dict(self.counts),
+                "p95_ms": round(p95 * 1000) if p95 is not None else None
+            }
+
+def get_coach_scheduler():
+    """
+    Returns the process-wide scheduler, configured from the environment on first use.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = CoachScheduler(
+                max_in_flight=int(os.environ.get(COACH_MAX_IN_FLIGHT_ENV, "4")),
+                min_interval=float(os.environ.get(COACH_MIN_INTERVAL_MS_ENV, "100")) / 1000,
+                max_interval=float(os.environ.get(COACH_MAX_INTERVAL_MS_ENV, "5000")) / 1000,
+                target_latency=float(os.environ.get(COACH_TARGET_LATENCY_MS_ENV, "1500")) / 1000
+            )
+        return _scheduler
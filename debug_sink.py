@@ -0,0 +1,167 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+
+# Opt-in: the sink is only active when DEBUG_SINK_DIR is set for the environment.
+DEBUG_SINK_DIR_ENV = "DEBUG_SINK_DIR"
+DEBUG_SINK_MAX_FILES_ENV = "DEBUG_SINK_MAX_FILES"
+DEBUG_SINK_RETENTION_DAYS_ENV = "DEBUG_SINK_RETENTION_DAYS"
+
+SCAN_FILE_SUFFIX = ".json.gz"
+
+_sink = None
+_sink_lock = threading.Lock()
+
+def new_scan_id():
+    """
+    Returns a sortable, collision-free scan ID, e.g. '20251215T103000-web-1-3f9a2b1c'.
+    The host name keeps files from different replicas apart on a shared volume.
+    """
+    host = socket.gethostname().split(".")[0] or "local"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{host}-{uuid.uuid4().hex[:8]}"
+
+class DebugSink:
+    """
+    Writes scan records as gzip-compressed JSON files on a background thread.
+    One file per scan ID; the oldest files are pruned by count and by age.
+    """
+    def __init__(self, directory, max_files=50, retention_days=7, max_pending=8):
+        self.directory = directory
+        self.max_files = max_files
+        self.retention_seconds = retention_days * 86400
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="debug-sink", daemon=True)
+        os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+
+    def submit(self, record, scan_id=None):
+        """
+        Queues a scan record for writing and returns its scan ID immediately.
+        If the writer is backed up, the record is dropped rather than blocking the caller.
+        """
+        scan_id = scan_id or new_scan_id()
+        try:
+            self._queue.put_nowait((scan_id, record))
+        except queue.Full:
+            logging.warning(f"Debug sink backlog full. Dropping scan {scan_id}.")
+        return scan_id
+
+    def flush(self):
+        """
+        Blocks until every queued record has been written.
+        """
+        self._queue.join()
+
+    def path_for(self, scan_id):
+        return os.path.join(self.directory, scan_id + SCAN_FILE_SUFFIX)
+
+    def _run(self):
+        while True:
+            scan_id, record = self._queue.get()
+            try:
+                self._write(scan_id, record)
+                self._prune()
+            except Exception as e:
+                logging.error(f"Debug sink failed to write scan {scan_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, scan_id, record):
+        path = self.path_for(scan_id)
+        tmp_path = path + ".tmp"
+        payload = dict(record, scan_id=scan_id)
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(payload, f, separators=(",", ":"))
+        # Atomic rename so readers never see a half-written file
+        os.replace(tmp_path, path)
+
+    def _prune(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SCAN_FILE_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        files.sort(reverse=True)
+
+        cutoff = time.time() - self.retention_seconds
+        for i, (mtime, path) in enumerate(files):
+            if i >= self.max_files or mtime < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+def get_debug_sink():
+    """
+    Returns the process-wide sink, or None when DEBUG_SINK_DIR is not set.
+    """
+    global _sink
+    directory = os.environ.get(DEBUG_SINK_DIR_ENV)
+    if not directory:
+        return None
+    with _sink_lock:
+        if _sink is None:
+            _sink = DebugSink(
+                directory,
+                max_files=int(os.environ.get(DEBUG_SINK_MAX_FILES_ENV, "50")),
+                retention_days=float(os.environ.get(DEBUG_SINK_RETENTION_DAYS_ENV, "7"))
+            )
+        return _sink
+
+def build_scan_record(train_no, journey_date, boarding_stn_code, vacancies, payloads, stations=None):
+    """
+    Bundles everything needed to replay a scan offline.
+    payloads: List of {'coach': name, 'data': coachComposition JSON} in scan order.
+    stations: The route, so the record can also be served by mock_charts.py.
+    """
+    return {
+        "host": socket.gethostname(),
+        "created": time.time(),
+        "train_no": train_no,
+        "journey_date": journey_date,
+        "boarding": boarding_stn_code,
+        "stations": stations or [],
+        "vacancies": vacancies,
+        "payloads": payloads
+    }
+
+def load_scan(path):
+    """
+    Reads a scan record written by DebugSink.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+def replay_scan(record):
+    """
+    Re-parses the recorded coachComposition payloads into raw vacancies,
+    exactly as scraper.scan_vacancies would have produced them.
+    """
+    from scraper import parse_coach_composition
+
+    vacancies = []
+    for item in record.get("payloads", []):
+        vacancies.extend(parse_coach_composition(item["coach"], item["data"]))
+    return vacancies
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Usage: python debug_sink.py <scan file>")
+        sys.exit(1)
+
+    record = load_scan(sys.argv[1])
+    replayed = replay_scan(record)
+    print(f"Scan {record['scan_id']}: train {record['train_no']} on {record['journey_date']} from {record['boarding']}")
+    print(f"Coaches recorded: {len(record.get('payloads', []))}")
+    print(f"Vacancies recorded: {len(record.get('vacancies', []))}, replayed: {len(replayed)}")
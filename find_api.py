@@ -1,8 +1,10 @@
+import os
 import requests
 import re
 from urllib.parse import urljoin
 
-BASE_URL = "https://www.irctc.co.in/online-charts/"
+# CHARTS_URL points this at a local mock_charts.py server instead of production
+BASE_URL = os.environ.get("CHARTS_URL", "https://www.irctc.co.in/online-charts/")
 
 def find_api_endpoints():
     print(f"Fetching {BASE_URL}...")
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from browser_pool import get_browser_pool
+from metrics import render_prometheus
+from coach_scheduler import get_coach_scheduler
+from prefetch import get_scan_prefetcher
+
+HEALTH_PORT_ENV = "HEALTH_PORT"
+# A job running longer than this means a worker is wedged, so liveness fails
+LIVENESS_MAX_JOB_SECONDS_ENV = "LIVENESS_MAX_JOB_SECONDS"
+
+_server = None
+_server_lock = threading.Lock()
+
+def pool_status():
+    """
+    Browser pool snapshot, or a stub when the pool is disabled.
+    """
+    pool = get_browser_pool()
+    if pool is None:
+        return {"size": 0, "alive": 0, "warm": 0, "in_flight": 0, "queue_depth": 0, "oldest_job_seconds": 0}
+    return pool.status()
+
+def check_liveness(status):
+    """
+    Alive while every pool worker thread is running and none is stuck on a job.
+    """
+    max_job_seconds = float(os.environ.get(LIVENESS_MAX_JOB_SECONDS_ENV, "600"))
+    if status["alive"] < status["size"]:
+        return False, "browser pool worker died"
+    if status["oldest_job_seconds"] > max_job_seconds:
+        return False, f"job running for {status['oldest_job_seconds']}s"
+    return True, "ok"
+
+def check_readiness(status):
+    """
+    Ready once at least one warm browser is available, so new pods don't take
+    traffic before Chromium has launched. A disabled pool is always ready.
+    """
+    if status["size"] == 0:
+        return True, "pool disabled"
+    if status["warm"] == 0:
+        return False, "no warm browser"
+    return True, "ok"
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4", render_prometheus().encode())
+            return
+
+        status = pool_status()
+        if self.path == "/healthz":
+            ok, reason = check_liveness(status)
+        elif self.path == "/readyz":
+            ok, reason = check_readiness(status)
+        elif self.path == "/status":
+            ok, reason = True, "ok"
+            prefetcher = get_scan_prefetcher()
+            status = dict(
+                status,
+                coach_scheduler=get_coach_scheduler().status(),
+                prefetch=prefetcher.status() if prefetcher else None
+            )
+        else:
+            self.send_error(404)
+            return
+
+        body = json.dumps(dict(status, ok=ok, reason=reason)).encode()
+        self._send(200 if ok else 503, "application/json", body)
+
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Probes hit these endpoints every few seconds; keep them out of the logs
+        pass
+
+def start_health_server(port=None):
+    """
+    Serves /healthz (liveness), /readyz (readiness), /status and /metrics (Prometheus)
+    on a background thread.
+    Safe to call more than once; only the first call starts a server.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            port = port if port is not None else int(os.environ.get(HEALTH_PORT_ENV, "8502"))
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _HealthHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="health-server", daemon=True).start()
+            logging.info(f"Health endpoint listening on port {_server.server_address[1]}")
+        return _server
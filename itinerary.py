@@ -0,0 +1,212 @@
+"""
+Connecting itineraries across several scanned trains running the same day.
+
+A traveller may switch trains at any station two routes share, as well as seats
+within a train. ItineraryGraph indexes the scans once and then answers
+origin/destination queries with the fewest train changes (transfers) and, among
+those, the fewest seat changes (swaps):
+
+    graph = ItineraryGraph({
+        "12627": (route_12627, vacancies_12627),
+        "12649": (route_12649, vacancies_12649)
+    }, timings={"12627": {"KLBG": (1130, 1135)}, "12649": {"KLBG": (1190, 1195)}})
+    for itinerary in graph.search("SBC", "NDLS", max_transfers=1):
+        ...
+"""
+import heapq
+from bisect import bisect_right
+
+from route_index import get_route_index
+from solver import compile_filter
+
+class _Train:
+    """
+    One train's route and the furthest vacancy reachable from each of its stations.
+    """
+    def __init__(self, train_no, route, vacancies, berth_preferences=None, ac_only=False):
+        self.train_no = train_no
+        index = get_route_index(route)
+        self.codes = index.codes
+        self.dists = index.dists
+        # Routes can pass a station twice, so a code maps to every position it holds
+        self.positions = index.positions
+
+        # best[p]: the vacancy covering station p that runs furthest, or None. From p,
+        # riding that seat to its end (or to a transfer station on the way) is never
+        # worse than any other seat covering p.
+        starts = [None] * len(self.codes)
+        filters = compile_filter(berth_preferences=berth_preferences, ac_only=ac_only)
+        for v in vacancies:
+            if not filters.accepts(v):
+                continue
+            stretch = index.segment(v['From'], v['To'])
+            if stretch is not None:
+                s, e = stretch
+                if starts[s] is None or e > starts[s][0]:
+                    starts[s] = (e, v)
+        self.best = []
+        running = None
+        for p, seat in enumerate(starts):
+            if seat is not None and (running is None or seat[0] > running[0]):
+                running = seat
+            self.best.append(running if running is not None and running[0] > p else None)
+
+        self.hubs = []  # positions shared with another train, set by ItineraryGraph
+
+class ItineraryGraph:
+    """
+    Graph over (train, station position) built from several scans of the same day.
+
+    trains: {train_no: (route, vacancies)}, route as a station list or RouteIndex and
+        vacancies as raw scan dicts.
+    timings: Optional {train_no: {code: (arrival, departure)}} in minutes from midnight
+        of the journey date (add 1440 per day for later days). A transfer is only made
+        when the next train leaves at least min_connection minutes after the first one
+        arrives. The scraped schedule has no times, so they must come from elsewhere.
+    allow_untimed: Also transfer at stations without timings for both trains. Off by
+        default, since nothing then rules out a transfer to a train that has already
+        left. Such transfers are reported with a wait of None.
+    berth_preferences / ac_only: The same filters as solver.process_vacancies.
+    """
+    def __init__(self, trains, timings=None, min_connection=30, allow_untimed=False, berth_preferences=None, ac_only=False):
+        self.trains = {
+            train_no: _Train(train_no, route, vacancies, berth_preferences, ac_only)
+            for train_no, (route, vacancies) in trains.items()
+        }
+        self.timings = timings or {}
+        self.min_connection = min_connection
+        self.allow_untimed = allow_untimed
+
+        # code -> [(train_no, position)], the index transfers are looked up in
+        self.stops = {}
+        for train in self.trains.values():
+            for code, positions in train.positions.items():
+                for p in positions:
+                    self.stops.setdefault(code, []).append((train.train_no, p))
+        for train in self.trains.values():
+            train.hubs = sorted(
+                p for code, positions in train.positions.items()
+                if any(other != train.train_no for other, _ in self.stops[code])
+                for p in positions
+            )
+
+    def _wait(self, from_train, to_train, code):
+        """
+        Minutes between arriving on from_train and leaving on to_train at code; None
+        when either time is unknown.
+        """
+        arrival = self.timings.get(from_train, {}).get(code)
+        departure = self.timings.get(to_train, {}).get(code)
+        if arrival is None or departure is None:
+            return None
+        return departure[1] - arrival[0]
+
+    def search(self, origin, destination, max_transfers=2):
+        """
+        Itineraries from origin to destination, fewest transfers first. One itinerary
+        per number of transfers up to max_transfers, kept only if it needs fewer swaps
+        than every itinerary with fewer transfers. Each is a dict with:
+        legs: vacancy dicts with Train added and From/To narrowed to the part used
+              (the seat's own vacancy kept as Vacant_From/Vacant_To), plus Start_Dist,
+              End_Dist and Coverage_Km on that train's route
+        transfers, swaps: train and seat changes
+        connections: [{'Station', 'From_Train', 'To_Train', 'Wait_Min'}] per transfer
+
+        Dijkstra over states (train, position, seated, transfers) with cost (transfers,
+        swaps): riding the furthest seat is one edge to its end, to each transfer
+        station on the way, or to the destination; changing trains is one edge per
+        train stopping at the same station.
+        """
+        heap = []
+        best = {}
+        parent = {}
+        for train_no, p in self.stops.get(origin, ()):
+            state = (train_no, p, False, 0)
+            best[state] = 0
+            parent[state] = None
+            heapq.heappush(heap, (0, 0, state))
+
+        found = {}
+        while heap:
+            transfers, swaps, state = heapq.heappop(heap)
+            if best.get(state) != swaps:
+                continue
+            train_no, p, seated, _ = state
+            train = self.trains[train_no]
+            code = train.codes[p]
+
+            if seated and code == destination:
+                if transfers not in found:
+                    found[transfers] = state
+                continue
+
+            def relax(next_state, next_swaps, via):
+                if next_swaps < best.get(next_state, float("inf")):
+                    best[next_state] = next_swaps
+                    parent[next_state] = (state, via)
+                    heapq.heappush(heap, (next_state[3], next_swaps, next_state))
+
+            # Ride the furthest seat covering this station
+            seat = train.best[p]
+            if seat is not None:
+                end, vacancy = seat
+                cost = swaps + (1 if seated else 0)
+                targets = {end}
+                targets.update(train.hubs[bisect_right(train.hubs, p):bisect_right(train.hubs, end)])
+                targets.update(q for q in train.positions.get(destination, ()) if p < q <= end)
+                for q in targets:
+                    relax((train_no, q, True, transfers), cost, ("seat", vacancy))
+
+            # Change trains here
+            if seated and transfers < max_transfers:
+                for other, q in self.stops[code]:
+                    if other == train_no or q == len(self.trains[other].codes) - 1:
+                        continue
+                    wait = self._wait(train_no, other, code)
+                    if wait is None and not self.allow_untimed:
+                        continue
+                    if wait is not None and wait < self.min_connection:
+                        continue
+                    relax((other, q, False, transfers + 1), swaps, ("transfer", wait))
+
+        itineraries = []
+        for transfers in sorted(found):
+            swaps = best[found[transfers]]
+            if itineraries and swaps >= itineraries[-1]["swaps"]:
+                continue
+            itineraries.append(self._itinerary(found[transfers], parent, swaps))
+        return itineraries
+
+    def _itinerary(self, state, parent, swaps):
+        steps = []
+        while parent[state] is not None:
+            previous, via = parent[state]
+            steps.append((previous, state, via))
+            state = previous
+        steps.reverse()
+
+        legs, connections = [], []
+        for previous, current, (kind, detail) in steps:
+            if kind == "transfer":
+                connections.append({
+                    "Station": self.trains[previous[0]].codes[previous[1]],
+                    "From_Train": previous[0], "To_Train": current[0], "Wait_Min": detail
+                })
+                continue
+            train = self.trains[current[0]]
+            leg = dict(detail.to_dict() if hasattr(detail, "to_dict") else detail)
+            leg.update({
+                "Train": current[0],
+                "Vacant_From": leg["From"], "Vacant_To": leg["To"],
+                "From": train.codes[previous[1]], "To": train.codes[current[1]],
+                "Start_Dist": train.dists[previous[1]], "End_Dist": train.dists[current[1]],
+                "Coverage_Km": train.dists[current[1]] - train.dists[previous[1]]
+            })
+            legs.append(leg)
+
+        return {
+            "legs": legs,
+            "transfers": len(connections),
+            "swaps": swaps,
+            "connections": connections
+        }
@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Opt-in: append one JSON line per finished span to this file
+METRICS_JSONL_ENV = "SCAN_METRICS_JSONL"
+
+# Seconds; page loads and "Get Train Chart" sit in the upper buckets, coaches in the lower
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Bytes of coachComposition JSON
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+class Histogram:
+    """
+    Cumulative-bucket histogram rendered in the Prometheus text format.
+    """
+    def __init__(self, name, help_text, labelnames, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = ",".join(f'{name}="{value}"' for name, value in zip(self.labelnames, key))
+                sep = "," if labels else ""
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{labels}}} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{{{labels}}} {series['count']}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+PHASE_SECONDS = Histogram(
+    "reservex_scan_phase_seconds", "Time spent in each scraper phase.",
+    ("op", "phase", "status"), DURATION_BUCKETS
+)
+COACH_RESPONSE_BYTES = Histogram(
+    "reservex_coach_response_bytes", "Size of coachComposition responses.",
+    ("op",), SIZE_BUCKETS
+)
+COACH_RETRIES = Histogram(
+    "reservex_coach_retries", "Retries needed per coach.",
+    ("op",), (0, 1, 2, 3, 5)
+)
+FIRST_COACH_SECONDS = Histogram(
+    "reservex_time_to_first_coach_seconds", "Scan start to first coach data, via the chart shortcut or the form.",
+    ("op", "path"), DURATION_BUCKETS
+)
+HISTOGRAMS = [PHASE_SECONDS, COACH_RESPONSE_BYTES, COACH_RETRIES, FIRST_COACH_SECONDS]
+
+_listeners = []
+_listeners_lock = threading.Lock()
+_local = threading.local()
+_jsonl_lock = threading.Lock()
+
+def add_listener(listener):
+    """
+    Registers listener(stage, event), called with stage 'start' and 'end' for every span.
+    The 'end' event carries duration_ms and status. Listeners must be quick and must not raise.
+    """
+    with _listeners_lock:
+        _listeners.append(listener)
+
+def remove_listener(listener):
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+def _notify(stage, event):
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(stage, event)
+        except Exception as e:
+            logging.warning(f"Metrics listener failed: {e}")
+
+def _record(stage, event):
+    if stage != "end":
+        return
+    PHASE_SECONDS.observe(event, event["duration_ms"] / 1000)
+    if event.get("bytes") is not None:
+        COACH_RESPONSE_BYTES.observe(event, event["bytes"])
+    if event["phase"] == "coach":
+        COACH_RETRIES.observe(event, event.get("retries", 0))
+    if event.get("first_coach_ms") is not None:
+        FIRST_COACH_SECONDS.observe(event, event["first_coach_ms"] / 1000)
+
+    path = os.environ.get(METRICS_JSONL_ENV)
+    if path:
+        line = json.dumps(event, separators=(",", ":"), default=str)
+        with _jsonl_lock:
+            with open(path, "a") as f:
+                f.write(line + "\n")
+
+add_listener(_record)
+
+@contextmanager
+def span(phase, **fields):
+    """
+    Times one phase of a scrape and yields its event dict, so callers can add
+    fields while it runs (e.g. event['bytes'] = len(body)).
+    Nested spans inherit the enclosing span's fields (op, train_no, ...).
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    inherited = {k: v for k, v in stack[-1].items() if k not in ("phase", "ts", "duration_ms", "status")} if stack else {}
+    event = dict(inherited, **fields)
+    event["phase"] = phase
+    event["ts"] = time.time()
+
+    stack.append(event)
+    _notify("start", event)
+    start = time.perf_counter()
+    event["status"] = "ok"
+    try:
+        yield event
+    except BaseException:
+        if event["status"] == "ok":
+            event["status"] = "error"
+        raise
+    finally:
+        event["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        stack.pop()
+        _notify("end", event)
+
+def render_prometheus():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    return "\n".join(h.render() for h in HISTOGRAMS) + "\n"
+
+def reset():
+    for h in HISTOGRAMS:
+        h.reset()
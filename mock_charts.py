@@ -0,0 +1,391 @@
+"""
+Local stand-in for the IRCTC online-charts site.
+
+Serves a minimal single-page app with the same controls the scraper drives
+(train combobox, Schedule table, boarding station, date picker, "Get Train Chart",
+coach buttons) and the JSON endpoints behind it, including coachComposition.
+Trains come from fixture files, debug-sink recordings or synthetic generation.
+
+    python mock_charts.py --port 8600 --synthetic 99999:30x80x150 --latency-ms 50 --error-rate 0.02
+    CHARTS_URL=http://127.0.0.1:8600/online-charts/ streamlit run app.py
+"""
+import argparse
+import glob
+import gzip
+import json
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from synthetic import make_train
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BASE_PATH = "/online-charts/"
+API_PATH = BASE_PATH + "api/"
+
+INDEX_HTML = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Online Charts (mock)</title>
+<style>
+  body { font-family: sans-serif; margin: 20px; }
+  ul { list-style: none; padding: 0; border: 1px solid #ccc; max-width: 320px; }
+  li { padding: 4px 8px; cursor: pointer; }
+  li:hover { background: #eee; }
+  .field { margin: 8px 0; }
+  #picker button { width: 36px; margin: 2px; }
+</style>
+</head>
+<body>
+<div id="app"></div>
+<script>
+const API = "__API_PATH__";
+const state = { train: null, boarding: null, stations: [] };
+const app = document.getElementById("app");
+
+function el(tag, attrs, text) {
+  const node = document.createElement(tag);
+  Object.entries(attrs || {}).forEach(([k, v]) => node.setAttribute(k, v));
+  if (text !== undefined) node.textContent = text;
+  return node;
+}
+
+function optionsList(container, items, onPick) {
+  const old = container.querySelector("ul");
+  if (old) old.remove();
+  if (!items.length) return;
+  const ul = el("ul", { role: "listbox" });
+  items.forEach(item => {
+    const li = el("li", { role: "option" }, item.label);
+    li.addEventListener("click", () => { ul.remove(); onPick(item); });
+    ul.appendChild(li);
+  });
+  container.appendChild(ul);
+}
+
+function renderForm() {
+  app.innerHTML = "<h2>Reservation Chart</h2>";
+
+  const trainField = el("div", { class: "field" });
+  trainField.appendChild(el("label", { for: "train" }, "Train Name/Number*"));
+  const trainInput = el("input", { id: "train", role: "combobox", "aria-autocomplete": "list" });
+  trainField.appendChild(trainInput);
+  app.appendChild(trainField);
+  trainInput.addEventListener("input", async () => {
+    const q = trainInput.value.trim();
+    if (!q) return;
+    const trains = await (await fetch(API + "trains?q=" + encodeURIComponent(q))).json();
+    optionsList(trainField, trains.map(t => ({ label: t.trainNo + " - " + t.trainName, value: t.trainNo })), pickTrain);
+  });
+
+  const boardingField = el("div", { class: "field" });
+  boardingField.appendChild(el("label", { for: "boarding" }, "Boarding Station*"));
+  const boardingInput = el("input", { id: "boarding", "aria-autocomplete": "list" });
+  boardingField.appendChild(boardingInput);
+  app.appendChild(boardingField);
+  boardingInput.addEventListener("input", () => {
+    const q = boardingInput.value.trim().toUpperCase();
+    const matches = state.stations
+      .filter(s => s.code.startsWith(q) || s.name.startsWith(q))
+      .sort((a, b) => (b.code === q) - (a.code === q));
+    optionsList(boardingField, matches.map(s => ({ label: s.code + " - " + s.name, value: s.code })), item => {
+      state.boarding = item.value;
+      boardingInput.value = item.label;
+    });
+  });
+
+  const dateField = el("div", { class: "field" });
+  const dateInput = el("input", { class: "jss466", placeholder: "Journey Date", readonly: "readonly" });
+  dateField.appendChild(dateInput);
+  app.appendChild(dateField);
+  dateInput.addEventListener("click", () => {
+    if (document.getElementById("picker")) return;
+    const picker = el("div", { id: "picker" });
+    const now = new Date();
+    for (let d = 1; d <= 31; d++) {
+      const btn = el("button", { type: "button" }, String(d));
+      btn.addEventListener("click", () => {
+        const mm = String(now.getMonth() + 1).padStart(2, "0");
+        dateInput.value = now.getFullYear() + "-" + mm + "-" + String(d).padStart(2, "0");
+        picker.remove();
+      });
+      picker.appendChild(btn);
+    }
+    dateField.appendChild(picker);
+  });
+
+  const scheduleBtn = el("button", { type: "button", id: "schedule" }, "Schedule");
+  scheduleBtn.style.display = "none";
+  scheduleBtn.addEventListener("click", renderSchedule);
+  app.appendChild(scheduleBtn);
+
+  const submitBtn = el("button", { type: "button" }, "Get Train Chart");
+  submitBtn.addEventListener("click", () => {
+    const params = new URLSearchParams({
+      train: state.train || "", date: dateInput.value, boarding: state.boarding || ""
+    });
+    history.pushState({}, "", "__BASE_PATH__vacant-berth?" + params.toString());
+    renderChart(params);
+  });
+  app.appendChild(submitBtn);
+  app.appendChild(el("div", { id: "schedule-table" }));
+}
+
+async function pickTrain(item) {
+  state.train = item.value;
+  document.getElementById("train").value = item.label;
+  const data = await (await fetch(API + "schedule?trainNo=" + encodeURIComponent(item.value))).json();
+  state.stations = data.stations;
+  document.getElementById("schedule").style.display = "";
+}
+
+function renderSchedule() {
+  const holder = document.getElementById("schedule-table");
+  holder.innerHTML = "";
+  const table = el("table", { border: "1" });
+  const head = el("tr");
+  ["S.No.", "Station Code", "Station Name", "Distance", "Arrival", "Departure", "Day"].forEach(h => head.appendChild(el("th", {}, h)));
+  table.appendChild(head);
+  state.stations.forEach((s, i) => {
+    const row = el("tr");
+    [i + 1, s.code, s.name, s.dist + " km", s.arr || "--", s.dep || "--", s.day || 1].forEach(v => row.appendChild(el("td", {}, String(v))));
+    table.appendChild(row);
+  });
+  holder.appendChild(table);
+}
+
+async function renderChart(params) {
+  app.innerHTML = "<h2>Vacant Berth</h2>";
+  const body = { trainNo: params.get("train"), jDate: params.get("date"), boardingStation: params.get("boarding") };
+  const resp = await fetch(API + "trainComposition", { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify(body) });
+  if (!resp.ok) { app.appendChild(el("div", { class: "error" }, "Chart not prepared")); return; }
+  const data = await resp.json();
+  const bar = el("div", { id: "coaches" });
+  data.coaches.forEach(coach => {
+    const btn = el("button", { type: "button" }, coach);
+    btn.addEventListener("click", async () => {
+      const r = await fetch(API + "coachComposition", { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify(Object.assign({ coach: coach }, body)) });
+      document.getElementById("coach-status").textContent = coach + ": " + r.status;
+    });
+    bar.appendChild(btn);
+  });
+  app.appendChild(bar);
+  app.appendChild(el("div", { id: "coach-status" }));
+}
+
+if (location.pathname.endsWith("/vacant-berth")) {
+  renderChart(new URLSearchParams(location.search));
+} else {
+  renderForm();
+}
+</script>
+</body>
+</html>
+""".replace("__API_PATH__", API_PATH).replace("__BASE_PATH__", BASE_PATH)
+
+def load_fixture(path):
+    """
+    Loads a train from a fixture file ({'train_no', 'name', 'stations', 'coaches'})
+    or from a debug-sink recording (*.json.gz with 'stations' and 'payloads').
+    """
+    if path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            record = json.load(f)
+    else:
+        with open(path, encoding="utf-8") as f:
+            record = json.load(f)
+
+    if "payloads" in record:
+        return {
+            "train_no": record["train_no"],
+            "name": record.get("name", f"RECORDED {record['train_no']}"),
+            "stations": record.get("stations") or [],
+            "coaches": {item["coach"]: item["data"] for item in record["payloads"]}
+        }
+    return record
+
+def load_fixtures(directory=FIXTURES_DIR):
+    """
+    Loads every fixture and recording in a directory, keyed by train number.
+    """
+    trains = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json")) + glob.glob(os.path.join(directory, "*.json.gz"))):
+        train = load_fixture(path)
+        trains[train["train_no"]] = train
+    return trains
+
+def synthetic_train(spec, seed=0):
+    """
+    Builds a train from a spec like '99999:30x80x150' (train number: coaches x berths x stations).
+    """
+    train_no, dims = spec.split(":")
+    n_coaches, n_berths, n_stations = (int(x) for x in dims.lower().split("x"))
+    train = make_train(n_coaches, n_berths, n_stations, seed=seed)
+    return dict(train, train_no=train_no, name=f"SYNTHETIC {n_coaches}x{n_berths}x{n_stations}")
+
+class MockChartsServer:
+    """
+    Threaded HTTP server for the mock charts site.
+    latency_ms/jitter_ms delay every API response; error_rate and throttle_rate make
+    coachComposition answer 500 or 429 with that probability.
+    """
+    def __init__(self, trains, host="127.0.0.1", port=0, latency_ms=0, jitter_ms=0,
+                 error_rate=0.0, throttle_rate=0.0, seed=None):
+        self.trains = trains
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.requests = {}  # endpoint -> count
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{BASE_PATH}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-charts", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def _delay(self):
+        if self.latency_ms or self.jitter_ms:
+            with self._lock:
+                jitter = self._rng.uniform(0, self.jitter_ms)
+            time.sleep((self.latency_ms + jitter) / 1000)
+
+    def _fault(self):
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.error_rate:
+            return 500
+        if roll < self.error_rate + self.throttle_rate:
+            return 429
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, body, content_type="application/json"):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body, separators=(",", ":")).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json_body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    return json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return {}
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == API_PATH + "trains":
+                    server._count("trains")
+                    server._delay()
+                    q = query.get("q", [""])[0].strip().upper()
+                    matches = [
+                        {"trainNo": no, "trainName": t["name"]}
+                        for no, t in sorted(server.trains.items())
+                        if no.startswith(q) or t["name"].upper().startswith(q)
+                    ]
+                    self._send(200, matches)
+                elif url.path == API_PATH + "schedule":
+                    server._count("schedule")
+                    server._delay()
+                    train = server.trains.get(query.get("trainNo", [""])[0])
+                    if train is None:
+                        self._send(404, {"error": "Train not found"})
+                    else:
+                        self._send(200, {"stations": train["stations"]})
+                elif url.path.startswith(BASE_PATH) and not url.path.startswith(API_PATH):
+                    # Single-page app: every page path serves the same document
+                    server._count("page")
+                    self._send(200, INDEX_HTML.encode("utf-8"), "text/html; charset=utf-8")
+                else:
+                    self._send(404, {"error": "Not found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                body = self._json_body()
+                train = server.trains.get(body.get("trainNo"))
+                if url.path == API_PATH + "trainComposition":
+                    server._count("trainComposition")
+                    server._delay()
+                    if train is None:
+                        self._send(404, {"error": "Chart not prepared"})
+                    else:
+                        self._send(200, {"trainNo": body["trainNo"], "coaches": list(train["coaches"])})
+                elif url.path == API_PATH + "coachComposition":
+                    server._count("coachComposition")
+                    server._delay()
+                    status = server._fault()
+                    payload = train["coaches"].get(body.get("coach")) if train else None
+                    if status is not None:
+                        self._send(status, {"error": "Injected fault"})
+                    elif payload is None:
+                        self._send(404, {"error": "Coach not found"})
+                    else:
+                        self._send(200, payload)
+                else:
+                    self._send(404, {"error": "Not found"})
+
+            def log_message(self, format, *args):
+                logging.debug("mock-charts: " + format % args)
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the IRCTC online-charts site.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Directory of fixtures and *.json.gz recordings")
+    parser.add_argument("--synthetic", action="append", default=[], metavar="TRAIN:CxBxS",
+                        help="Add a synthetic train, e.g. 99999:30x80x150 (repeatable)")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of coachComposition calls answered 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of coachComposition calls answered 429")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    trains = load_fixtures(args.fixtures)
+    for i, spec in enumerate(args.synthetic):
+        train = synthetic_train(spec, seed=i)
+        trains[train["train_no"]] = train
+
+    server = MockChartsServer(
+        trains, host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, seed=args.seed
+    )
+    print(f"Serving {len(trains)} trains ({', '.join(sorted(trains))}) at {server.url}")
+    print(f"Point the scraper at it with: CHARTS_URL={server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import logging
+import os
+import threading
+import time
+
+from scan_store import scan_key
+
+# Pod-wide budget for speculative scans; 0 turns prefetching off
+PREFETCH_MAX_IN_FLIGHT_ENV = "PREFETCH_MAX_IN_FLIGHT"
+# How long a finished prefetch can still be picked up by "Find Seats"
+PREFETCH_TTL_SECONDS_ENV = "PREFETCH_TTL_SECONDS"
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+class Prefetch:
+    """
+    One speculative scan. `done` is set when it finishes, fails or is cancelled;
+    `progress` holds the latest (current, total, coach) for an attached UI.
+    """
+    def __init__(self, train_no, journey_date, boarding_stn_code):
+        self.train_no = train_no
+        self.journey_date = journey_date
+        self.boarding_stn_code = boarding_stn_code
+        self.key = scan_key(train_no, journey_date, boarding_stn_code)
+        self.holders = set()
+        self.progress = None
+        self.payloads = None
+        self.result = None
+        self.error = None
+        self.cancel = threading.Event()
+        self.done = threading.Event()
+        self.finished_at = None
+
+    @property
+    def usable(self):
+        return not self.cancel.is_set() and self.error is None
+
+    def record_progress(self, current, total, coach_name):
+        self.progress = (current, total, coach_name)
+
+    def record_payload(self, coach_name, data):
+        self.payloads.append({"coach": coach_name, "data": data})
+
+class ScanPrefetcher:
+    """
+    Starts low-priority background scans for the chart a user is most likely to ask
+    for next, so "Find Seats" can attach to them instead of starting from scratch.
+
+    Low priority means: at most max_in_flight prefetches per pod, and one only starts
+    when the browser pool has a browser with nothing queued for it. Prefetches are
+    shared by every session that wants the same chart and cancelled when the last of
+    them lets go before it finishes.
+    """
+    def __init__(self, max_in_flight=1, ttl=300, scan=None, pool=None):
+        self.max_in_flight = max_in_flight
+        self.ttl = ttl
+        self._scan = scan
+        self._pool = pool
+        self._prefetches = {}
+        self._lock = threading.Lock()
+        self.counts = {"started": 0, "attached": 0, "cancelled": 0, "declined": 0}
+
+    def _pool_idle(self):
+        pool = self._pool
+        if pool is None:
+            from browser_pool import get_browser_pool
+            pool = get_browser_pool()
+        if pool is None:
+            # Without a pool every scan launches its own Chromium; too costly to guess with
+            return False
+        status = pool.status()
+        return status["in_flight"] + status["queue_depth"] < status["size"]
+
+    def _expire(self, now):
+        for key, prefetch in list(self._prefetches.items()):
+            if prefetch.done.is_set() and (not prefetch.usable or now - prefetch.finished_at > self.ttl):
+                del self._prefetches[key]
+
+    def start(self, train_no, journey_date, boarding_stn_code, holder, previous=None, capture_payloads=False):
+        """
+        Starts (or joins) a prefetch of the chart for `holder`. Returns the Prefetch,
+        or None if the budget or the browser pool has no room for it right now.
+        """
+        key = scan_key(train_no, journey_date, boarding_stn_code)
+        with self._lock:
+            self._expire(time.monotonic())
+            prefetch = self._prefetches.get(key)
+            if prefetch is not None and prefetch.usable:
+                prefetch.holders.add(holder)
+                return prefetch
+            running = sum(1 for p in self._prefetches.values() if not p.done.is_set())
+            if running >= self.max_in_flight or not self._pool_idle():
+                self.counts["declined"] += 1
+                return None
+            prefetch = Prefetch(train_no, journey_date, boarding_stn_code)
+            prefetch.holders.add(holder)
+            if capture_payloads:
+                prefetch.payloads = []
+            self._prefetches[key] = prefetch
+            self.counts["started"] += 1
+
+        thread = threading.Thread(target=self._run, args=(prefetch, previous), name=f"prefetch-{train_no}", daemon=True)
+        thread.start()
+        return prefetch
+
+    def _run(self, prefetch, previous):
+        scan = self._scan
+        if scan is None:
+            from scraper import scan_vacancies as scan
+        try:
+            prefetch.result = scan(
+                prefetch.train_no, prefetch.journey_date, prefetch.boarding_stn_code,
+                progress_callback=prefetch.record_progress,
+                payload_callback=prefetch.record_payload if prefetch.payloads is not None else None,
+                previous=previous,
+                cancel=prefetch.cancel
+            )
+        except Exception as e:
+            prefetch.error = e
+            if not prefetch.cancel.is_set():
+                logging.warning(f"Prefetch of {prefetch.train_no} {prefetch.boarding_stn_code} failed: {e}")
+        finally:
+            prefetch.finished_at = time.monotonic()
+            prefetch.done.set()
+
+    def attach(self, train_no, journey_date, boarding_stn_code, holder):
+        """
+        The in-flight or recently finished prefetch of this chart, or None. The caller
+        waits on prefetch.done and then uses prefetch.result.
+        """
+        key = scan_key(train_no, journey_date, boarding_stn_code)
+        with self._lock:
+            self._expire(time.monotonic())
+            prefetch = self._prefetches.get(key)
+            if prefetch is None or not prefetch.usable:
+                return None
+            prefetch.holders.add(holder)
+            self.counts["attached"] += 1
+            return prefetch
+
+    def release(self, holder, keep=None):
+        """
+        Drops holder's interest in every prefetch except `keep` (a scan key). A prefetch
+        nobody holds any more is cancelled if still running.
+        """
+        with self._lock:
+            for key, prefetch in list(self._prefetches.items()):
+                if key == keep or holder not in prefetch.holders:
+                    continue
+                prefetch.holders.discard(holder)
+                if not prefetch.holders:
+                    if not prefetch.done.is_set():
+                        prefetch.cancel.set()
+                        self.counts["cancelled"] += 1
+                    del self._prefetches[key]
+
+    def preempt(self, holder):
+        """
+        Called before holder's foreground scan: if no browser is idle, running prefetches
+        nobody else holds are cancelled so that scan gets the browser sooner. Prefetches
+        other sessions are attached to keep running.
+        """
+        if self._pool_idle():
+            return
+        with self._lock:
+            for key, prefetch in list(self._prefetches.items()):
+                if not prefetch.done.is_set() and prefetch.holders <= {holder}:
+                    prefetch.cancel.set()
+                    self.counts["cancelled"] += 1
+                    del self._prefetches[key]
+
+    def take(self, prefetch, holder):
+        """
+        Marks a finished prefetch as consumed by holder, so later clicks scan afresh.
+        """
+        with self._lock:
+            prefetch.holders.discard(holder)
+            if not prefetch.holders and self._prefetches.get(prefetch.key) is prefetch:
+                del self._prefetches[prefetch.key]
+
+    def status(self):
+        with self._lock:
+            return {
+                "in_flight": sum(1 for p in self._prefetches.values() if not p.done.is_set()),
+                "ready": sum(1 for p in self._prefetches.values() if p.done.is_set() and p.usable),
+                "max_in_flight": self.max_in_flight,
+                "counts": dict(self.counts)
+            }
+
+def get_scan_prefetcher():
+    """
+    Returns the process-wide prefetcher, or None when PREFETCH_MAX_IN_FLIGHT is 0.
+    """
+    global _prefetcher
+    max_in_flight = int(os.environ.get(PREFETCH_MAX_IN_FLIGHT_ENV, "1"))
+    if max_in_flight <= 0:
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = ScanPrefetcher(
+                max_in_flight=max_in_flight,
+                ttl=float(os.environ.get(PREFETCH_TTL_SECONDS_ENV, "300"))
+            )
+        return _prefetcher
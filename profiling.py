@@ -0,0 +1,342 @@
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+import metrics
+
+# Opt-in: set to a directory to profile memory per stage and write reports there
+MEMORY_PROFILE_DIR_ENV = "MEMORY_PROFILE_DIR"
+# Frames kept per allocation; more frames means better call sites but more overhead
+MEMORY_PROFILE_FRAMES_ENV = "MEMORY_PROFILE_FRAMES"
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+TOP_SITES = 10
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+# --- Process RSS from /proc (Linux) ---
+
+def _children(pid):
+    # Children are listed per thread; Playwright's driver is spawned from a pool worker thread
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+    except OSError:
+        pass
+    return children
+
+def _read_proc(pid):
+    """
+    Returns (cmdline, RSS bytes) for a process, or None once it has exited.
+    """
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return cmdline, int(line.split()[1]) * 1024
+        return cmdline, 0
+    except OSError:
+        return None
+
+def chromium_rss(pid=None):
+    """
+    RSS in bytes of each Chromium started under pid (default: this process).
+    A browser is a Chromium process without --type=, plus all of its descendants
+    (renderers, GPU, utility processes).
+    """
+    trees = []
+
+    def walk(pid, tree):
+        info = _read_proc(pid)
+        if info is None:
+            return
+        cmdline, rss = info
+        if tree is None and "chrom" in cmdline.lower() and "--type=" not in cmdline:
+            tree = [0]
+            trees.append(tree)
+        if tree is not None:
+            tree[0] += rss
+        for child in _children(pid):
+            walk(child, tree)
+
+    for child in _children(pid or os.getpid()):
+        walk(child, None)
+    return [t[0] for t in trees]
+
+def process_rss():
+    info = _read_proc(os.getpid())
+    return info[1] if info else 0
+
+# --- Per-stage profiler ---
+
+class _Stage:
+    __slots__ = ("name", "start_current", "peak", "start_snapshot")
+
+    def __init__(self, name, start_current, start_snapshot):
+        self.name = name
+        self.start_current = start_current
+        self.peak = start_current
+        self.start_snapshot = start_snapshot
+
+_IMPORT_FRAMES = ("<frozen importlib", "<frozen zipimport")
+# The profiler's own snapshots and span bookkeeping are not part of any stage
+_SELF_FILES = (tracemalloc.__file__, os.path.abspath(__file__), os.path.abspath(metrics.__file__))
+
+def _site(traceback):
+    """
+    'file:line' of the innermost project frame (where our code asked for the memory),
+    followed by the innermost frame if that is in a library. Allocations made while
+    executing a module body are reported together as '(module imports)'.
+    """
+    frames = list(traceback)
+    innermost = frames[-1] if frames else None
+    if innermost is not None and innermost.filename in _SELF_FILES:
+        return None
+    if any(f.filename.startswith(_IMPORT_FRAMES) for f in frames):
+        return "(module imports)"
+    ours = next((f for f in reversed(frames) if f.filename.startswith(PROJECT_DIR)), None)
+    parts = []
+    if ours is not None:
+        parts.append(f"{os.path.relpath(ours.filename, PROJECT_DIR)}:{ours.lineno}")
+    if innermost is not None and innermost != ours:
+        parts.append(f"{os.path.basename(innermost.filename)}:{innermost.lineno}")
+    return " > ".join(parts) or "?"
+
+def _top_sites(after, before):
+    """
+    Largest allocations made between two snapshots, grouped by _site.
+    """
+    sites = {}
+    for diff in after.compare_to(before, "traceback"):
+        if diff.size_diff <= 0:
+            continue
+        name = _site(diff.traceback)
+        if name is None:
+            continue
+        site = sites.setdefault(name, {"size_diff_bytes": 0, "count_diff": 0})
+        site["size_diff_bytes"] += diff.size_diff
+        site["count_diff"] += diff.count_diff
+    ranked = sorted(sites.items(), key=lambda kv: kv[1]["size_diff_bytes"], reverse=True)[:TOP_SITES]
+    return [dict(stats, site=name) for name, stats in ranked]
+
+class MemoryProfiler:
+    """
+    Listens to metrics spans and records, per stage (span phase): the Python heap peak
+    reached while it ran (tracemalloc), memory it left allocated, process and Chromium
+    RSS at its end, and the call sites of what its first run left allocated.
+    Comparing snapshots is slow on a large heap, so repeated stages such as 'coach'
+    and 'parse' only pay for it once.
+
+    tracemalloc's peak is process-wide, so stages overlapping on other threads share
+    peaks; profile one scan at a time for clean attribution.
+    """
+    def __init__(self, directory, frames=8):
+        self.directory = directory
+        self.frames = frames
+        self.stages = {}  # phase -> aggregated stats
+        self._open = []  # stages currently running, on any thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.started = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        metrics.add_listener(self.on_span)
+        return self
+
+    def stop(self):
+        metrics.remove_listener(self.on_span)
+        self.write_report()
+        tracemalloc.stop()
+
+    @property
+    def report_path(self):
+        return os.path.join(self.directory, f"memory-profile-{os.getpid()}.json")
+
+    def _fold_peak(self):
+        # Credit the peak since the last event to every open stage, then start a new window
+        _, peak = tracemalloc.get_traced_memory()
+        for stage in self._open:
+            stage.peak = max(stage.peak, peak)
+        tracemalloc.reset_peak()
+
+    def on_span(self, event_stage, event):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        if event_stage == "start":
+            snapshot = None
+            if event["phase"] not in self.stages:
+                snapshot = tracemalloc.take_snapshot()
+            with self._lock:
+                self._fold_peak()
+                stage = _Stage(event["phase"], tracemalloc.get_traced_memory()[0], snapshot)
+                self._open.append(stage)
+            stack.append(stage)
+            return
+
+        if not stack:
+            return
+        stage = stack.pop()
+        with self._lock:
+            self._fold_peak()
+            self._open.remove(stage)
+            current = tracemalloc.get_traced_memory()[0]
+        retained = current - stage.start_current
+        peak_delta = stage.peak - stage.start_current
+        browsers = chromium_rss()
+
+        sites = None
+        if stage.start_snapshot is not None:
+            sites = _top_sites(tracemalloc.take_snapshot(), stage.start_snapshot)
+            stage.start_snapshot = None
+
+        with self._lock:
+            stats = self.stages.setdefault(stage.name, {
+                "runs": 0, "total_ms": 0.0, "peak_delta_bytes": 0, "peak_heap_bytes": 0,
+                "retained_bytes_max": 0, "process_rss_max": 0, "chromium_rss_max": 0,
+                "chromium_rss_per_browser_max": 0, "top_sites": []
+            })
+            stats["runs"] += 1
+            stats["total_ms"] += event.get("duration_ms", 0)
+            stats["peak_delta_bytes"] = max(stats["peak_delta_bytes"], peak_delta)
+            stats["peak_heap_bytes"] = max(stats["peak_heap_bytes"], stage.peak)
+            stats["retained_bytes_max"] = max(stats["retained_bytes_max"], retained)
+            stats["process_rss_max"] = max(stats["process_rss_max"], process_rss())
+            stats["chromium_rss_max"] = max(stats["chromium_rss_max"], sum(browsers))
+            stats["chromium_rss_per_browser_max"] = max(stats["chromium_rss_per_browser_max"], max(browsers, default=0))
+            if sites is not None:
+                stats["top_sites"] = sites
+            top_level = not self._open
+
+        if top_level:
+            self.write_report()
+
+    def report(self):
+        with self._lock:
+            stages = {name: dict(stats) for name, stats in self.stages.items()}
+        return {
+            "pid": os.getpid(),
+            "started": self.started,
+            "written": time.time(),
+            "frames": self.frames,
+            "stages": dict(sorted(stages.items(), key=lambda kv: kv[1]["peak_delta_bytes"], reverse=True))
+        }
+
+    def write_report(self):
+        """
+        Rewrites this process's JSON report and a plain-text summary next to it.
+        """
+        report = self.report()
+        tmp_path = self.report_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, self.report_path)
+        with open(self.report_path[:-len(".json")] + ".txt", "w") as f:
+            f.write(format_report(report))
+        return self.report_path
+
+def _mb(n):
+    return f"{n / 2**20:.1f}"
+
+def format_report(report):
+    """
+    Human-readable summary: stages by heap peak growth, then their top call sites.
+    """
+    lines = [
+        f"Memory profile for pid {report['pid']}",
+        "",
+        f"{'stage':<24}{'runs':>6}{'peak +MB':>10}{'retained MB':>13}{'heap peak MB':>14}{'RSS MB':>9}{'Chromium MB':>13}",
+    ]
+    for name, s in report["stages"].items():
+        lines.append(
+            f"{name:<24}{s['runs']:>6}{_mb(s['peak_delta_bytes']):>10}{_mb(s['retained_bytes_max']):>13}"
+            f"{_mb(s['peak_heap_bytes']):>14}{_mb(s['process_rss_max']):>9}{_mb(s['chromium_rss_max']):>13}"
+        )
+    for name, s in report["stages"].items():
+        if not s["top_sites"]:
+            continue
+        lines.append("")
+        lines.append(f"{name}: top call sites still allocated at the end of its first run")
+        for site in s["top_sites"]:
+            lines.append(f"  {site['size_diff_bytes'] / 1024:>10.1f} KiB {site['count_diff']:>8} blocks  {site['site']}")
+    return "\n".join(lines) + "\n"
+
+def get_memory_profiler():
+    """
+    Starts the process-wide profiler on first call when MEMORY_PROFILE_DIR is set;
+    returns None otherwise.
+    """
+    global _profiler
+    directory = os.environ.get(MEMORY_PROFILE_DIR_ENV)
+    if not directory:
+        return None
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = MemoryProfiler(directory, frames=int(os.environ.get(MEMORY_PROFILE_FRAMES_ENV, "8"))).start()
+            logging.info(f"Memory profiling enabled; reports go to {_profiler.report_path}")
+        return _profiler
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profile memory of a scan and solve on a synthetic train.")
+    parser.add_argument("--train", default="99999:30x80x150", help="Synthetic train as train:CxBxS")
+    parser.add_argument("--out", default="memory-profile", help="Report directory")
+    parser.add_argument("--offline", action="store_true",
+                        help="Parse generated payloads instead of scanning the mock server with Chromium")
+    args = parser.parse_args()
+
+    os.environ[MEMORY_PROFILE_DIR_ENV] = args.out
+    profiler = get_memory_profiler()
+
+    from mock_charts import MockChartsServer, synthetic_train
+    from scraper import CHARTS_URL_ENV, parse_coach_composition, scan_vacancies
+    from solver import process_vacancies, find_all_seat_chains
+    from scan_store import RouteEntry
+    from utils import generate_ticket_pdf
+
+    train_no = args.train.split(":")[0]
+    train = synthetic_train(args.train)
+    route = RouteEntry(train["stations"])
+    start_code = route.station_list[0]["code"]
+    end_code = route.station_list[-1]["code"]
+
+    if args.offline:
+        raw = []
+        with metrics.span("total", op="scan", train_no=train_no):
+            for coach, payload in train["coaches"].items():
+                with metrics.span("parse", coach=coach):
+                    raw.extend(parse_coach_composition(coach, payload))
+    else:
+        server = MockChartsServer({train_no: train}).start()
+        os.environ[CHARTS_URL_ENV] = server.url
+        try:
+            raw = scan_vacancies(train_no, "2025-12-15", start_code)
+        finally:
+            server.stop()
+
+    with metrics.span("process_vacancies", op="solve", train_no=train_no):
+        processed = process_vacancies(raw, route.index, start_code, end_code)
+    with metrics.span("find_all_seat_chains", op="solve", train_no=train_no):
+        chains = find_all_seat_chains(processed, route.index, start_code, end_code)
+    with metrics.span("dataframe_render", op="render", train_no=train_no):
+        import pandas as pd
+        pd.DataFrame(processed).style.background_gradient(subset=["Coverage_Pct"], cmap="Greens").to_html()
+    with metrics.span("pdf", op="render", train_no=train_no):
+        generate_ticket_pdf(chains[0] if chains else processed[:3], train_no, "2025-12-15", start_code, end_code)
+
+    profiler.stop()
+    print(format_report(profiler.report()))
+    print(f"Report written to {profiler.report_path}")
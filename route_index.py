@@ -0,0 +1,184 @@
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Mapping
+
+_INDEX_CACHE_SIZE = 16
+
+# Keyed by id(station_list); each entry holds a strong reference to its station_list,
+# so an id cannot be reused for a different route while it is cached
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+class RouteIndex:
+    """
+    Lookups over one train's route, built once per route and never modified.
+
+    stations: the station dicts in route order
+    codes, names, dists: per position
+    positions: code -> tuple of every position it holds, so loop routes that pass a
+        station twice keep both stops
+    """
+    def __init__(self, station_list):
+        self.stations = tuple(station_list)
+        self.codes = [s['code'] for s in self.stations]
+        self.names = [s['name'] or "" for s in self.stations]
+        self.dists = [s['dist'] for s in self.stations]
+
+        positions = {}
+        for i, code in enumerate(self.codes):
+            positions.setdefault(code, []).append(i)
+        self.positions = {code: tuple(p) for code, p in positions.items()}
+        self._keys = None
+        self._keys_lock = threading.Lock()
+        self._derived = {}
+
+    def _search_keys(self):
+        """
+        Sorted (key, position) pairs for prefix search: each code, the full name and
+        the name from each of its words on, lower-cased. Built on first search.
+        """
+        with self._keys_lock:
+            if self._keys is None:
+                self._keys = self._build_search_keys()
+            return self._keys
+
+    def _build_search_keys(self):
+        keys = set()
+        for i, (code, name) in enumerate(zip(self.codes, self.names)):
+            keys.add((code.lower(), i))
+            name = name.lower()
+            keys.add((name, i))
+            words = name.split()
+            for w in range(1, len(words)):
+                keys.add((" ".join(words[w:]), i))
+        return sorted(keys)
+
+    def derived(self, name, build):
+        """
+        Data other modules derive from this route (e.g. the route map's pre-rendered
+        stations), built once by build(index) and kept with the index, so it shares
+        the index's cache instead of keeping one of its own.
+        """
+        with self._keys_lock:
+            value = self._derived.get(name)
+        if value is None:
+            value = build(self)
+            with self._keys_lock:
+                value = self._derived.setdefault(name, value)
+        return value
+
+    @classmethod
+    def from_station_map(cls, station_map):
+        """
+        An index over a plain {code: km} map, stations ordered by distance.
+        """
+        return cls([{'code': code, 'name': code, 'dist': dist}
+                    for code, dist in sorted(station_map.items(), key=lambda item: item[1])])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def position(self, code, after=-1):
+        """
+        First position of code after position `after`, or None.
+        """
+        for p in self.positions.get(code, ()):
+            if p > after:
+                return p
+        return None
+
+    def segment(self, from_code, to_code, from_position=0):
+        """
+        (from, to) positions of a stretch travelled forwards: from_code's first stop at
+        or after from_position (else its first stop) and the first stop of to_code after
+        it. None if there is no such stretch. Pass a journey's start as from_position so
+        that, on a loop route, a vacancy from a repeated code starts at the stop the
+        journey actually passes.
+        """
+        start = self.position(from_code, after=from_position - 1)
+        if start is None:
+            start = self.position(from_code)
+        if start is None:
+            return None
+        end = self.position(to_code, after=start)
+        if end is None:
+            return None
+        return start, end
+
+    def journey(self, start, end):
+        """
+        (from, to) positions of a journey between two stations, each given as a route
+        position (what the station dropdowns return) or a code. A start code is its
+        first stop; an end code is its first stop after the start, else its first stop.
+        None for an unknown station; callers check that the journey runs forwards.
+        """
+        start = self._resolve(start)
+        if start is None:
+            return None
+        end = self._resolve(end, after=start)
+        if end is None:
+            return None
+        return start, end
+
+    def _resolve(self, station, after=None):
+        if isinstance(station, int):
+            return station if 0 <= station < len(self.codes) else None
+        if after is not None:
+            position = self.position(station, after=after)
+            if position is not None:
+                return position
+        return self.position(station)
+
+    def position_at(self, dist):
+        """
+        The position of the station at exactly `dist` km, or None.
+        """
+        i = bisect_left(self.dists, dist)
+        return i if i < len(self.dists) and self.dists[i] == dist else None
+
+    def label(self, position):
+        """
+        "CODE - NAME", as shown in the station dropdowns.
+        """
+        return f"{self.codes[position]} - {self.names[position]}"
+
+    def search(self, prefix, limit=10):
+        """
+        Positions of stations whose code, name or a word of the name starts with
+        prefix (case-insensitive), in route order, at most limit of them.
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return list(range(min(limit, len(self.codes))))
+        found = set()
+        keys = self._search_keys()
+        for key, position in keys[bisect_left(keys, (prefix, -1)):]:
+            if not key.startswith(prefix):
+                break
+            found.add(position)
+        return sorted(found)[:limit]
+
+def get_route_index(route):
+    """
+    The RouteIndex for a route given as a RouteIndex, a {code: km} map or a station
+    list. Station lists are indexed once and cached, keyed by identity; like the
+    renderers in utils, they are treated as immutable.
+    """
+    if isinstance(route, RouteIndex):
+        return route
+    if isinstance(route, Mapping):
+        return RouteIndex.from_station_map(route)
+
+    key = id(route)
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] is route:
+            _indexes.move_to_end(key)
+            return cached[1]
+    index = RouteIndex(route)
+    with _indexes_lock:
+        _indexes[key] = (route, index)
+        while len(_indexes) > _INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,204 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+from route_index import get_route_index
+
+VACANCY_FIELDS = ("Coach", "Berth", "Type", "From", "To")
+STATION_FIELDS = ("code", "name", "dist")
+
+class _Record(tuple):
+    """
+    Immutable tuple that also supports read-only dict-style access by field name,
+    so it can be passed anywhere a raw vacancy or station dict is expected.
+    """
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else tuple.__getitem__(self, i)
+
+    def keys(self):
+        return self._fields
+
+    def to_dict(self):
+        return dict(zip(self._fields, self))
+
+class VacancyRecord(_Record):
+    __slots__ = ()
+    _fields = VACANCY_FIELDS
+    _index = {f: i for i, f in enumerate(VACANCY_FIELDS)}
+
+class StationRecord(_Record):
+    __slots__ = ()
+    _fields = STATION_FIELDS
+    _index = {f: i for i, f in enumerate(STATION_FIELDS)}
+
+def _intern(value):
+    # Station codes, coach names and berth types repeat thousands of times per scan
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _records(cls, rows):
+    return tuple(cls(_intern(row.get(f)) for f in cls._fields) for row in rows)
+
+def _estimate_size(rows):
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+    return size
+
+class RouteEntry:
+    """
+    Immutable route of a train: station_list (tuple of StationRecord), its RouteIndex
+    (index) and station_map (code -> km of its first stop).
+    """
+    __slots__ = ("station_list", "index", "station_map", "nbytes")
+
+    def __init__(self, stations):
+        self.station_list = _records(StationRecord, stations)
+        # Shared with the renderers in utils, which look routes up by station_list
+        self.index = get_route_index(self.station_list)
+        self.station_map = MappingProxyType({code: self.index.dists[p[0]] for code, p in self.index.positions.items()})
+        self.nbytes = _estimate_size(self.station_list) + sys.getsizeof(self.station_map.copy())
+
+class ScanEntry:
+    """
+    Immutable result of one vacancy scan: raw_vacancies (tuple of VacancyRecord), and
+    the coaches it found, could not fetch (missing), filled from an older scan (stale)
+    or did not need once its goal was met (skipped).
+    """
+    __slots__ = ("raw_vacancies", "coaches", "missing", "stale", "skipped", "nbytes")
+
+    def __init__(self, vacancies):
+        self.raw_vacancies = _records(VacancyRecord, vacancies)
+        # Set when vacancies is a scraper.ScanResult
+        self.coaches = tuple(getattr(vacancies, "coaches", ()))
+        self.missing = tuple(getattr(vacancies, "missing", ()))
+        self.stale = tuple(getattr(vacancies, "stale", ()))
+        self.skipped = tuple(getattr(vacancies, "skipped", ()))
+        self.nbytes = _estimate_size(self.raw_vacancies)
+
+    @property
+    def complete(self):
+        return not self.missing and not self.stale
+
+def route_key(train_no):
+    return ("route", train_no)
+
+def scan_key(train_no, journey_date, boarding_stn_code, holder=None):
+    """
+    Key of the shared scan of a chart or, with holder, of a scan only that session
+    sees (one that does not cover every coach), kept apart from the shared one.
+    """
+    key = ("scan", train_no, journey_date, boarding_stn_code)
+    return key if holder is None else key + (holder,)
+
+class ScanStore:
+    """
+    Process-wide LRU store of routes and scan results shared by all sessions.
+    Sessions keep only the key. An entry is pinned while a session holds it; holders
+    that have not touched an entry within holder_ttl seconds no longer count, since
+    Streamlit gives no notice when a tab is closed.
+    """
+    def __init__(self, max_entries=64, max_bytes=64 * 1024 * 1024, holder_ttl=1800):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.holder_ttl = holder_ttl
+        self._entries = OrderedDict()  # key -> entry, least recently used first
+        self._holders = {}  # key -> {holder: last_seen}
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def put(self, key, entry, holder=None):
+        """
+        Stores an entry (replacing any older one under the same key) and returns the key.
+        """
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            if holder is not None:
+                self.acquire(key, holder)
+            self._evict()
+        return key
+
+    def put_route(self, train_no, stations, holder=None):
+        return self.put(route_key(train_no), RouteEntry(stations), holder)
+
+    def put_scan(self, train_no, journey_date, boarding_stn_code, vacancies, holder=None, private=False):
+        """
+        Stores a scan under the chart's shared key, or under holder's own key when
+        private, so other sessions (and later scans using it as `previous`) never see it.
+        """
+        key = scan_key(train_no, journey_date, boarding_stn_code, holder if private else None)
+        return self.put(key, ScanEntry(vacancies), holder)
+
+    def get(self, key, holder=None):
+        """
+        Returns the entry for key (marking it recently used), or None if it was evicted.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            if holder is not None:
+                self.acquire(key, holder)
+            return entry
+
+    def acquire(self, key, holder):
+        with self._lock:
+            if key in self._entries:
+                self._holders.setdefault(key, {})[holder] = time.monotonic()
+
+    def release(self, key, holder):
+        with self._lock:
+            holders = self._holders.get(key)
+            if holders is not None:
+                holders.pop(holder, None)
+                if not holders:
+                    del self._holders[key]
+
+    def refcount(self, key):
+        with self._lock:
+            cutoff = time.monotonic() - self.holder_ttl
+            holders = self._holders.get(key, {})
+            return sum(1 for last_seen in holders.values() if last_seen >= cutoff)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "pinned": sum(1 for key in self._entries if self.refcount(key) > 0)
+            }
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            if len(self._entries) <= 1:
+                break
+            # Least recently used entry nobody holds; fall back to plain LRU if all are pinned
+            victim = next((key for key in self._entries if self.refcount(key) == 0), None)
+            if victim is None:
+                victim = next(iter(self._entries))
+            entry = self._entries.pop(victim)
+            self._holders.pop(victim, None)
+            self._bytes -= entry.nbytes
+
+# Shared by every Streamlit session in this process
+STORE = ScanStore(
+    max_entries=int(os.environ.get("SCAN_STORE_MAX_ENTRIES", "64")),
+    max_bytes=int(os.environ.get("SCAN_STORE_MAX_MB", "64")) * 1024 * 1024
+)
@@ -1,8 +1,33 @@
 import logging
-from playwright.sync_api import sync_playwright
 import time
 import json
 import os
+import random
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import CancelledError
+from browser_pool import get_browser_pool
+from metrics import span
+from coach_scheduler import get_coach_scheduler
+from browser_state import get_browser_state
+from solver import rank_coaches
+
+# Point the scraper at another charts site, e.g. a local mock_charts.py server
+CHARTS_URL_ENV = "CHARTS_URL"
+DEFAULT_CHARTS_URL = "https://www.irctc.co.in/online-charts/"
+
+# Per-coach resilience
+COACH_RETRIES_ENV = "COACH_RETRIES"
+# "1" sends a second request for a coach still unanswered after the pod's p95 latency
+COACH_HEDGING_ENV = "COACH_HEDGING"
+SCAN_DEADLINE_ENV = "SCAN_DEADLINE_SECONDS"
+COACH_TIMEOUT_MS = 5000
+COACH_RETRY_BACKOFF_MS = 500
+# Longest a cancelled scan keeps waiting on a page before it notices
+CANCEL_POLL_MS = 250
+# A navigation not committed within this long is waited for in CANCEL_POLL_MS slices
+GOTO_FIRST_TRY_MS = 1000
 
 # Configure logging
 logging.basicConfig(
@@ -14,9 +39,12 @@ logging.basicConfig(
     ]
 )
 
-def launch_browser(p, headless=True):
+def charts_url():
+    return os.environ.get(CHARTS_URL_ENV, DEFAULT_CHARTS_URL)
+
+def launch_chromium(p, headless=True):
     """
-    Launches a browser instance.
+    Launches a Chromium instance.
     Uses 'Fake Headless' mode (Headful + Off-screen) if headless=True
     to bypass strict anti-bot protections that block true headless browsers.
     """
@@ -48,10 +76,18 @@ def launch_browser(p, headless=True):
         # Local Headful (Visible)
         actual_headless = False
         args.append("--window-position=50,50")
-    browser = p.chromium.launch(headless=actual_headless, args=args)
-    
+    with span("browser_launch", op="browser"):
+        return p.chromium.launch(headless=actual_headless, args=args)
+
+def new_stealth_context(browser, storage_state=None):
+    """
+    Creates an isolated context with a real user agent and the webdriver flag hidden.
+    Scans each get a fresh context, so a pooled browser carries no state between them
+    beyond the cookies and localStorage passed in as storage_state.
+    """
     # Create context with real user agent and viewport
     context = browser.new_context(
+        storage_state=storage_state,
         user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         viewport={"width": 1366, "height": 768},
         locale="en-US",
@@ -67,319 +103,864 @@ def launch_browser(p, headless=True):
     
     # Resource blocking removed as requested
 
-    
-    return browser, context
+    return context
+
+def launch_browser(p, headless=True):
+    """
+    Launches a browser instance and a stealth context on it.
+    """
+    browser = launch_chromium(p, headless)
+    return browser, new_stealth_context(browser)
+
+def _run_in_browser(fn, headless, purpose, *args, progress_callback=None, **kwargs):
+    """
+    Runs fn(browser, *args, **kwargs) on a warm pooled browser, or on a freshly
+    launched one in Developer Mode (visible window) or when the pool is disabled.
+    """
+    if progress_callback:
+        kwargs["progress_callback"] = progress_callback
+
+    pool = get_browser_pool() if headless else None
+    if pool is not None:
+        try:
+            return pool.run(fn, *args, **kwargs)
+        except CancelledError:
+            # Cancelled while still queued for a browser
+            raise ScanCancelled(f"{purpose} cancelled before it started")
+
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        logging.info(f"Launching browser for {purpose} (Headless: {headless})...")
+        browser = launch_chromium(p, headless)
+        try:
+            return fn(browser, *args, **kwargs)
+        finally:
+            browser.close()
 
 def get_train_route(train_no, headless=True):
     """
     Launches browser, inputs train number, and scrapes the schedule.
     Returns a list of dictionaries: [{'code': 'SBC', 'name': 'KSR BENGALURU', 'dist': 0}, ...]
     """
+    return _run_in_browser(_get_train_route, headless, "Route Discovery", train_no)
+
+def _select_train(page, train_no):
+    """
+    Types the train number into the train combobox and picks the first suggestion.
+    """
+    # Input Train Number
+    try:
+        # Force click the input to bypass overlays
+        train_input = page.locator("input[role='combobox']").first
+        if not train_input.is_visible():
+             train_input = page.locator("input[aria-autocomplete='list']").first
+
+        # Use force=True to bypass the "Train Name/Number*" label overlay
+        train_input.click(force=True)
+        _pause(page, 200)
+        train_input.fill(train_no)
+        _pause(page, 500)
+
+        # Check if value was entered
+        if train_input.input_value() != train_no:
+            logging.warning("Input fill failed, trying force...")
+            train_input.evaluate(f"el => el.value = '{train_no}'")
+            train_input.type(" ") # Trigger event
+    except ScanCancelled:
+        raise
+    except Exception as e:
+        logging.warning(f"Train input interaction failed: {e}")
+
+    # Wait for dropdown options to appear
+    try:
+        # Wait for options
+        _wait_cancellable(lambda timeout: page.wait_for_selector("li[role='option']", timeout=timeout), 5000)
+
+        # Click the first option explicitly with force
+        option = page.locator("li[role='option']").first
+        option.click(force=True)
+        logging.info(f"Clicked option: {option.inner_text()}")
+    except ScanCancelled:
+        raise
+    except Exception as e:
+        logging.warning(f"Dropdown selection failed: {e}")
+        # Fallback: Try pressing Enter if click failed
+        page.keyboard.press("Enter")
+
+def _read_schedule(page, train_no):
+    """
+    Opens the Schedule table and scrapes it into station dictionaries.
+    """
     station_list = []
-    
-    with sync_playwright() as p:
-        logging.info(f"Launching browser for Route Discovery (Headless: {headless})...")
-        browser, context = launch_browser(p, headless)
+
+    # Click Schedule
+    schedule_btn = page.locator("button:has-text('Schedule')").first
+    if _visible_within(schedule_btn, 5000):
+        schedule_btn.click()
+        _wait_cancellable(lambda timeout: page.wait_for_selector("table", state="visible", timeout=timeout), 10000)
+
+        rows = page.locator("table tr").all()
+        for row in rows[1:]:
+            cells = row.locator("td").all()
+            if len(cells) >= 4:
+                code = cells[1].inner_text().strip()
+                name = cells[2].inner_text().strip()
+                dist_text = cells[3].inner_text().strip()
+                dist_val = int(''.join(filter(str.isdigit, dist_text)))
+
+                station_list.append({
+                    "code": code,
+                    "name": name,
+                    "dist": dist_val
+                })
+        logging.info(f"Scraped {len(station_list)} stations.")
+    else:
+        logging.error("Schedule button not found. Using fallback if available.")
+        # Fallback for 12627
+        if "12627" in train_no:
+            logging.info("Using fallback data for 12627.")
+            fallback_map = {
+                "SBC": 0, "BNC": 4, "BNCE": 7, "KJM": 14, "YNK": 18, 
+                "DBU": 45, "GBD": 65, "HUP": 106, "PKD": 154, "SSPN": 174,
+                "DMM": 186, "ATP": 219, "GY": 276, "GTL": 287, "AD": 342,
+                "RC": 409, "YG": 478, "WADI": 516, "KLBG": 553, "SUR": 666,
+                "KWV": 779, "DD": 853, "ANG": 937, "BAP": 1004, "KPG": 1049,
+                "MMR": 1091, "JL": 1251, "BSL": 1275, "BAU": 1344, "KNW": 1399,
+                "ET": 1582, "BPL": 1674, "BINA": 1812, "VGLJ": 1965, "GWL": 2062,
+                "AGC": 2180, "MTJ": 2234, "NZM": 2368, "NDLS": 2375
+            }
+            fallback_names = {
+                "SBC": "KSR BENGALURU", "BNC": "BENGALURU CANT", "BNCE": "BENGALURU EAST", 
+                "KJM": "KRISHNARAJAPURM", "YNK": "YELHANKA JN", "DBU": "DODBALLAPUR",
+                "GBD": "GAURIBIDANUR", "HUP": "HINDUPUR", "PKD": "PENUKONDA",
+                "SSPN": "SAI P NILAYAM", "DMM": "DHARMAVARAM JN", "ATP": "ANANTAPUR",
+                "GY": "GOOTY JN", "GTL": "GUNTAKAL JN", "AD": "ADONI",
+                "RC": "RAICHUR", "YG": "YADGIR", "WADI": "WADI",
+                "KLBG": "KALABURAGI", "SUR": "SOLAPUR JN", "KWV": "KURDUVADI",
+                "DD": "DAUND JN", "ANG": "AHMADNAGAR", "BAP": "BELAPUR",
+                "KPG": "KOPARGAON", "MMR": "MANMAD JN", "JL": "JALGAON JN",
+                "BSL": "BHUSAVAL JN", "BAU": "BURHANPUR", "KNW": "KHANDWA",
+                "ET": "ITARSI JN", "BPL": "BHOPAL JN", "BINA": "BINA JN",
+                "VGLJ": "V LAKSHMIBAIJHS", "GWL": "GWALIOR", "AGC": "AGRA CANTT",
+                "MTJ": "MATHURA JN", "NZM": "H NIZAMUDDIN", "NDLS": "NEW DELHI"
+            }
+            for code, dist in fallback_map.items():
+                name = fallback_names.get(code, code)
+                station_list.append({"code": code, "name": name, "dist": dist})
+
+    return station_list
+
+def _get_train_route(browser, train_no):
+    station_list = []
+
+    with span("total", op="route", train_no=train_no) as total:
+        context = new_stealth_context(browser, get_browser_state().storage_state)
         page = context.new_page()
 
         try:
             # Increased timeout and added wait_until='commit' to be less strict if load hangs
-            page.goto("https://www.irctc.co.in/online-charts/", timeout=60000, wait_until="domcontentloaded")
-            
-            # Input Train Number
-            try:
-                # Force click the input to bypass overlays
-                train_input = page.locator("input[role='combobox']").first
-                if not train_input.is_visible():
-                     train_input = page.locator("input[aria-autocomplete='list']").first
-                
-                # Use force=True to bypass the "Train Name/Number*" label overlay
-                train_input.click(force=True)
-                page.wait_for_timeout(200)
-                train_input.fill(train_no)
-                page.wait_for_timeout(500)
-                
-                # Check if value was entered
-                if train_input.input_value() != train_no:
-                    logging.warning("Input fill failed, trying force...")
-                    train_input.evaluate(f"el => el.value = '{train_no}'")
-                    train_input.type(" ") # Trigger event
-            except Exception as e:
-                logging.warning(f"Train input interaction failed: {e}")
-            
-            # Wait for dropdown options to appear
-            try:
-                # Wait for options
-                page.wait_for_selector("li[role='option']", timeout=5000)
-                
-                # Click the first option explicitly with force
-                option = page.locator("li[role='option']").first
-                option.click(force=True)
-                logging.info(f"Clicked option: {option.inner_text()}")
-            except Exception as e:
-                logging.warning(f"Dropdown selection failed: {e}")
-                # Fallback: Try pressing Enter if click failed
-                page.keyboard.press("Enter")
-            
+            with span("goto"):
+                _goto(page, charts_url(), 60000)
+
+            with span("train_select"):
+                _select_train(page, train_no)
+
             logging.info("Train selected. Waiting for Schedule button...")
-            page.wait_for_timeout(2000)
-
-            # Click Schedule
-            schedule_btn = page.locator("button:has-text('Schedule')").first
-            if schedule_btn.is_visible(timeout=5000):
-                schedule_btn.click()
-                page.wait_for_selector("table", state="visible", timeout=10000)
-                
-                rows = page.locator("table tr").all()
-                for row in rows[1:]:
-                    cells = row.locator("td").all()
-                    if len(cells) >= 4:
-                        code = cells[1].inner_text().strip()
-                        name = cells[2].inner_text().strip()
-                        dist_text = cells[3].inner_text().strip()
-                        dist_val = int(''.join(filter(str.isdigit, dist_text)))
-                        
-                        station_list.append({
-                            "code": code,
-                            "name": name,
-                            "dist": dist_val
-                        })
-                logging.info(f"Scraped {len(station_list)} stations.")
-            else:
-                logging.error("Schedule button not found. Using fallback if available.")
-                # Fallback for 12627
-                if "12627" in train_no:
-                    logging.info("Using fallback data for 12627.")
-                    fallback_map = {
-                        "SBC": 0, "BNC": 4, "BNCE": 7, "KJM": 14, "YNK": 18, 
-                        "DBU": 45, "GBD": 65, "HUP": 106, "PKD": 154, "SSPN": 174,
-                        "DMM": 186, "ATP": 219, "GY": 276, "GTL": 287, "AD": 342,
-                        "RC": 409, "YG": 478, "WADI": 516, "KLBG": 553, "SUR": 666,
-                        "KWV": 779, "DD": 853, "ANG": 937, "BAP": 1004, "KPG": 1049,
-                        "MMR": 1091, "JL": 1251, "BSL": 1275, "BAU": 1344, "KNW": 1399,
-                        "ET": 1582, "BPL": 1674, "BINA": 1812, "VGLJ": 1965, "GWL": 2062,
-                        "AGC": 2180, "MTJ": 2234, "NZM": 2368, "NDLS": 2375
-                    }
-                    fallback_names = {
-                        "SBC": "KSR BENGALURU", "BNC": "BENGALURU CANT", "BNCE": "BENGALURU EAST", 
-                        "KJM": "KRISHNARAJAPURM", "YNK": "YELHANKA JN", "DBU": "DODBALLAPUR",
-                        "GBD": "GAURIBIDANUR", "HUP": "HINDUPUR", "PKD": "PENUKONDA",
-                        "SSPN": "SAI P NILAYAM", "DMM": "DHARMAVARAM JN", "ATP": "ANANTAPUR",
-                        "GY": "GOOTY JN", "GTL": "GUNTAKAL JN", "AD": "ADONI",
-                        "RC": "RAICHUR", "YG": "YADGIR", "WADI": "WADI",
-                        "KLBG": "KALABURAGI", "SUR": "SOLAPUR JN", "KWV": "KURDUVADI",
-                        "DD": "DAUND JN", "ANG": "AHMADNAGAR", "BAP": "BELAPUR",
-                        "KPG": "KOPARGAON", "MMR": "MANMAD JN", "JL": "JALGAON JN",
-                        "BSL": "BHUSAVAL JN", "BAU": "BURHANPUR", "KNW": "KHANDWA",
-                        "ET": "ITARSI JN", "BPL": "BHOPAL JN", "BINA": "BINA JN",
-                        "VGLJ": "V LAKSHMIBAIJHS", "GWL": "GWALIOR", "AGC": "AGRA CANTT",
-                        "MTJ": "MATHURA JN", "NZM": "H NIZAMUDDIN", "NDLS": "NEW DELHI"
-                    }
-                    for code, dist in fallback_map.items():
-                        name = fallback_names.get(code, code)
-                        station_list.append({"code": code, "name": name, "dist": dist})
-                
+            _pause(page, 2000)
+
+            with span("schedule") as event:
+                station_list = _read_schedule(page, train_no)
+                event["stations"] = len(station_list)
+
         except Exception as e:
+            total["status"] = "error"
             logging.error(f"Error in get_train_route: {e}")
         finally:
-            browser.close()
+            context.close()
             
     return station_list
 
-def scan_vacancies(train_no, journey_date, boarding_stn_code, headless=True, progress_callback=None):
+def parse_coach_composition(coach_name, data):
     """
-    Scans all coaches for vacancies using API interception.
-    Returns a list of raw vacancy dictionaries.
+    Converts one coachComposition payload into raw vacancy dictionaries.
+    Consecutive vacant segments of a berth are merged into a single vacancy.
     """
     vacancies = []
+    if "bdd" not in data:
+        return vacancies
+
+    for seat in data["bdd"]:
+        berth_no = seat.get("berthNo")
+        berth_code = seat.get("berthCode")
+        bsd = seat.get("bsd", [])
+        
+        current_vacancy = None
+        for segment in bsd:
+            is_occupied = segment.get("occupancy", True)
+            from_stn = segment.get("from")
+            to_stn = segment.get("to")
+            
+            if not is_occupied:
+                if current_vacancy and current_vacancy["To"] == from_stn:
+                    current_vacancy["To"] = to_stn
+                else:
+                    if current_vacancy:
+                        vacancies.append(current_vacancy)
+                    current_vacancy = {
+                        "Coach": coach_name,
+                        "Berth": berth_no,
+                        "Type": berth_code,
+                        "From": from_stn,
+                        "To": to_stn
+                    }
+            else:
+                if current_vacancy:
+                    vacancies.append(current_vacancy)
+                    current_vacancy = None
+        
+        if current_vacancy:
+            vacancies.append(current_vacancy)
+
+    return vacancies
+
+class ScanCancelled(Exception):
+    """
+    Raised by scan_vacancies when its cancel event was set; the partial scan is discarded.
+    """
+
+# The cancel event of the scan running on this thread, for the waits deep in the page flow
+_scan_local = threading.local()
+
+@contextmanager
+def _cancel_scope(cancel):
+    previous = getattr(_scan_local, "cancel", None)
+    _scan_local.cancel = cancel
+    try:
+        yield
+    finally:
+        _scan_local.cancel = previous
+
+def _check_cancelled():
+    cancel = getattr(_scan_local, "cancel", None)
+    if cancel is not None and cancel.is_set():
+        raise ScanCancelled("Scan cancelled")
+
+def _pause(page, ms):
+    """
+    page.wait_for_timeout in CANCEL_POLL_MS slices, raising ScanCancelled between them.
+    """
+    ends = time.monotonic() + ms / 1000
+    while True:
+        _check_cancelled()
+        remaining_ms = (ends - time.monotonic()) * 1000
+        if remaining_ms <= 0:
+            return
+        page.wait_for_timeout(min(remaining_ms, CANCEL_POLL_MS))
+
+def _visible_within(locator, timeout_ms):
+    """
+    Whether locator becomes visible within timeout_ms, waiting in cancellable slices.
+    """
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+    try:
+        _wait_cancellable(lambda timeout: locator.wait_for(state="visible", timeout=timeout), timeout_ms)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+def _goto(page, url, timeout_ms):
+    """
+    page.goto(url, wait_until="domcontentloaded") that stays cancellable. The first try
+    waits GOTO_FIRST_TRY_MS for the navigation to commit; a slow one carries on in the
+    browser and is waited for in CANCEL_POLL_MS slices, as is the DOM after it. Raises
+    Playwright's timeout error once timeout_ms passes.
+    """
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+    ends = time.monotonic() + timeout_ms / 1000
+    committed = []
+    on_navigated = lambda frame: committed.append(frame) if frame == page.main_frame else None
+    _check_cancelled()
+    page.on("framenavigated", on_navigated)
+    try:
+        try:
+            page.goto(url, timeout=min(GOTO_FIRST_TRY_MS, timeout_ms), wait_until="commit")
+        except PlaywrightTimeoutError:
+            while not committed:
+                remaining_ms = (ends - time.monotonic()) * 1000
+                if remaining_ms <= 0:
+                    raise
+                _pause(page, min(remaining_ms, CANCEL_POLL_MS))
+    finally:
+        page.remove_listener("framenavigated", on_navigated)
+
+    remaining_ms = max(1, (ends - time.monotonic()) * 1000)
+    _wait_cancellable(lambda timeout: page.wait_for_load_state("domcontentloaded", timeout=timeout), remaining_ms)
+
+def _wait_cancellable(wait, timeout_ms):
+    """
+    Runs a Playwright wait (a callable taking a timeout in ms) in CANCEL_POLL_MS slices,
+    raising ScanCancelled between them. Raises the wait's timeout error once timeout_ms passes.
+    """
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+    ends = time.monotonic() + timeout_ms / 1000
+    while True:
+        _check_cancelled()
+        remaining_ms = (ends - time.monotonic()) * 1000
+        try:
+            return wait(max(1, min(remaining_ms, CANCEL_POLL_MS)))
+        except PlaywrightTimeoutError:
+            if time.monotonic() >= ends:
+                raise
+
+class ScanResult(list):
+    """
+    Raw vacancy dictionaries from one scan, tagged with the coaches it could not cover.
+    coaches: Every coach found on the chart, in scan order.
+    missing: Coaches with no data (failed after retries, or cut off by the scan deadline).
+    stale: Coaches whose vacancies were carried over from the previous scan instead.
+    skipped: Coaches not scanned because the scan's goal was already met.
+    """
+    def __init__(self, vacancies=(), coaches=(), missing=(), stale=(), skipped=()):
+        super().__init__(vacancies)
+        self.coaches = list(coaches)
+        self.missing = list(missing)
+        self.stale = list(stale)
+        self.skipped = list(skipped)
+
+    @property
+    def complete(self):
+        return not self.missing and not self.stale
+
+def carry_over_stale(vacancies, missing, previous):
+    """
+    Fills missing coaches from a previous scan's vacancies where it has them.
+    Returns (vacancies, still missing, stale).
+    """
+    previous_by_coach = {}
+    for v in previous or ():
+        previous_by_coach.setdefault(v['Coach'], []).append(v)
+
+    vacancies = list(vacancies)
+    still_missing = []
+    stale = []
+    for coach in missing:
+        if coach in previous_by_coach:
+            vacancies.extend(dict(v) if isinstance(v, dict) else v.to_dict() for v in previous_by_coach[coach])
+            stale.append(coach)
+        else:
+            still_missing.append(coach)
+    return vacancies, still_missing, stale
+
+def scan_vacancies(train_no, journey_date, boarding_stn_code, headless=True, progress_callback=None, payload_callback=None,
+                   deadline_seconds=None, previous=None, coach_cache=None, goal=None, coach_priority=None, cancel=None):
+    """
+    Scans all coaches for vacancies using API interception.
+    Returns a ScanResult: a list of raw vacancy dictionaries plus missing/stale coaches.
+    payload_callback: Optional callable(coach_name, data) receiving each raw coachComposition payload.
+    deadline_seconds: Stop scanning coaches after this long (default SCAN_DEADLINE_SECONDS, 180).
+    previous: Vacancies from an earlier scan of the same train, date and boarding station,
+        used for coaches this scan could not fetch.
+    coach_cache: Optional dict, kept by the caller across scans of the same chart, of
+        coach -> (payload digest, vacancies). Coaches whose payload is unchanged reuse the
+        cached vacancies (and skip payload_callback); the others are parsed and cached.
+    goal: Optional solver.ScanGoal. Coaches are scanned likeliest first and the scan stops
+        once the goal is met; the rest are listed in the result's `skipped`.
+    coach_priority: Optional {coach: mean vacancies} from earlier scans, to order coaches for a goal.
+    cancel: Optional threading.Event; once set, the scan stops before its next coach, or
+        within CANCEL_POLL_MS of a page wait, closes its page and context and raises
+        ScanCancelled. A scan still queued for a pooled browser is dropped instead.
+    """
+    return _run_in_browser(
+        _scan_vacancies, headless, "Vacancy Scan",
+        train_no, journey_date, boarding_stn_code,
+        progress_callback=progress_callback,
+        payload_callback=payload_callback,
+        deadline_seconds=deadline_seconds,
+        previous=previous,
+        coach_cache=coach_cache,
+        goal=goal,
+        coach_priority=coach_priority,
+        cancel=cancel
+    )
+
+def _select_boarding(page, boarding_stn_code):
+    logging.info(f"Selecting Boarding Station: {boarding_stn_code}")
+    try:
+        # Force click boarding station input
+        boarding_input = page.locator("input[aria-autocomplete='list']").nth(1)
+        boarding_input.click(force=True)
+        _pause(page, 200)
+        boarding_input.fill(boarding_stn_code)
+
+        # Wait for dropdown options
+        _wait_cancellable(lambda timeout: page.wait_for_selector("li[role='option']", timeout=timeout), 5000)
+
+        # Click first option
+        page.locator("li[role='option']").first.click(force=True)
+    except ScanCancelled:
+        raise
+    except Exception as e:
+        logging.warning(f"Boarding station selection failed: {e}")
+        # Fallback
+        page.keyboard.press("ArrowDown")
+        page.keyboard.press("Enter")
+
+def _select_date(page, journey_date, journey_day):
+    """
+    Picks the journey day in the date picker, forcing the value via JS if the UI ignores it.
+    """
+    date_input = None
     try:
-        journey_day = str(int(journey_date.split("-")[2]))
+        date_input = page.locator("input.jss466").first
+        if not date_input.is_visible():
+             date_input = page.locator("input[placeholder*='Date']").first
+
+        # Force click date input
+        date_input.click(force=True)
+        _pause(page, 500)
+
+        day_locator = page.locator("button").filter(has_text=journey_day).first
+        if day_locator.is_visible():
+            day_locator.click(force=True)
+        else:
+            page.locator(f"text='{journey_day}'").last.click(force=True)
+    except ScanCancelled:
+        raise
+    except Exception as e:
+        logging.warning(f"UI Date selection failed: {e}")
+
+    _pause(page, 500)
+
+    # Strategy 2: Verify and Force if needed
+    try:
+        current_val = date_input.input_value()
+        if journey_day not in current_val:
+            logging.info("Date not updated via UI. Forcing via JS...")
+            page.evaluate("document.querySelector('input.jss466').removeAttribute('readonly')")
+            page.locator("input.jss466").fill(journey_date)
+            page.keyboard.press("Enter")
+    except Exception as e:
+        logging.error(f"Date verification/force failed: {e}")
+
+def _get_chart(page):
+    """
+    Submits the form and waits for the vacant berth page to settle.
+    """
+    logging.info("Submitting...")
+    # Force click to bypass any potential overlays
+    get_chart_btn = page.locator("button:has-text('Get Train Chart')")
+    get_chart_btn.click(force=True)
+
+    # Wait for URL change or error
+    try:
+        _wait_cancellable(
+            lambda timeout: page.wait_for_url(lambda url: "vacant-berth" in url or "traincomposition" in url, timeout=timeout),
+            15000
+        )
+    except ScanCancelled:
+        raise
     except:
-        logging.warning(f"Invalid date format: {journey_date}. Defaulting to '15'.")
-        journey_day = "15"
+        logging.warning("URL did not change, checking for errors...")
 
-    with sync_playwright() as p:
-        logging.info(f"Launching browser for Vacancy Scan (Headless: {headless})...")
-        browser, context = launch_browser(p, headless)
-        page = context.new_page()
+    try:
+        _wait_cancellable(lambda timeout: page.wait_for_load_state("networkidle", timeout=timeout), 10000)
+    except ScanCancelled:
+        raise
+    except Exception as e:
+        logging.warning(f"Wait for load state failed (non-critical): {e}")
 
+def _find_coach_buttons(page):
+    all_buttons = page.locator("button").all()
+    coach_buttons = []
+    for btn in all_buttons:
         try:
-            page.goto("https://www.irctc.co.in/online-charts/", timeout=60000, wait_until="domcontentloaded")
-            
-            # --- Input Train ---
-            try:
-                # Force click the input to bypass overlays
-                train_input = page.locator("input[role='combobox']").first
-                if not train_input.is_visible():
-                     train_input = page.locator("input[aria-autocomplete='list']").first
-                
-                # Use force=True to bypass the "Train Name/Number*" label overlay
-                train_input.click(force=True)
-                page.wait_for_timeout(200)
-                train_input.fill(train_no)
-                page.wait_for_timeout(500)
-                
-                # Check if value was entered
-                if train_input.input_value() != train_no:
-                    logging.warning("Input fill failed, trying force...")
-                    train_input.evaluate(f"el => el.value = '{train_no}'")
-                    train_input.type(" ") # Trigger event
-            except Exception as e:
-                logging.warning(f"Train input interaction failed: {e}")
-            
-            # Wait for dropdown options
-            try:
-                # Wait for options
-                page.wait_for_selector("li[role='option']", timeout=5000)
-                
-                # Click the first option explicitly with force
-                option = page.locator("li[role='option']").first
-                option.click(force=True)
-            except Exception as e:
-                logging.warning(f"Dropdown selection failed: {e}")
-                page.keyboard.press("Enter")
-            
-            page.wait_for_timeout(1000)
+            txt = btn.inner_text()
+            if len(txt) < 5 and any(c.isdigit() for c in txt):
+                coach_buttons.append(btn)
+        except Exception as e:
+            logging.warning(f"Error inspecting button: {e}")
+            continue
+    return coach_buttons
 
-            # --- Select Boarding Station ---
-            logging.info(f"Selecting Boarding Station: {boarding_stn_code}")
-            try:
-                # Force click boarding station input
-                boarding_input = page.locator("input[aria-autocomplete='list']").nth(1)
-                boarding_input.click(force=True)
-                page.wait_for_timeout(200)
-                boarding_input.fill(boarding_stn_code)
-                
-                # Wait for dropdown options
-                page.wait_for_selector("li[role='option']", timeout=5000)
-                
-                # Click first option
-                page.locator("li[role='option']").first.click(force=True)
-            except Exception as e:
-                logging.warning(f"Boarding station selection failed: {e}")
-                # Fallback
-                page.keyboard.press("ArrowDown")
-                page.keyboard.press("Enter")
+class CoachResponseError(Exception):
+    """
+    coachComposition answered with a non-200 status (429 means we are being throttled).
+    """
+    def __init__(self, status):
+        super().__init__(f"coachComposition returned HTTP {status}")
+        self.status = status
 
-            page.wait_for_timeout(500)
+def _is_coach_response(response, coach_name):
+    """
+    True for a coachComposition response belonging to coach_name. A late answer to an
+    earlier coach's timed-out or hedged request names a different coach and is ignored.
+    Requests whose body does not name a coach are accepted.
+    """
+    if "coachComposition" not in response.url:
+        return False
+    try:
+        body = response.request.post_data_json
+    except Exception:
+        return True
+    if isinstance(body, dict) and body.get("coach") not in (None, coach_name):
+        return False
+    return True
 
-            # --- Select Date ---
-            try:
-                date_input = page.locator("input.jss466").first
-                if not date_input.is_visible():
-                     date_input = page.locator("input[placeholder*='Date']").first
-                
-                # Force click date input
-                date_input.click(force=True)
-                page.wait_for_timeout(500)
-                
-                day_locator = page.locator("button").filter(has_text=journey_day).first
-                if day_locator.is_visible():
-                    day_locator.click(force=True)
-                else:
-                    page.locator(f"text='{journey_day}'").last.click(force=True)
-            except Exception as e:
-                logging.warning(f"UI Date selection failed: {e}")
+def _fetch_coach(page, btn, coach_name, timeout=COACH_TIMEOUT_MS, hedge_after=None):
+    """
+    Clicks a coach button and returns (raw coachComposition body, hedged).
+    With hedge_after (ms), clicks again if nothing has arrived by then and takes whichever
+    response comes first.
+    """
+    is_coach_response = lambda response: _is_coach_response(response, coach_name)
+    hedged = False
+    if hedge_after is not None and hedge_after < timeout:
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
-            page.wait_for_timeout(500)
+        try:
+            with page.expect_response(is_coach_response, timeout=hedge_after) as response_info:
+                btn.click()
+            response = response_info.value
+        except PlaywrightTimeoutError:
+            hedged = True
+            with page.expect_response(is_coach_response, timeout=timeout - hedge_after) as response_info:
+                btn.click()
+            response = response_info.value
+    else:
+        with page.expect_response(is_coach_response, timeout=timeout) as response_info:
+            btn.click()
+        response = response_info.value
 
-            # Strategy 2: Verify and Force if needed
+    if response.status != 200:
+        raise CoachResponseError(response.status)
+    return response.body(), hedged
+
+def _fetch_coach_with_retries(page, btn, coach_name, scheduler, retries, deadline, hedging):
+    """
+    Fetches one coach, retrying with jittered exponential backoff until it succeeds,
+    the retries run out or the scan deadline passes. Returns the JSON body (bytes), or None.
+    """
+    with span("coach", coach=coach_name, retries=0) as event:
+        for attempt in range(retries + 1):
+            remaining_ms = (deadline - time.monotonic()) * 1000
+            if remaining_ms <= 0:
+                break
+            event["retries"] = attempt
             try:
-                current_val = date_input.input_value()
-                if journey_day not in current_val:
-                    logging.info("Date not updated via UI. Forcing via JS...")
-                    page.evaluate("document.querySelector('input.jss466').removeAttribute('readonly')")
-                    page.locator("input.jss466").fill(journey_date)
-                    page.keyboard.press("Enter")
+                hedge_after = scheduler.latency_percentile(95) if hedging else None
+                with scheduler.slot(check_cancelled=_check_cancelled):
+                    body, event["hedged"] = _fetch_coach(
+                        page, btn, coach_name,
+                        timeout=min(COACH_TIMEOUT_MS, remaining_ms),
+                        hedge_after=hedge_after * 1000 if hedge_after is not None else None
+                    )
+                    event["bytes"] = len(body)
+                return body
+            except ScanCancelled:
+                raise
             except Exception as e:
-                logging.error(f"Date verification/force failed: {e}")
+                logging.warning(f"Coach {coach_name} attempt {attempt + 1}/{retries + 1} failed: {e}")
+                if attempt < retries:
+                    backoff_ms = COACH_RETRY_BACKOFF_MS * 2 ** attempt * random.uniform(0.5, 1.0)
+                    remaining_ms = (deadline - time.monotonic()) * 1000
+                    _pause(page, max(0, min(backoff_ms, remaining_ms)))
+        event["status"] = "error"
+        return None
 
-            logging.info("Submitting...")
-            # Force click to bypass any potential overlays
-            get_chart_btn = page.locator("button:has-text('Get Train Chart')")
-            get_chart_btn.click(force=True)
-            
-            # Wait for URL change or error
-            try:
-                page.wait_for_url(lambda url: "vacant-berth" in url or "traincomposition" in url, timeout=15000)
-            except:
-                logging.warning("URL did not change, checking for errors...")
-            
-            # --- Scan Coaches ---
+def _open_chart_directly(page, chart_url):
+    """
+    Opens a remembered vacant berth URL and returns its coach buttons (empty if the
+    site did not render the chart, e.g. because the deep link needs form state).
+    """
+    try:
+        _goto(page, chart_url, 30000)
+        _wait_cancellable(lambda timeout: page.wait_for_load_state("networkidle", timeout=timeout), 10000)
+    except ScanCancelled:
+        raise
+    except Exception as e:
+        logging.warning(f"Chart shortcut did not load: {e}")
+        return []
+    return _find_coach_buttons(page)
+
+def _open_chart_via_form(page, train_no, journey_date, journey_day, boarding_stn_code, train_selected=False):
+    """
+    The full flow: charts page, train, boarding station, date, "Get Train Chart".
+    train_selected: The page already has the train picked (e.g. after reading its schedule).
+    Returns the coach buttons on the resulting chart.
+    """
+    if not train_selected:
+        with span("goto"):
+            _goto(page, charts_url(), 60000)
+
+        # --- Input Train ---
+        with span("train_select"):
+            _select_train(page, train_no)
+
+        _pause(page, 1000)
+
+    # --- Select Boarding Station ---
+    with span("boarding_select"):
+        _select_boarding(page, boarding_stn_code)
+
+    _pause(page, 500)
+
+    # --- Select Date ---
+    with span("date_picker"):
+        _select_date(page, journey_date, journey_day)
+
+    with span("get_chart"):
+        _get_chart(page)
+
+    # --- Scan Coaches ---
+    with span("coach_discovery") as event:
+        coach_buttons = _find_coach_buttons(page)
+        event["coaches"] = len(coach_buttons)
+    return coach_buttons
+
+def _journey_day(journey_date):
+    try:
+        return str(int(journey_date.split("-")[2]))
+    except:
+        logging.warning(f"Invalid date format: {journey_date}. Defaulting to '15'.")
+        return "15"
+
+def _scan_coaches(page, coach_buttons, total, started, progress_callback=None, payload_callback=None,
+                  deadline_seconds=None, coach_cache=None, goal=None, coach_priority=None, cancel=None):
+    """
+    Fetches and parses every coach on an open chart, recording the time to the first
+    one on the `total` span. Returns (vacancies, coach names, missing coaches, skipped coaches).
+    coach_cache, goal, coach_priority, cancel: See scan_vacancies.
+    """
+    if deadline_seconds is None:
+        deadline_seconds = float(os.environ.get(SCAN_DEADLINE_ENV, "180"))
+    deadline = started + deadline_seconds
+    retries = int(os.environ.get(COACH_RETRIES_ENV, "2"))
+    hedging = os.environ.get(COACH_HEDGING_ENV, "0") == "1"
+
+    vacancies = []
+    missing = []
+    skipped = []
+    coaches = []
+    for btn in coach_buttons:
+        try:
+            coaches.append((btn.inner_text(), btn))
+        except Exception as e:
+            logging.warning(f"Error reading coach button: {e}")
+    coach_names = [name for name, _ in coaches]
+    if goal is not None:
+        # Likeliest coaches first, so the goal is met after as few requests as possible
+        position = {name: i for i, name in enumerate(rank_coaches(coach_names, coach_priority, ac_only=goal.ac_only))}
+        coaches.sort(key=lambda coach: position[coach[0]])
+
+    total_coaches = len(coaches)
+    logging.info(f"Found {total_coaches} coaches. Scanning...")
+
+    # Paces coach requests across every scan in the pod, backing off on throttling
+    scheduler = get_coach_scheduler()
+
+    for i, (coach_name, btn) in enumerate(coaches):
+        if cancel is not None and cancel.is_set():
+            raise ScanCancelled(f"Scan cancelled after {i} of {total_coaches} coaches")
+
+        # Update progress
+        if progress_callback:
+            progress_callback(i + 1, total_coaches, coach_name)
+
+        if time.monotonic() >= deadline:
+            missing.append(coach_name)
+            continue
+
+        body = _fetch_coach_with_retries(page, btn, coach_name, scheduler, retries, deadline, hedging)
+        if body is None:
+            missing.append(coach_name)
+            continue
+
+        if "first_coach_ms" not in total:
+            total["first_coach_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+        cached = None
+        if coach_cache is not None:
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+            cached = coach_cache.get(coach_name)
+
+        if cached and cached[0] == digest:
+            # Same payload as last time: reuse its vacancies without decoding or parsing
+            coach_vacancies = [dict(v) for v in cached[1]]
+            total["unchanged"] = total.get("unchanged", 0) + 1
+        else:
             try:
-                page.wait_for_load_state("networkidle", timeout=10000)
-            except Exception as e:
-                logging.warning(f"Wait for load state failed (non-critical): {e}")
+                data = json.loads(body)
+            except ValueError as e:
+                logging.warning(f"Coach {coach_name} returned malformed JSON: {e}")
+                missing.append(coach_name)
+                continue
+
+            if payload_callback:
+                payload_callback(coach_name, data)
+
+            with span("parse", coach=coach_name):
+                coach_vacancies = parse_coach_composition(coach_name, data)
+            if coach_cache is not None:
+                coach_cache[coach_name] = (digest, [dict(v) for v in coach_vacancies])
+        vacancies.extend(coach_vacancies)
+
+        if goal is not None and goal.add(coach_vacancies):
+            skipped = [name for name, _ in coaches[i + 1:]]
+            logging.info(f"Goal met ({goal.describe()}) after {i + 1} coaches. Skipping {len(skipped)}.")
+            break
+
+    total["skipped"] = len(skipped)
+    return vacancies, coach_names, missing, skipped
+
+def _finish_scan(train_no, total, vacancies, coach_names, missing, previous, skipped=()):
+    vacancies, missing, stale = carry_over_stale(vacancies, missing, previous)
+    total["missing"] = len(missing)
+    total["stale"] = len(stale)
+    if missing or stale:
+        logging.warning(f"Incomplete scan of {train_no}: missing {missing}, stale {stale}")
+    return ScanResult(vacancies, coaches=coach_names, missing=missing, stale=stale, skipped=skipped)
 
-            all_buttons = page.locator("button").all()
+def _scan_vacancies(browser, train_no, journey_date, boarding_stn_code, progress_callback=None, payload_callback=None,
+                    deadline_seconds=None, previous=None, coach_cache=None, goal=None, coach_priority=None,
+                    cancel=None):
+    vacancies = []
+    coach_names = []
+    missing = []
+    skipped = []
+    journey_day = _journey_day(journey_date)
+
+    state = get_browser_state()
+    with span("total", op="scan", train_no=train_no) as total, _cancel_scope(cancel):
+        started = time.monotonic()
+        context = new_stealth_context(browser, state.storage_state)
+        page = context.new_page()
+
+        try:
+            # A chart reached before can be opened directly, skipping the whole form
             coach_buttons = []
-            for btn in all_buttons:
-                try:
-                    txt = btn.inner_text()
-                    if len(txt) < 5 and any(c.isdigit() for c in txt):
-                        coach_buttons.append(btn)
-                except Exception as e:
-                    logging.warning(f"Error inspecting button: {e}")
-                    continue
-            
-            total_coaches = len(coach_buttons)
-            logging.info(f"Found {total_coaches} coaches. Scanning...")
-
-            for i, btn in enumerate(coach_buttons):
-                coach_name = btn.inner_text()
-                
-                # Update progress
-                if progress_callback:
-                    progress_callback(i + 1, total_coaches, coach_name)
-                
-                try:
-                    with page.expect_response(lambda response: "coachComposition" in response.url and response.status == 200, timeout=5000) as response_info:
-                        btn.click()
-                    
-                    response = response_info.value
-                    data = response.json()
-                    
-                    if "bdd" in data:
-                        for seat in data["bdd"]:
-                            berth_no = seat.get("berthNo")
-                            berth_code = seat.get("berthCode")
-                            bsd = seat.get("bsd", [])
-                            
-                            current_vacancy = None
-                            for segment in bsd:
-                                is_occupied = segment.get("occupancy", True)
-                                from_stn = segment.get("from")
-                                to_stn = segment.get("to")
-                                
-                                if not is_occupied:
-                                    if current_vacancy and current_vacancy["To"] == from_stn:
-                                        current_vacancy["To"] = to_stn
-                                    else:
-                                        if current_vacancy:
-                                            vacancies.append(current_vacancy)
-                                        current_vacancy = {
-                                            "Coach": coach_name,
-                                            "Berth": berth_no,
-                                            "Type": berth_code,
-                                            "From": from_stn,
-                                            "To": to_stn
-                                        }
-                                else:
-                                    if current_vacancy:
-                                        vacancies.append(current_vacancy)
-                                        current_vacancy = None
-                            
-                            if current_vacancy:
-                                vacancies.append(current_vacancy)
-                    
-                    page.wait_for_timeout(200) # Small delay
-                except Exception as e:
-                    logging.warning(f"Error scanning coach {coach_name}: {e}")
-                    continue
+            chart_url = state.chart_url(train_no, journey_date, boarding_stn_code)
+            if chart_url:
+                with span("shortcut") as event:
+                    coach_buttons = _open_chart_directly(page, chart_url)
+                    event["coaches"] = len(coach_buttons)
+                if not coach_buttons:
+                    logging.info("Chart shortcut failed. Falling back to the form.")
+                    state.forget_chart(train_no, journey_date, boarding_stn_code)
+            total["path"] = "shortcut" if coach_buttons else "form"
+
+            if not coach_buttons:
+                coach_buttons = _open_chart_via_form(page, train_no, journey_date, journey_day, boarding_stn_code)
+                if coach_buttons and "vacant-berth" in page.url:
+                    state.remember_chart(train_no, journey_date, boarding_stn_code, page.url)
 
+            vacancies, coach_names, missing, skipped = _scan_coaches(
+                page, coach_buttons, total, started, progress_callback, payload_callback, deadline_seconds, coach_cache,
+                goal, coach_priority, cancel
+            )
+
+            # Keep the cookies of a scan that got through, for the next context
+            if "first_coach_ms" in total:
+                state.update_storage_state(context.storage_state())
+
+        except ScanCancelled as e:
+            total["status"] = "cancelled"
+            logging.info(str(e))
+            raise
         except Exception as e:
+            total["status"] = "error"
             logging.error(f"Error in scan_vacancies: {e}")
         finally:
-            browser.close()
-            
-    return vacancies
+            context.close()
+
+        return _finish_scan(train_no, total, vacancies, coach_names, missing, previous, skipped)
+
+def get_route_and_vacancies(train_no, journey_date, boarding_stn_code=None, headless=True, progress_callback=None,
+                            payload_callback=None, deadline_seconds=None, previous=None, coach_cache=None, goal=None,
+                            coach_priority=None, cancel=None):
+    """
+    Route discovery and the vacancy scan in one browser session: the train is typed in
+    once, its schedule read, and the chart fetched from the same page.
+    Returns (station_list, ScanResult), in the formats of get_train_route and scan_vacancies;
+    a train without a schedule gives ([], an empty ScanResult).
+    boarding_stn_code: Defaults to the first station of the scraped schedule.
+    previous, coach_cache, goal, coach_priority, cancel: As for scan_vacancies. A goal
+        needs the route up front, so it only fits trains whose route is already stored.
+    """
+    return _run_in_browser(
+        _get_route_and_vacancies, headless, "Route Discovery + Vacancy Scan",
+        train_no, journey_date, boarding_stn_code,
+        progress_callback=progress_callback,
+        payload_callback=payload_callback,
+        deadline_seconds=deadline_seconds,
+        previous=previous,
+        coach_cache=coach_cache,
+        goal=goal,
+        coach_priority=coach_priority,
+        cancel=cancel
+    )
+
+def _get_route_and_vacancies(browser, train_no, journey_date, boarding_stn_code=None, progress_callback=None,
+                             payload_callback=None, deadline_seconds=None, previous=None, coach_cache=None, goal=None,
+                             coach_priority=None, cancel=None):
+    station_list = []
+    vacancies = []
+    coach_names = []
+    missing = []
+    skipped = []
+    journey_day = _journey_day(journey_date)
+
+    state = get_browser_state()
+    with span("total", op="pipeline", train_no=train_no) as total, _cancel_scope(cancel):
+        started = time.monotonic()
+        context = new_stealth_context(browser, state.storage_state)
+        page = context.new_page()
+
+        try:
+            with span("goto"):
+                _goto(page, charts_url(), 60000)
+
+            with span("train_select"):
+                _select_train(page, train_no)
+
+            logging.info("Train selected. Waiting for Schedule button...")
+            _pause(page, 2000)
+
+            with span("schedule") as event:
+                station_list = _read_schedule(page, train_no)
+                event["stations"] = len(station_list)
+
+            if not station_list:
+                logging.warning(f"No schedule found for {train_no}; nothing to scan.")
+                return station_list, _finish_scan(train_no, total, vacancies, coach_names, missing, previous)
+            boarding_stn_code = boarding_stn_code or station_list[0]["code"]
+            total["path"] = "form"
+
+            coach_buttons = _open_chart_via_form(
+                page, train_no, journey_date, journey_day, boarding_stn_code, train_selected=True
+            )
+            if coach_buttons and "vacant-berth" in page.url:
+                state.remember_chart(train_no, journey_date, boarding_stn_code, page.url)
+
+            vacancies, coach_names, missing, skipped = _scan_coaches(
+                page, coach_buttons, total, started, progress_callback, payload_callback, deadline_seconds, coach_cache,
+                goal, coach_priority, cancel
+            )
+
+            if "first_coach_ms" in total:
+                state.update_storage_state(context.storage_state())
+
+        except ScanCancelled as e:
+            total["status"] = "cancelled"
+            logging.info(str(e))
+            raise
+        except Exception as e:
+            total["status"] = "error"
+            logging.error(f"Error in get_route_and_vacancies: {e}")
+        finally:
+            context.close()
+
+        return station_list, _finish_scan(train_no, total, vacancies, coach_names, missing, previous, skipped)
@@ -0,0 +1,29 @@
+"""
+Container entrypoint. Warms the browser pool and starts the health endpoint in the
+same process as Streamlit (which only runs app.py once a user connects), then hands
+over to `streamlit run app.py`. Extra arguments are passed through to Streamlit.
+"""
+import asyncio
+import sys
+
+from browser_pool import get_browser_pool
+from health import start_health_server
+from profiling import get_memory_profiler
+
+def main():
+    # Fix for Windows Event Loop Policy (NotImplementedError)
+    if sys.platform.startswith("win"):
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+    # Before the pool, so the first browser launch is profiled too
+    get_memory_profiler()
+    get_browser_pool()
+    start_health_server()
+
+    from streamlit.web import cli as stcli
+
+    sys.argv = ["streamlit", "run", "app.py"] + sys.argv[1:]
+    sys.exit(stcli.main())
+
+if __name__ == "__main__":
+    main()
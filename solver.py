@@ -1,87 +1,259 @@
-import pandas as pd
+import logging
+from bisect import bisect_right
+from functools import lru_cache
 
-def process_vacancies(raw_vacancies, station_map, start_code, end_code, berth_preferences=None, ac_only=False):
+from route_index import get_route_index
+
+# Rough share of berths still vacant at chart time, by coach prefix. Only used to order
+# coaches for an early-stopping scan until the vacancy history has real numbers.
+CLASS_VACANCY_PRIOR = {"H": 0.30, "A": 0.25, "B": 0.15, "M": 0.15, "E": 0.10, "C": 0.10, "S": 0.08, "D": 0.05, "G": 0.0}
+
+def is_non_ac_coach(coach):
+    """
+    Sleeper (S1, S2...), 2S/General (D) and General (GS) coaches. For standard IRCTC, S=Sleeper,
+    though special trains sometimes use other codes.
+    """
+    return coach.upper().startswith(("S", "D", "G"))
+
+# Filters process_vacancies can apply, by name: (stage, builder). A builder takes the
+# filter's value and returns a predicate, or None when that value lets everything
+# through. "raw" predicates see a scan's vacancy as a (Coach, Berth, Type, From, To)
+# tuple, before any distances are worked out; "processed" ones see the enriched dict
+# (Coverage_Km, Coverage_Pct...).
+VACANCY_FILTERS = {}
+
+def register_filter(name, stage="raw"):
+    """
+    Decorator adding a filter builder under `name`, for compile_filter(name=value).
+    """
+    def decorator(builder):
+        VACANCY_FILTERS[name] = (stage, builder)
+        return builder
+    return decorator
+
+@register_filter("berth_preferences")
+def _berth_filter(berth_types):
+    if not berth_types:
+        return None
+    allowed = frozenset(berth_types)
+    return lambda v: v[2] in allowed
+
+@register_filter("ac_only")
+def _ac_filter(ac_only):
+    # AC Coaches usually start with B (3A), A (2A/1A), H (1A), M (3E), C (CC), E (Exec)
+    # Non-AC are S (Sleeper), D (2S/General), GS (General)
+    if not ac_only:
+        return None
+    verdicts = {}  # coach -> is AC; a scan has a few dozen coaches but thousands of rows
+
+    def is_ac(v):
+        coach = v[0]
+        verdict = verdicts.get(coach)
+        if verdict is None:
+            verdict = verdicts[coach] = not is_non_ac_coach(coach)
+        return verdict
+    return is_ac
+
+@register_filter("coach_classes")
+def _coach_class_filter(classes):
+    if not classes:
+        return None
+    allowed = frozenset(c.upper() for c in classes)
+    verdicts = {}
+
+    def in_class(v):
+        coach = v[0]
+        verdict = verdicts.get(coach)
+        if verdict is None:
+            verdict = verdicts[coach] = coach_class(coach) in allowed
+        return verdict
+    return in_class
+
+@register_filter("coaches")
+def _coach_filter(coaches):
+    if not coaches:
+        return None
+    allowed = frozenset(coaches)
+    return lambda v: v[0] in allowed
+
+@register_filter("min_coverage_pct", stage="processed")
+def _coverage_filter(min_coverage_pct):
+    if not min_coverage_pct:
+        return None
+    return lambda v: v["Coverage_Pct"] >= min_coverage_pct
+
+def _all_of(predicates):
+    if not predicates:
+        return None
+    if len(predicates) == 1:
+        return predicates[0]
+    if len(predicates) == 2:
+        first, second = predicates
+        return lambda v: first(v) and second(v)
+    return lambda v: all(p(v) for p in predicates)
+
+class VacancyFilter:
+    """
+    Filters compiled into (at most) one predicate per stage: raw (None = keep every
+    vacancy) and processed (None = keep every enriched vacancy).
+    """
+    __slots__ = ("options", "raw", "processed")
+
+    def __init__(self, options):
+        self.options = options
+        stages = {"raw": [], "processed": []}
+        for name, value in options:
+            if name not in VACANCY_FILTERS:
+                raise ValueError(f"Unknown vacancy filter: {name}")
+            stage, builder = VACANCY_FILTERS[name]
+            predicate = builder(value)
+            if predicate is not None:
+                stages[stage].append(predicate)
+        self.raw = _all_of(stages["raw"])
+        self.processed = _all_of(stages["processed"])
+
+    def accepts(self, vacancy):
+        """
+        Whether a raw vacancy (dict or VacancyRecord) passes the raw-stage filters.
+        """
+        return self.raw is None or self.raw(_vacancy_fields(vacancy))
+
+def _freeze(value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(value))
+    return value
+
+@lru_cache(maxsize=64)
+def _compile_filter(options):
+    return VacancyFilter(options)
+
+def compile_filter(**filters):
+    """
+    Compiles filters (berth_preferences=['LB'], ac_only=True, coach_classes=['B', 'A'],
+    coaches=['B1'], min_coverage_pct=50, or any added with register_filter) into a
+    VacancyFilter. Compiled filters are cached, so reruns with the same sidebar
+    settings reuse the same predicates.
+    """
+    return _compile_filter(tuple(sorted((name, _freeze(value)) for name, value in filters.items())))
+
+def _journey(index, start, end):
+    """
+    (start position, start km, end km) of the journey from start to end (route positions
+    or codes, see RouteIndex.journey), or None for unknown stations or a journey that
+    does not run forwards.
+    """
+    journey = index.journey(start, end)
+    if journey is None:
+        return None
+    start_dist, end_dist = index.dists[journey[0]], index.dists[journey[1]]
+    return (journey[0], start_dist, end_dist) if start_dist < end_dist else None
+
+def _vacancy_fields(vacancy):
+    """
+    A vacancy as a (Coach, Berth, Type, From, To) tuple. Stored scans hold
+    VacancyRecords, which already are one. Coach and Type are optional in raw dicts,
+    as the filters have always read them with .get.
+    """
+    if isinstance(vacancy, tuple):
+        return vacancy
+    return (vacancy.get("Coach", ""), vacancy["Berth"], vacancy.get("Type"), vacancy["From"], vacancy["To"])
+
+def _journey_stretch(index, frm, to, start_pos, start_dist, end_dist, total_journey_dist):
+    """
+    (start km, end km, coverage km, coverage %) of a vacancy from frm to to, or None
+    when it is not on the route or does not overlap the journey.
+    """
+    # Resolved by position from the journey's start, so a station a loop route passes
+    # twice counts from the stop the journey actually passes
+    stretch = index.segment(frm, to, start_pos)
+    if stretch is None:
+        return None
+    vac_start_dist, vac_end_dist = index.dists[stretch[0]], index.dists[stretch[1]]
+
+    # Check overlap with user journey
+    overlap_start = max(start_dist, vac_start_dist)
+    overlap_end = min(end_dist, vac_end_dist)
+    if overlap_start >= overlap_end:
+        return None
+
+    # Calculate coverage within the user's requested journey
+    coverage_dist = overlap_end - overlap_start
+    return vac_start_dist, vac_end_dist, coverage_dist, round(coverage_dist / total_journey_dist * 100, 1)
+
+def process_vacancies(raw_vacancies, route, start, end, berth_preferences=None, ac_only=False, filters=None):
     """
     Filters and enriches vacancy data based on user's journey and preferences.
+    route: RouteIndex of the train, or a station list / {code: km} map (see get_route_index).
+    start, end: Boarding and destination, as station codes or as route positions; positions
+        pick the exact stop on a loop route that passes a station twice.
     berth_preferences: List of allowed berth codes (e.g., ['LB', 'SL']). If None/Empty, allow all.
     ac_only: If True, only allow coaches that are NOT Sleeper (S) or General/2S (D).
+    filters: A VacancyFilter from compile_filter, used instead of berth_preferences/ac_only.
     """
     processed = []
-    
-    # Get distances for user journey
-    try:
-        start_dist = station_map[start_code]
-        end_dist = station_map[end_code]
-    except KeyError:
-        return [] # Invalid stations
-
-    # Ensure direction is valid
-    if start_dist >= end_dist:
+    index = get_route_index(route)
+    if filters is None:
+        filters = compile_filter(berth_preferences=berth_preferences, ac_only=ac_only)
+    accepts, keeps = filters.raw, filters.processed
+
+    # Get distances for user journey (invalid stations or direction: nothing to show)
+    journey = _journey(index, start, end)
+    if journey is None:
         return []
+    start_pos, start_dist, end_dist = journey
+    total_journey_dist = end_dist - start_dist
+
+    # (From, To) -> everything about a stretch that does not depend on the berth, or
+    # None when it is off the route or outside the journey; many berths share a stretch
+    stretches = {}
 
     for vac in raw_vacancies:
         try:
-            # 1. Berth Type Filter
-            if berth_preferences and vac.get("Type") not in berth_preferences:
+            fields = _vacancy_fields(vac)
+            if accepts is not None and not accepts(fields):
                 continue
+            coach, berth, berth_type, frm, to = fields
 
-            # 2. AC Only Filter
-            # AC Coaches usually start with B (3A), A (2A/1A), H (1A), M (3E), C (CC), E (Exec)
-            # Non-AC are S (Sleeper), D (2S/General), GS (General)
-            if ac_only:
-                coach = vac.get("Coach", "").upper()
-                if coach.startswith("S") or coach.startswith("D") or coach.startswith("G"):
-                    # Edge case: S1, S2... are Sleeper. 
-                    # But sometimes special trains have different codes. 
-                    # For standard IRCTC, S=Sleeper.
-                    continue
-
-            vac_start_dist = station_map.get(vac["From"])
-            vac_end_dist = station_map.get(vac["To"])
-            
-            if vac_start_dist is None or vac_end_dist is None:
+            key = (frm, to)
+            if key in stretches:
+                stretch = stretches[key]
+            else:
+                stretch = stretches[key] = _journey_stretch(index, frm, to, start_pos, start_dist, end_dist, total_journey_dist)
+            if stretch is None:
                 continue
+            vac_start_dist, vac_end_dist, coverage_dist, coverage_pct = stretch
 
-            # Check overlap with user journey
-            overlap_start = max(start_dist, vac_start_dist)
-            overlap_end = min(end_dist, vac_end_dist)
-            
-            if overlap_start < overlap_end:
-                # Calculate coverage within the user's requested journey
-                coverage_dist = overlap_end - overlap_start
-                total_journey_dist = end_dist - start_dist
-                coverage_pct = (coverage_dist / total_journey_dist) * 100
-                
-                processed.append({
-                    "Coach": vac["Coach"],
-                    "Berth": vac["Berth"],
-                    "Type": vac["Type"],
-                    "From": vac["From"],
-                    "To": vac["To"],
-                    "Distance": vac_end_dist - vac_start_dist, # Total length of this seat's vacancy
-                    "Coverage_Km": coverage_dist,
-                    "Coverage_Pct": round(coverage_pct, 1),
-                    "Start_Dist": vac_start_dist,
-                    "End_Dist": vac_end_dist
-                })
+            row = {
+                "Coach": coach,
+                "Berth": berth,
+                "Type": berth_type,
+                "From": frm,
+                "To": to,
+                "Distance": vac_end_dist - vac_start_dist, # Total length of this seat's vacancy
+                "Coverage_Km": coverage_dist,
+                "Coverage_Pct": coverage_pct,
+                "Start_Dist": vac_start_dist,
+                "End_Dist": vac_end_dist
+            }
+            if keeps is None or keeps(row):
+                processed.append(row)
         except Exception as e:
             # Log the error but continue processing other vacancies
-            import logging
             logging.error(f"Error processing vacancy: {e}")
             continue
             
     return processed
 
-def find_all_seat_chains(vacancies, station_map, start_code, end_code, limit=5):
+def find_all_seat_chains(vacancies, route, start, end, limit=5):
     """
-    Finds multiple valid seat chains to cover the journey.
+    Finds multiple valid seat chains to cover the journey (start and end as for
+    process_vacancies).
     Returns a list of chains (each chain is a list of vacancy dicts).
     """
-    try:
-        start_dist = station_map[start_code]
-        end_dist = station_map[end_code]
-    except KeyError:
+    journey = _journey(get_route_index(route), start, end)
+    if journey is None:
         return []
+    _, start_dist, end_dist = journey
 
     # Filter relevant vacancies
     relevant = [v for v in vacancies if v['End_Dist'] > start_dist and v['Start_Dist'] < end_dist]
@@ -118,6 +290,11 @@ def find_all_seat_chains(vacancies, station_map, start_code, end_code, limit=5):
             chain.append(best_next)
             current_seat = best_next
             
+        # Greedy from the seat reaching furthest gets as far as any chain can: if it
+        # stops short, no chain exists and trying the other starting seats is wasted
+        if current_seat['End_Dist'] < end_dist and first_seat is starting_seats[0]:
+            break
+
         # Check if chain successfully reached the destination
         if current_seat['End_Dist'] >= end_dist:
             # Create a signature tuple to check for duplicates
@@ -130,3 +307,244 @@ def find_all_seat_chains(vacancies, station_map, start_code, end_code, limit=5):
             break
             
     return valid_chains
+
+class _RangeMax:
+    """
+    Sparse table over values: index of the maximum in values[lo:hi] in O(1).
+    """
+    def __init__(self, values):
+        self.values = values
+        self.table = [list(range(len(values)))]
+        width = 1
+        while width * 2 <= len(values):
+            prev = self.table[-1]
+            row = []
+            for i in range(len(values) - width * 2 + 1):
+                a, b = prev[i], prev[i + width]
+                row.append(a if values[a] >= values[b] else b)
+            self.table.append(row)
+            width *= 2
+
+    def argmax(self, lo, hi):
+        if lo >= hi:
+            return -1
+        level = (hi - lo).bit_length() - 1
+        a, b = self.table[level][lo], self.table[level][hi - (1 << level)]
+        return a if self.values[a] >= self.values[b] else b
+
+def best_partial_plan(vacancies, route, start, end, max_swaps=3):
+    """
+    Best plan when no chain covers the whole journey: at most max_swaps + 1 seats that
+    together cover the most kilometres. A later seat may be boarded part-way through its
+    vacancy, where the previous one ends. vacancies are process_vacancies output.
+
+    Returns None for an invalid journey, else a dict with:
+    legs: vacancy dicts in journey order, From/To narrowed to the part used
+          (the seat's own vacancy is kept as Vacant_From/Vacant_To)
+    covered_km, coverage_pct, swaps
+    gaps: [{'From', 'To', 'Km'}] stretches with no seat, in journey order
+
+    DP over seats sorted by where they end: best[j][i] is the most km covered by j seats
+    with seat i ending last. Seat i either follows a seat that ends before it starts
+    (prefix maximum) or one ending inside it (range maximum of best - end), so each of
+    the k = max_swaps + 1 layers costs O(n log n) and the whole search O(k n log n).
+    """
+    index = get_route_index(route)
+    journey = _journey(index, start, end)
+    if journey is None:
+        return None
+    _, start_dist, end_dist = journey
+
+    # Clip to the journey and keep one seat per distinct stretch
+    by_stretch = {}
+    for v in vacancies:
+        s, e = max(v['Start_Dist'], start_dist), min(v['End_Dist'], end_dist)
+        if s < e and (s, e) not in by_stretch:
+            by_stretch[(s, e)] = v
+    seats = sorted(by_stretch.items(), key=lambda item: (item[0][1], item[0][0]))
+    starts = [s for (s, _), _ in seats]
+    ends = [e for (_, e), _ in seats]
+    n = len(seats)
+
+    NONE = float("-inf")
+    layers = [[ends[i] - starts[i] for i in range(n)]]
+    parents = [[-1] * n]
+    for _ in range(max_swaps):
+        prev = layers[-1]
+        # Best previous plan among seats ending at or before each index
+        prefix = []
+        for i, value in enumerate(prev):
+            prefix.append(i if not prefix or value > prev[prefix[-1]] else prefix[-1])
+        overlap = _RangeMax([value - ends[i] for i, value in enumerate(prev)])
+
+        layer, parent = [NONE] * n, [-1] * n
+        for i in range(n):
+            before = bisect_right(ends, starts[i]) - 1
+            if before >= 0 and prev[prefix[before]] != NONE:
+                layer[i] = prev[prefix[before]] + ends[i] - starts[i]
+                parent[i] = prefix[before]
+            inside = overlap.argmax(before + 1, i)
+            if inside >= 0 and prev[inside] != NONE and prev[inside] + ends[i] - ends[inside] > layer[i]:
+                layer[i] = prev[inside] + ends[i] - ends[inside]
+                parent[i] = inside
+        layers.append(layer)
+        parents.append(parent)
+
+    # Seat ends and the journey's ends are all station distances
+    dist_to_code = lambda dist: index.codes[index.position_at(dist)]
+
+    best_km, best_j, best_i = 0, 0, -1
+    for j, layer in enumerate(layers):
+        for i, value in enumerate(layer):
+            # Strictly better only, so ties keep the plan with fewer swaps
+            if value > best_km:
+                best_km, best_j, best_i = value, j, i
+
+    chosen = []
+    j, i = best_j, best_i
+    while i >= 0:
+        chosen.append(i)
+        i = parents[j][i]
+        j -= 1
+    chosen.reverse()
+
+    legs = []
+    reached = start_dist
+    for i in chosen:
+        (s, e), v = seats[i]
+        used_from = max(s, reached) if legs else s
+        leg = dict(v)
+        leg.update({
+            'Vacant_From': v['From'], 'Vacant_To': v['To'],
+            'From': dist_to_code(used_from), 'To': dist_to_code(e),
+            'Start_Dist': used_from, 'End_Dist': e, 'Coverage_Km': e - used_from
+        })
+        legs.append(leg)
+        reached = e
+
+    gaps = []
+    cursor = start_dist
+    for leg in legs + [None]:
+        gap_end = leg['Start_Dist'] if leg else end_dist
+        if gap_end > cursor:
+            gaps.append({'From': dist_to_code(cursor), 'To': dist_to_code(gap_end), 'Km': gap_end - cursor})
+        if leg:
+            cursor = leg['End_Dist']
+
+    return {
+        'legs': legs,
+        'covered_km': best_km,
+        'coverage_pct': round(best_km / (end_dist - start_dist) * 100, 1),
+        'swaps': max(len(legs) - 1, 0),
+        'gaps': gaps
+    }
+
+def coach_class(coach):
+    """
+    The class prefix of a coach name: B1 -> B, GS2 -> GS.
+    """
+    return coach.upper().rstrip("0123456789") or coach
+
+def availability_profile(vacancies, route):
+    """
+    Vacant berths on every segment of the route, by coach class, in one sweep: each
+    vacancy adds 1 where it starts and removes it where it ends, and a running sum over
+    the stations turns those deltas into counts.
+
+    Returns {'codes': station codes in route order, 'classes': sorted class prefixes,
+    'counts': {class: [berths per segment]}, 'total': [berths per segment]}, where
+    segment i runs from codes[i] to codes[i + 1]. Vacancies whose stations are not on
+    the route (or that run backwards) are ignored.
+    """
+    index = get_route_index(route)
+    segments = max(len(index) - 1, 0)
+    deltas = {}
+    for v in vacancies:
+        stretch = index.segment(v['From'], v['To'])
+        if stretch is None:
+            continue
+        s, e = stretch
+        row = deltas.get(coach_class(v['Coach']))
+        if row is None:
+            row = deltas[coach_class(v['Coach'])] = [0] * (segments + 1)
+        row[s] += 1
+        row[e] -= 1
+
+    counts = {}
+    total = [0] * segments
+    for cls, row in deltas.items():
+        running, series = 0, []
+        for i in range(segments):
+            running += row[i]
+            series.append(running)
+            total[i] += running
+        counts[cls] = series
+
+    return {'codes': list(index.codes), 'classes': sorted(counts), 'counts': counts, 'total': total}
+
+def rank_coaches(coach_names, vacancy_counts=None, ac_only=False):
+    """
+    Orders coaches by how many vacancies they are likely to have, most first.
+    vacancy_counts: Mean vacancies per coach from earlier scans of the train; coaches
+        without history are scored by CLASS_VACANCY_PRIOR scaled to the same mean.
+    ac_only: Non-AC coaches cannot satisfy the filters, so they go last.
+    Ties keep chart order.
+    """
+    vacancy_counts = vacancy_counts or {}
+    scale = sum(vacancy_counts.values()) / len(vacancy_counts) if vacancy_counts else 1.0
+
+    def score(name):
+        if name in vacancy_counts:
+            return vacancy_counts[name]
+        return CLASS_VACANCY_PRIOR.get(name[:1].upper(), 0.1) * scale
+
+    return sorted(coach_names, key=lambda name: (ac_only and is_non_ac_coach(name), -score(name)))
+
+class ScanGoal:
+    """
+    What the user needs before a scan may stop early: a single seat covering at least
+    min_coverage_pct of the journey, and/or a chain of at most max_swaps swaps (either
+    is enough). Vacancies are fed in coach by coach through add(), which runs
+    process_vacancies on just the new ones, with the same filters as the results.
+    """
+    def __init__(self, route, start, end, min_coverage_pct=None, max_swaps=None,
+                 berth_preferences=None, ac_only=False):
+        self.route = get_route_index(route)
+        self.start = start
+        self.end = end
+        self.min_coverage_pct = min_coverage_pct
+        self.max_swaps = max_swaps
+        self.berth_preferences = berth_preferences
+        self.ac_only = ac_only
+        self.filters = compile_filter(berth_preferences=berth_preferences, ac_only=ac_only)
+        self.processed = []
+        self.best_coverage_pct = 0.0
+        self.met = False
+
+    def describe(self):
+        parts = []
+        if self.min_coverage_pct is not None:
+            parts.append(f"a seat covering {self.min_coverage_pct:g}% of the journey")
+        if self.max_swaps is not None:
+            parts.append(f"a chain with at most {self.max_swaps} swaps")
+        return " or ".join(parts)
+
+    def add(self, raw_vacancies):
+        """
+        Takes one coach's raw vacancies and returns True once the goal is met.
+        """
+        if self.met:
+            return True
+        new = process_vacancies(raw_vacancies, self.route, self.start, self.end, filters=self.filters)
+        if not new:
+            return False
+        self.processed.extend(new)
+        self.best_coverage_pct = max(self.best_coverage_pct, max(v["Coverage_Pct"] for v in new))
+
+        if self.min_coverage_pct is not None and self.best_coverage_pct >= self.min_coverage_pct:
+            self.met = True
+        elif self.max_swaps is not None:
+            # The first chain is a minimum-swap cover: greedy from the seat reaching furthest
+            chains = find_all_seat_chains(self.processed, self.route, self.start, self.end, limit=1)
+            self.met = bool(chains) and len(chains[0]) - 1 <= self.max_swaps
+        return self.met
@@ -0,0 +1,88 @@
+import random
+import string
+
+# Berth layouts per coach class (repeating pattern of berth codes)
+BERTH_LAYOUTS = {
+    "H": ["LB", "UB"],
+    "A": ["LB", "UB", "LB", "UB", "SL", "SU"],
+    "B": ["LB", "MB", "UB", "LB", "MB", "UB", "SL", "SU"],
+    "M": ["LB", "MB", "UB", "LB", "MB", "UB", "SL", "SM", "SU"],
+    "S": ["LB", "MB", "UB", "LB", "MB", "UB", "SL", "SU"],
+    "D": ["WS", "MS", "AS"]
+}
+
+# Share of coaches per class on a typical long-distance rake
+CLASS_MIX = [("H", 0.04), ("A", 0.12), ("B", 0.34), ("M", 0.06), ("S", 0.36), ("D", 0.08)]
+
+def _station_code(i):
+    """
+    Unique, IRCTC-looking station code for position i (e.g. 'SAA', 'SAB', ...).
+    """
+    letters = string.ascii_uppercase
+    return "S" + letters[(i // 26) % 26] + letters[i % 26] + (str(i // 676) if i >= 676 else "")
+
+def make_route(n_stations, seed=0):
+    """
+    Returns a synthetic station list in the format of scraper.get_train_route.
+    """
+    rng = random.Random(seed)
+    stations = []
+    dist = 0
+    for i in range(n_stations):
+        stations.append({"code": _station_code(i), "name": f"STATION {i}", "dist": dist})
+        dist += rng.randint(5, 60)
+    return stations
+
+def make_coach_names(n_coaches):
+    """
+    Returns coach names following CLASS_MIX, e.g. ['H1', 'A1', 'B1', 'B2', ..., 'S1', ...].
+    """
+    counts = []
+    for prefix, share in CLASS_MIX:
+        counts.append([prefix, max(1, round(n_coaches * share))])
+
+    # Trim or pad the largest classes so the total matches exactly
+    while sum(c for _, c in counts) > n_coaches:
+        max(counts, key=lambda x: x[1])[1] -= 1
+    while sum(c for _, c in counts) < n_coaches:
+        max(counts, key=lambda x: x[1])[1] += 1
+
+    names = []
+    for prefix, count in counts:
+        names.extend(f"{prefix}{i}" for i in range(1, count + 1))
+    return names
+
+def make_coach_payload(coach_name, stations, n_berths, rng, occupancy=0.8):
+    """
+    Returns a coachComposition-style payload: {'bdd': [{'berthNo', 'berthCode', 'bsd': [...]}, ...]}.
+    Each berth's journey is split into a few booking segments, each occupied with probability `occupancy`.
+    """
+    layout = BERTH_LAYOUTS.get(coach_name[:1], BERTH_LAYOUTS["B"])
+    last = len(stations) - 1
+    bdd = []
+    for berth_no in range(1, n_berths + 1):
+        n_cuts = rng.randint(0, min(5, last - 1)) if last > 1 else 0
+        cuts = sorted(rng.sample(range(1, last), n_cuts)) if n_cuts else []
+        bounds = [0] + cuts + [last]
+
+        bsd = []
+        for a, b in zip(bounds, bounds[1:]):
+            bsd.append({
+                "from": stations[a]["code"],
+                "to": stations[b]["code"],
+                "occupancy": rng.random() < occupancy
+            })
+        bdd.append({"berthNo": berth_no, "berthCode": layout[(berth_no - 1) % len(layout)], "bsd": bsd})
+    return {"bdd": bdd}
+
+def make_train(n_coaches=30, n_berths=80, n_stations=150, seed=0, occupancy=0.8):
+    """
+    Builds a complete synthetic train: {'stations': [...], 'coaches': {coach_name: payload}}.
+    The same seed always produces the same train.
+    """
+    rng = random.Random(seed)
+    stations = make_route(n_stations, seed)
+    coaches = {}
+    for name in make_coach_names(n_coaches):
+        coaches[name] = make_coach_payload(name, stations, n_berths, rng, occupancy)
+    return {"stations": stations, "coaches": coaches}
@@ -1,6 +1,10 @@
+import os
 import requests
 import json
 
+# CHARTS_URL points this at a local mock_charts.py server instead of production
+CHARTS_URL = os.environ.get("CHARTS_URL", "https://www.irctc.co.in/online-charts/")
+
 def test_endpoint(url, payload):
     print(f"Testing {url} with {payload}...")
     try:
@@ -19,9 +23,9 @@ def test_endpoint(url, payload):
         return False
 
 base_urls = [
-    "https://www.irctc.co.in/online-charts/api/trainComposition",
-    "https://www.irctc.co.in/online-charts/api/coachComposition",
-    "https://www.irctc.co.in/online-charts/api/vacant-berth",
+    CHARTS_URL + "api/trainComposition",
+    CHARTS_URL + "api/coachComposition",
+    CHARTS_URL + "api/vacant-berth",
     "https://www.irctc.co.in/api/v1/trainComposition"
 ]
 
@@ -0,0 +1,33 @@
+import sys
+import os
+import pytest
+
+# Add parent directory to path to import browser_state
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from browser_state import BrowserState
+
+def test_state_persists_across_restarts(tmp_path):
+    """Test storage state and chart URLs survive a restart when a file is configured"""
+    path = str(tmp_path / "state.json")
+    state = BrowserState(path)
+    state.update_storage_state({"cookies": [{"name": "bm", "value": "1"}], "origins": []})
+    state.remember_chart("12627", "2025-12-15", "SBC", "https://example/vacant-berth?x=1")
+
+    restored = BrowserState(path)
+    assert restored.storage_state["cookies"][0]["name"] == "bm"
+    assert restored.chart_url("12627", "2025-12-15", "SBC") == "https://example/vacant-berth?x=1"
+    assert restored.chart_url("12627", "2025-12-16", "SBC") is None
+
+    restored.forget_chart("12627", "2025-12-15", "SBC")
+    assert BrowserState(path).chart_url("12627", "2025-12-15", "SBC") is None
+
+def test_chart_urls_are_bounded():
+    """Test only the most recently used chart URLs are kept"""
+    state = BrowserState(max_charts=2)
+    state.remember_chart("1", "d", "A", "u1")
+    state.remember_chart("2", "d", "A", "u2")
+    state.chart_url("1", "d", "A")
+    state.remember_chart("3", "d", "A", "u3")
+    assert state.chart_url("1", "d", "A") == "u1"
+    assert state.chart_url("2", "d", "A") is None
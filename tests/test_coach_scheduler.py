@@ -0,0 +1,109 @@
+import sys
+import os
+import time
+import threading
+import pytest
+
+# Add parent directory to path to import coach_scheduler
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coach_scheduler import CoachScheduler
+
+class Throttled(Exception):
+    status = 429
+
+def test_additive_increase_and_multiplicative_decrease():
+    """Test fast successes open the limit up and a throttle halves it and widens the gap"""
+    scheduler = CoachScheduler(max_in_flight=4, min_interval=0, initial_in_flight=1, initial_interval=0)
+    for _ in range(10):
+        with scheduler.slot():
+            pass
+    assert scheduler.limit == 4
+
+    with pytest.raises(Throttled):
+        with scheduler.slot():
+            raise Throttled()
+    assert scheduler.limit == 2
+    assert scheduler.counts["throttled"] == 1
+
+def test_slow_response_backs_off():
+    """Test a response over the target latency counts as a slowdown signal"""
+    scheduler = CoachScheduler(initial_in_flight=4, target_latency=0.01, min_interval=0.05)
+    with scheduler.slot():
+        time.sleep(0.03)
+    assert scheduler.limit == 2
+    assert scheduler.interval > 0.05
+    assert scheduler.counts["slow"] == 1
+
+def test_limit_and_pacing_are_pod_wide():
+    """Test concurrent callers never exceed the limit and starts are spaced by the interval"""
+    scheduler = CoachScheduler(max_in_flight=2, initial_in_flight=2, min_interval=0.02, initial_interval=0.02, interval_step=0)
+    peak = []
+    starts = []
+    lock = threading.Lock()
+
+    def request():
+        with scheduler.slot():
+            with lock:
+                starts.append(time.monotonic())
+                peak.append(scheduler.in_flight)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert max(peak) <= 2
+    starts.sort()
+    assert all(b - a >= 0.015 for a, b in zip(starts, starts[1:]))
+
+def test_cancel_ends_a_wait_for_a_slot_or_start_time():
+    """Test a cancelled caller leaves slot() promptly, whether waiting for a slot or for its start time"""
+    class Cancelled(Exception):
+        pass
+
+    def cancelled_while_waiting(scheduler):
+        cancel = threading.Event()
+        def check_cancelled():
+            if cancel.is_set():
+                raise Cancelled()
+
+        left = []
+        def wait():
+            with pytest.raises(Cancelled):
+                with scheduler.slot(check_cancelled=check_cancelled):
+                    pass
+            left.append(time.monotonic())
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        time.sleep(0.1)
+        cancelled_at = time.monotonic()
+        cancel.set()
+        waiter.join(2)
+        return left and left[0] - cancelled_at
+
+    # The only slot is taken
+    scheduler = CoachScheduler(max_in_flight=1, initial_in_flight=1, min_interval=0, initial_interval=0)
+    with scheduler.slot():
+        assert cancelled_while_waiting(scheduler) < 0.5
+    assert scheduler.in_flight == 0
+
+    # The slot is free but the next start is 5 s away
+    scheduler = CoachScheduler(max_in_flight=1, initial_in_flight=1, min_interval=0, initial_interval=5)
+    with scheduler.slot():
+        pass
+    assert cancelled_while_waiting(scheduler) < 0.5
+    assert scheduler.in_flight == 0
+    assert scheduler.counts == {"ok": 1, "slow": 0, "throttled": 0, "error": 0}
+
+def test_latency_percentile_needs_enough_samples():
+    """Test the hedge delay only kicks in once there is a latency history"""
+    scheduler = CoachScheduler(min_interval=0, initial_interval=0)
+    assert scheduler.latency_percentile(95) is None
+    for latency in range(1, 101):
+        scheduler.in_flight += 1
+        scheduler._record("ok", latency / 1000)
+    assert scheduler.latency_percentile(95) == pytest.approx(0.096)
@@ -0,0 +1,55 @@
+import sys
+import os
+import time
+import pytest
+
+# Add parent directory to path to import debug_sink
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from debug_sink import DebugSink, build_scan_record, load_scan, replay_scan
+
+# Mock coachComposition payload: berth 1 vacant NDLS->CNB->PRYJ, berth 2 fully occupied
+MOCK_PAYLOAD = {
+    "bdd": [
+        {"berthNo": 1, "berthCode": "LB", "bsd": [
+            {"from": "NDLS", "to": "CNB", "occupancy": False},
+            {"from": "CNB", "to": "PRYJ", "occupancy": False},
+            {"from": "PRYJ", "to": "DDU", "occupancy": True}
+        ]},
+        {"berthNo": 2, "berthCode": "UB", "bsd": [
+            {"from": "NDLS", "to": "DDU", "occupancy": True}
+        ]}
+    ]
+}
+
+def test_sink_round_trip(tmp_path):
+    """Test a submitted scan is written compressed and can be replayed"""
+    sink = DebugSink(str(tmp_path))
+    record = build_scan_record("12627", "2025-12-15", "NDLS", [], [{"coach": "B1", "data": MOCK_PAYLOAD}])
+    scan_id = sink.submit(record)
+    sink.flush()
+
+    loaded = load_scan(sink.path_for(scan_id))
+    assert loaded["scan_id"] == scan_id
+    assert loaded["train_no"] == "12627"
+
+    replayed = replay_scan(loaded)
+    assert len(replayed) == 1
+    assert replayed[0]["From"] == "NDLS"
+    assert replayed[0]["To"] == "PRYJ"
+
+def test_sink_rotation(tmp_path):
+    """Test only the newest max_files scans are kept"""
+    sink = DebugSink(str(tmp_path), max_files=2)
+    ids = []
+    for i in range(4):
+        ids.append(sink.submit({"n": i}, scan_id=f"scan-{i}"))
+        sink.flush()
+        # Make mtimes strictly increasing regardless of filesystem resolution
+        os.utime(sink.path_for(ids[-1]), (time.time() - 100 + i, time.time() - 100 + i))
+
+    sink.submit({"n": 4}, scan_id="scan-4")
+    sink.flush()
+    remaining = sorted(os.listdir(tmp_path))
+    assert len(remaining) == 2
+    assert remaining == ["scan-3.json.gz", "scan-4.json.gz"]
@@ -0,0 +1,28 @@
+import sys
+import os
+import pytest
+
+# Add parent directory to path to import health
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from health import check_liveness, check_readiness
+
+def make_status(**overrides):
+    status = {"size": 1, "alive": 1, "warm": 1, "in_flight": 0, "queue_depth": 0, "oldest_job_seconds": 0}
+    status.update(overrides)
+    return status
+
+def test_ready_only_with_warm_browser():
+    """Test readiness waits for a warm browser"""
+    assert check_readiness(make_status(warm=0))[0] is False
+    assert check_readiness(make_status(warm=1, queue_depth=3))[0] is True
+
+def test_ready_when_pool_disabled():
+    """Test pods without a pool are always ready"""
+    assert check_readiness(make_status(size=0, alive=0, warm=0))[0] is True
+
+def test_liveness_fails_on_dead_or_stuck_worker():
+    """Test liveness catches dead workers and wedged jobs"""
+    assert check_liveness(make_status())[0] is True
+    assert check_liveness(make_status(alive=0))[0] is False
+    assert check_liveness(make_status(oldest_job_seconds=10_000))[0] is False
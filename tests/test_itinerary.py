@@ -0,0 +1,95 @@
+import sys
+import os
+import time
+import pytest
+
+# Add parent directory to path to import itinerary
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from itinerary import ItineraryGraph
+
+def route(*codes):
+    return [{"code": code, "name": code, "dist": i * 100} for i, code in enumerate(codes)]
+
+def seat(coach, frm, to, berth=1, berth_type="LB"):
+    return {"Coach": coach, "Berth": berth, "Type": berth_type, "From": frm, "To": to}
+
+# Train 1 runs the whole corridor but needs two seat swaps; train 2 joins at HUB
+# and covers the rest in one seat.
+TRAINS = {
+    "11111": (route("ORG", "A", "HUB", "B", "DST"), [
+        seat("B1", "ORG", "HUB"),
+        seat("B2", "HUB", "B"),
+        seat("S1", "B", "DST")
+    ]),
+    "22222": (route("X", "HUB", "B", "DST", "Y"), [
+        seat("A1", "X", "Y")
+    ])
+}
+
+def test_search_trades_transfers_for_swaps():
+    """Test one itinerary per transfer count, each needing fewer swaps than the last"""
+    direct, connecting = ItineraryGraph(TRAINS, allow_untimed=True).search("ORG", "DST")
+
+    assert (direct["transfers"], direct["swaps"]) == (0, 2)
+    assert [(leg["Coach"], leg["From"], leg["To"]) for leg in direct["legs"]] == [
+        ("B1", "ORG", "HUB"), ("B2", "HUB", "B"), ("S1", "B", "DST")
+    ]
+
+    assert (connecting["transfers"], connecting["swaps"]) == (1, 0)
+    assert [(leg["Train"], leg["Coach"], leg["From"], leg["To"]) for leg in connecting["legs"]] == [
+        ("11111", "B1", "ORG", "HUB"), ("22222", "A1", "HUB", "DST")
+    ]
+    assert connecting["legs"][1]["Vacant_From"] == "X"
+    assert connecting["legs"][1]["Coverage_Km"] == 200
+    assert connecting["connections"] == [{"Station": "HUB", "From_Train": "11111", "To_Train": "22222", "Wait_Min": None}]
+
+    # Without transfers only the single-train itinerary is left
+    assert [i["transfers"] for i in ItineraryGraph(TRAINS, allow_untimed=True).search("ORG", "DST", max_transfers=0)] == [0]
+
+def test_search_respects_connection_times_and_filters():
+    """Test too-short connections and filtered-out seats are not used"""
+    # Train 2 is ahead of train 1 by B, so HUB is the only place to change
+    timings = {"11111": {"HUB": (600, 605), "B": (700, 702)}, "22222": {"HUB": (610, 615), "B": (670, 675)}}
+    itineraries = ItineraryGraph(TRAINS, timings=timings, min_connection=30).search("ORG", "DST")
+    assert [i["transfers"] for i in itineraries] == [0]
+
+    itineraries = ItineraryGraph(TRAINS, timings=timings, min_connection=10).search("ORG", "DST")
+    assert itineraries[1]["connections"][0]["Wait_Min"] == 15
+
+    # Without the sleeper seat, train 1 alone cannot reach DST
+    itineraries = ItineraryGraph(TRAINS, allow_untimed=True, ac_only=True).search("ORG", "DST")
+    assert [(i["transfers"], i["swaps"]) for i in itineraries] == [(1, 0)]
+
+    assert ItineraryGraph(TRAINS).search("ORG", "NOWHERE") == []
+
+def test_search_needs_timings_to_transfer():
+    """Test no transfer is made to a train that leaves before the first one arrives, or without timings"""
+    # Train 2 leaves HUB before train 1 gets there, and B is not timed
+    timings = {"11111": {"HUB": (600, 605)}, "22222": {"HUB": (540, 545)}}
+    for min_connection in (30, 0):
+        itineraries = ItineraryGraph(TRAINS, timings=timings, min_connection=min_connection).search("ORG", "DST")
+        assert [i["transfers"] for i in itineraries] == [0]
+
+    # Untimed transfers are only made when asked for
+    assert [i["transfers"] for i in ItineraryGraph(TRAINS).search("ORG", "DST")] == [0]
+    untimed = ItineraryGraph(TRAINS, timings=timings, allow_untimed=True).search("ORG", "DST")
+    assert untimed[1]["connections"] == [{"Station": "B", "From_Train": "11111", "To_Train": "22222", "Wait_Min": None}]
+
+def test_search_scales_to_dozens_of_trains():
+    """Test a relay over 40 trains, each covering one hop of a long corridor"""
+    trains = {}
+    for n in range(40):
+        codes = [f"J{n}", f"M{n}", f"J{n + 1}"]
+        # A seat from the start to the middle and one onward, so staying costs a swap
+        trains[f"T{n:02d}"] = (route(*codes), [seat("B1", codes[0], codes[1]), seat("B2", codes[1], codes[2])])
+    graph = ItineraryGraph(trains, allow_untimed=True)
+
+    started = time.perf_counter()
+    itineraries = graph.search("J0", "J40", max_transfers=39)
+    assert time.perf_counter() - started < 2
+
+    assert len(itineraries) == 1
+    assert itineraries[0]["transfers"] == 39
+    assert itineraries[0]["swaps"] == 40
+    assert [leg["Train"] for leg in itineraries[0]["legs"][::2]] == sorted(trains)
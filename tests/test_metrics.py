@@ -0,0 +1,58 @@
+import sys
+import os
+import json
+import pytest
+
+# Add parent directory to path to import metrics
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+from metrics import span, render_prometheus
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def test_nested_spans_inherit_fields_and_export():
+    """Test child spans inherit op/train and land in the histograms and JSON lines"""
+    events = []
+    listener = lambda stage, event: events.append((stage, dict(event)))
+    metrics.add_listener(listener)
+    try:
+        with span("total", op="scan", train_no="12627"):
+            with span("coach", coach="B1", retries=0) as event:
+                event["bytes"] = 2048
+    finally:
+        metrics.remove_listener(listener)
+
+    ends = [e for stage, e in events if stage == "end"]
+    assert [e["phase"] for e in ends] == ["coach", "total"]
+    assert ends[0]["train_no"] == "12627" and ends[0]["op"] == "scan"
+    assert ends[0]["coach"] == "B1" and ends[0]["status"] == "ok"
+
+    text = render_prometheus()
+    assert 'reservex_scan_phase_seconds_count{op="scan",phase="coach",status="ok"} 1' in text
+    assert 'reservex_coach_response_bytes_bucket{op="scan",le="4096"} 1' in text
+    assert 'reservex_coach_response_bytes_bucket{op="scan",le="1024"} 0' in text
+
+def test_failed_span_is_marked_error(tmp_path, monkeypatch):
+    """Test exceptions mark the span as failed and are re-raised"""
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setenv(metrics.METRICS_JSONL_ENV, str(path))
+
+    with pytest.raises(TimeoutError):
+        with span("goto", op="route"):
+            raise TimeoutError()
+
+    line = json.loads(path.read_text().splitlines()[0])
+    assert line["phase"] == "goto" and line["status"] == "error"
+    assert 'phase="goto",status="error"} 1' in render_prometheus()
+
+def test_time_to_first_coach_by_path():
+    """Test time to first coach is split by shortcut vs form"""
+    with span("total", op="scan", train_no="12627") as total:
+        total["path"] = "shortcut"
+        total["first_coach_ms"] = 800
+    assert 'reservex_time_to_first_coach_seconds_bucket{op="scan",path="shortcut",le="1"} 1' in render_prometheus()
@@ -0,0 +1,68 @@
+import sys
+import os
+import json
+import urllib.request
+import urllib.error
+import pytest
+
+# Add parent directory to path to import mock_charts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_charts import MockChartsServer, load_fixtures, synthetic_train
+from scraper import parse_coach_composition
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return response.status, json.loads(response.read())
+
+def post_json(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+@pytest.fixture
+def server():
+    trains = load_fixtures()
+    trains["99999"] = synthetic_train("99999:4x16x20")
+    srv = MockChartsServer(trains).start()
+    yield srv
+    srv.stop()
+
+def test_page_and_schedule(server):
+    """Test the charts page and schedule are served for fixture trains"""
+    with urllib.request.urlopen(server.url, timeout=10) as response:
+        assert b"Get Train Chart" in response.read()
+
+    status, trains = get_json(server.url + "api/trains?q=126")
+    assert status == 200
+    assert trains[0]["trainNo"] == "12627"
+
+    status, schedule = get_json(server.url + "api/schedule?trainNo=12627")
+    assert schedule["stations"][0]["code"] == "SBC"
+    assert schedule["stations"][-1]["code"] == "NDLS"
+
+def test_coach_composition_parses(server):
+    """Test coachComposition payloads go through the scraper's parser"""
+    body = {"trainNo": "99999", "jDate": "2025-12-15", "boardingStation": "SAA"}
+    status, composition = post_json(server.url + "api/trainComposition", body)
+    assert status == 200
+    assert len(composition["coaches"]) == 4
+
+    coach = composition["coaches"][0]
+    status, payload = post_json(server.url + "api/coachComposition", dict(body, coach=coach))
+    assert status == 200
+    assert len(payload["bdd"]) == 16
+    assert all(v["Coach"] == coach for v in parse_coach_composition(coach, payload))
+
+def test_error_injection():
+    """Test injected faults on coachComposition"""
+    srv = MockChartsServer({"99999": synthetic_train("99999:2x4x5")}, throttle_rate=1.0).start()
+    try:
+        status, _ = post_json(srv.url + "api/coachComposition", {"trainNo": "99999", "coach": "B1"})
+        assert status == 429
+        assert srv.requests["coachComposition"] == 1
+    finally:
+        srv.stop()
@@ -0,0 +1,100 @@
+import sys
+import os
+import threading
+import pytest
+
+# Add parent directory to path to import prefetch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prefetch import ScanPrefetcher
+from scraper import ScanResult, ScanCancelled
+
+class FakePool:
+    def __init__(self, size=2, busy=0):
+        self.size = size
+        self.busy = busy
+
+    def status(self):
+        return {"size": self.size, "in_flight": self.busy, "queue_depth": 0}
+
+class FakeScan:
+    """Scans finish when `release` is set, or raise ScanCancelled once cancelled"""
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, train_no, journey_date, boarding, progress_callback=None, payload_callback=None,
+                 previous=None, cancel=None):
+        self.calls.append(boarding)
+        progress_callback(1, 2, "B1")
+        while not self.release.wait(0.01):
+            if cancel.is_set():
+                raise ScanCancelled("cancelled")
+        return ScanResult([{"Coach": "B1", "Berth": 1, "Type": "LB", "From": boarding, "To": "NDLS"}], coaches=["B1"])
+
+def test_find_seats_attaches_to_prefetch():
+    """Test a prefetch is shared, attached to while running, and consumed once used"""
+    scan = FakeScan()
+    prefetcher = ScanPrefetcher(scan=scan, pool=FakePool())
+    prefetch = prefetcher.start("12627", "2025-12-15", "SBC", "session-1")
+    assert prefetcher.start("12627", "2025-12-15", "SBC", "session-2") is prefetch
+
+    attached = prefetcher.attach("12627", "2025-12-15", "SBC", "session-1")
+    assert attached is prefetch
+    assert prefetcher.attach("12627", "2025-12-15", "KJM", "session-1") is None
+
+    scan.release.set()
+    assert prefetch.done.wait(5)
+    assert prefetch.usable and prefetch.result[0]["From"] == "SBC"
+    assert prefetch.progress == (1, 2, "B1")
+    assert scan.calls == ["SBC"]
+
+    prefetcher.take(prefetch, "session-1")
+    prefetcher.take(prefetch, "session-2")
+    assert prefetcher.attach("12627", "2025-12-15", "SBC", "session-1") is None
+
+def test_other_boarding_station_cancels_prefetch():
+    """Test releasing the last holder cancels a running prefetch"""
+    scan = FakeScan()
+    prefetcher = ScanPrefetcher(scan=scan, pool=FakePool())
+    prefetch = prefetcher.start("12627", "2025-12-15", "SBC", "session-1")
+
+    prefetcher.release("session-1", keep=("scan", "12627", "2025-12-15", "KJM"))
+    assert prefetch.done.wait(5)
+    assert not prefetch.usable
+    assert isinstance(prefetch.error, ScanCancelled)
+    assert prefetcher.status()["counts"]["cancelled"] == 1
+
+def test_prefetch_budget_and_busy_pool():
+    """Test prefetches stay within the pod budget and only use an idle browser"""
+    scan = FakeScan()
+    pool = FakePool(size=2)
+    prefetcher = ScanPrefetcher(max_in_flight=1, scan=scan, pool=pool)
+    first = prefetcher.start("12627", "2025-12-15", "SBC", "session-1")
+    assert first is not None
+    assert prefetcher.start("12628", "2025-12-15", "NDLS", "session-2") is None
+
+    pool.busy = 2
+    prefetcher.preempt("session-1")
+    assert first.done.wait(5) and not first.usable
+    assert prefetcher.start("12628", "2025-12-15", "NDLS", "session-2") is None
+    assert prefetcher.status()["counts"]["declined"] == 2
+    scan.release.set()
+
+def test_preempt_keeps_prefetches_other_sessions_hold():
+    """Test a foreground scan only preempts prefetches no other session is waiting on"""
+    scan = FakeScan()
+    pool = FakePool(size=2)
+    prefetcher = ScanPrefetcher(max_in_flight=2, scan=scan, pool=pool)
+    shared = prefetcher.start("12627", "2025-12-15", "SBC", "session-1")
+    assert prefetcher.attach("12627", "2025-12-15", "SBC", "session-2") is shared
+    own = prefetcher.start("12628", "2025-12-15", "NDLS", "session-1")
+
+    pool.busy = 2
+    prefetcher.preempt("session-1")
+    assert own.done.wait(5) and not own.usable
+    assert not shared.done.is_set()
+
+    scan.release.set()
+    assert shared.done.wait(5) and shared.usable
+    assert prefetcher.status()["counts"]["cancelled"] == 1
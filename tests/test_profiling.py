@@ -0,0 +1,32 @@
+import sys
+import os
+import json
+import pytest
+
+# Add parent directory to path to import profiling
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import span
+from profiling import MemoryProfiler, format_report
+
+def test_stage_peak_and_retained_memory(tmp_path):
+    """Test a stage's temporary peak and retained memory are attributed to it"""
+    profiler = MemoryProfiler(str(tmp_path), frames=4).start()
+    try:
+        with span("solve", op="test"):
+            scratch = [bytes(1024) for _ in range(2000)]  # ~2 MB, freed before the stage ends
+            del scratch
+            kept = [bytes(1024) for _ in range(500)]  # ~0.5 MB, still alive afterwards
+    finally:
+        profiler.stop()
+
+    stage = profiler.report()["stages"]["solve"]
+    assert stage["runs"] == 1
+    assert stage["peak_delta_bytes"] > 2_000_000
+    assert 500_000 < stage["retained_bytes_max"] < 1_500_000
+    assert stage["top_sites"][0]["site"].startswith("tests/test_profiling.py:")
+
+    with open(profiler.report_path) as f:
+        assert "solve" in json.load(f)["stages"]
+    assert "solve" in format_report(profiler.report())
+    assert len(kept) == 500
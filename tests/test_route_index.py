@@ -0,0 +1,58 @@
+import sys
+import os
+import pytest
+
+# Add parent directory to path to import route_index
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from route_index import RouteIndex, get_route_index
+
+# A loop route that passes JN twice
+LOOP = (
+    {"code": "SBC", "name": "KSR BENGALURU", "dist": 0},
+    {"code": "JN", "name": "LOOP JN", "dist": 50},
+    {"code": "BNC", "name": "BENGALURU CANT", "dist": 80},
+    {"code": "JN", "name": "LOOP JN", "dist": 120},
+    {"code": "MYS", "name": "MYSURU JN", "dist": 200}
+)
+
+def test_repeated_codes_keep_every_stop():
+    """Test a code that appears twice resolves to the stop after the given position"""
+    index = RouteIndex(LOOP)
+    assert index.positions["JN"] == (1, 3)
+    assert index.position("JN") == 1
+    assert index.position("JN", after=2) == 3
+    assert index.segment("BNC", "JN") == (2, 3)
+    assert index.segment("JN", "MYS") == (1, 4)
+    assert index.segment("MYS", "SBC") is None
+    assert index.segment("JN", "MYS", from_position=2) == (3, 4)
+    assert index.segment("SBC", "MYS", from_position=2) == (0, 4)
+    assert index.position_at(120) == 3
+    assert index.position_at(121) is None
+    assert index.label(4) == "MYS - MYSURU JN"
+
+def test_journey_takes_positions_or_codes():
+    """Test a journey picked by position keeps the second stop of a repeated code"""
+    index = RouteIndex(LOOP)
+    assert index.journey(3, 4) == (3, 4)
+    assert index.journey("JN", "MYS") == (1, 4)
+    assert index.journey(2, "JN") == (2, 3)
+    assert index.journey(4, "SBC") == (4, 0)  # backwards; callers reject it
+    assert index.journey("XXX", 4) is None
+    assert index.journey(0, 5) is None
+
+def test_search_matches_code_and_name_word_prefixes():
+    """Test autocomplete lookups by code, name and any word of the name, in route order"""
+    index = RouteIndex(LOOP)
+    assert index.search("beng") == [0, 2]
+    assert index.search("jn") == [1, 3, 4]
+    assert index.search("MYS") == [4]
+    assert index.search("jn", limit=2) == [1, 3]
+    assert index.search("xyz") == []
+
+def test_get_route_index_is_built_once_per_route():
+    """Test station lists are indexed once, and plain maps are ordered by distance"""
+    assert get_route_index(LOOP) is get_route_index(LOOP)
+    index = get_route_index({"B": 10, "A": 0})
+    assert index.codes == ["A", "B"]
+    assert get_route_index(index) is index
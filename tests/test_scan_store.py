@@ -0,0 +1,69 @@
+import sys
+import os
+import pytest
+
+# Add parent directory to path to import scan_store
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scan_store import ScanStore, VacancyRecord, scan_key
+from solver import process_vacancies
+
+MOCK_STATIONS = [
+    {"code": "NDLS", "name": "NEW DELHI", "dist": 0},
+    {"code": "CNB", "name": "KANPUR CENTRAL", "dist": 400},
+    {"code": "PNBE", "name": "PATNA JN", "dist": 1000}
+]
+
+def test_records_behave_like_dicts():
+    """Test stored rows are immutable but readable by field name"""
+    store = ScanStore()
+    key = store.put_scan("12627", "2025-12-15", "NDLS", [
+        {"Coach": "B1", "Berth": 20, "Type": "UB", "From": "NDLS", "To": "CNB"}
+    ])
+    row = store.get(key).raw_vacancies[0]
+
+    assert isinstance(row, VacancyRecord)
+    assert row["Coach"] == "B1"
+    assert row.get("Missing") is None
+    assert row.to_dict()["To"] == "CNB"
+    with pytest.raises(TypeError):
+        row[0] = "B2"
+
+def test_entries_work_with_solver():
+    """Test shared entries can be passed straight to process_vacancies"""
+    store = ScanStore()
+    route = store.get(store.put_route("12627", MOCK_STATIONS))
+    scan = store.get(store.put_scan("12627", "2025-12-15", "NDLS", [
+        {"Coach": "B1", "Berth": 20, "Type": "UB", "From": "NDLS", "To": "CNB"}
+    ]))
+
+    result = process_vacancies(scan.raw_vacancies, route.station_map, "NDLS", "PNBE")
+    assert len(result) == 1
+    assert result[0]["Coverage_Pct"] == 40.0
+
+def test_lru_eviction_skips_held_entries():
+    """Test unheld entries are evicted first, least recently used first"""
+    store = ScanStore(max_entries=2)
+    held = store.put_scan("1", "2025-12-15", "A", [], holder="session-a")
+    store.put_scan("2", "2025-12-15", "A", [])
+    store.put_scan("3", "2025-12-15", "A", [])
+
+    assert store.get(held) is not None
+    assert store.get(scan_key("2", "2025-12-15", "A")) is None
+    assert store.refcount(held) == 1
+
+    store.release(held, "session-a")
+    assert store.refcount(held) == 0
+
+def test_private_scans_leave_the_shared_scan_alone():
+    """Test a session's partial scan is kept under its own key, not the chart's shared one"""
+    store = ScanStore()
+    shared = store.put_scan("12627", "2025-12-15", "NDLS", [
+        {"Coach": "B1", "Berth": 20, "Type": "UB", "From": "NDLS", "To": "CNB"}
+    ])
+    private = store.put_scan("12627", "2025-12-15", "NDLS", [], holder="session-a", private=True)
+
+    assert private != shared and private == scan_key("12627", "2025-12-15", "NDLS", "session-a")
+    assert len(store.get(shared).raw_vacancies) == 1
+    assert store.get(private).raw_vacancies == ()
+    assert store.refcount(private) == 1
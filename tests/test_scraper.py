@@ -0,0 +1,229 @@
+import sys
+import os
+import json
+import time
+import pytest
+
+# Add parent directory to path to import scraper
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scraper
+from scraper import ScanResult, carry_over_stale, _is_coach_response
+from solver import ScanGoal
+from scan_store import ScanEntry
+
+class FakeRequest:
+    def __init__(self, body):
+        self.post_data_json = body
+
+class FakeResponse:
+    def __init__(self, url, body):
+        self.url = url
+        self.request = FakeRequest(body)
+
+def test_missing_coaches_fall_back_to_previous_scan():
+    """Test coaches missing from this scan are filled from the previous one and tagged stale"""
+    fresh = [{"Coach": "B1", "Berth": 1, "Type": "LB", "From": "A", "To": "B"}]
+    previous = ScanEntry([
+        {"Coach": "B1", "Berth": 9, "Type": "UB", "From": "A", "To": "C"},
+        {"Coach": "B2", "Berth": 3, "Type": "SL", "From": "A", "To": "C"}
+    ]).raw_vacancies
+
+    vacancies, missing, stale = carry_over_stale(fresh, ["B2", "B3"], previous)
+    assert [(v["Coach"], v["Berth"]) for v in vacancies] == [("B1", 1), ("B2", 3)]
+    assert missing == ["B3"]
+    assert stale == ["B2"]
+
+def test_scan_result_metadata_reaches_store():
+    """Test the store keeps which coaches were missing or stale"""
+    result = ScanResult([], coaches=["B1", "B2", "B3"], missing=["B3"], stale=["B2"])
+    assert not result.complete
+
+    entry = ScanEntry(result)
+    assert entry.missing == ("B3",)
+    assert entry.stale == ("B2",)
+    assert not entry.complete
+    assert ScanEntry([]).complete
+
+def test_late_response_for_another_coach_is_ignored():
+    """Test a timed-out earlier request's response is not taken as this coach's"""
+    url = "https://example/api/coachComposition"
+    assert _is_coach_response(FakeResponse(url, {"coach": "B2"}), "B2")
+    assert not _is_coach_response(FakeResponse(url, {"coach": "B1"}), "B2")
+    assert _is_coach_response(FakeResponse(url, None), "B2")
+    assert not _is_coach_response(FakeResponse("https://example/api/trainComposition", {}), "B2")
+
+def test_goal_stops_scan_and_reports_skipped_coaches(monkeypatch):
+    """Test a met goal skips the remaining coaches, scanning the likeliest first"""
+    payload = lambda frm, to: json.dumps({"bdd": [
+        {"berthNo": 1, "berthCode": "LB", "bsd": [{"from": frm, "to": to, "occupancy": False}]}
+    ]}).encode()
+    bodies = {"S1": payload("A", "B"), "B1": payload("A", "C"), "A1": payload("A", "B")}
+    fetched = []
+    def fetch(page, btn, name, **kwargs):
+        fetched.append(name)
+        return bodies[name], False
+    monkeypatch.setattr(scraper, "_fetch_coach", fetch)
+
+    class Button:
+        def __init__(self, name):
+            self.name = name
+        def inner_text(self):
+            return self.name
+
+    goal = ScanGoal({"A": 0, "B": 50, "C": 100}, "A", "C", min_coverage_pct=100)
+    total = {}
+    vacancies, names, missing, skipped = scraper._scan_coaches(
+        None, [Button(n) for n in ("S1", "B1", "A1")], total, time.monotonic(), goal=goal
+    )
+    assert fetched == ["A1", "B1"]
+    assert names == ["S1", "B1", "A1"]
+    assert skipped == ["S1"]
+    assert total["skipped"] == 1
+    assert ScanEntry(ScanResult(vacancies, coaches=names, skipped=skipped)).skipped == ("S1",)
+
+class FakePage:
+    def __init__(self, cancel=None, cancel_after=None):
+        self.waited_ms = 0
+        self.cancel = cancel
+        self.cancel_after = cancel_after
+
+    def wait_for_timeout(self, ms):
+        time.sleep(ms / 1000)
+        self.waited_ms += ms
+        if self.cancel_after is not None and self.waited_ms >= self.cancel_after:
+            self.cancel.set()
+
+def test_cancelled_scan_stops_waiting_promptly():
+    """Test long page waits are sliced so a cancel is noticed within one poll"""
+    import threading
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+    cancel = threading.Event()
+    page = FakePage(cancel, cancel_after=scraper.CANCEL_POLL_MS)
+    with scraper._cancel_scope(cancel):
+        with pytest.raises(scraper.ScanCancelled):
+            scraper._pause(page, 10000)
+    assert page.waited_ms <= scraper.CANCEL_POLL_MS
+
+    # Outside a scope, or with the event clear, the full pause runs
+    page = FakePage()
+    scraper._pause(page, 600)
+    assert page.waited_ms == pytest.approx(600, abs=50)
+
+    calls = []
+    def wait(timeout):
+        calls.append(timeout)
+        if len(calls) == 2:
+            cancel.set()
+        time.sleep(timeout / 1000)
+        raise PlaywrightTimeoutError("still waiting")
+
+    cancel.clear()
+    with scraper._cancel_scope(cancel):
+        with pytest.raises(scraper.ScanCancelled):
+            scraper._wait_cancellable(wait, 15000)
+    assert len(calls) == 2 and max(calls) <= scraper.CANCEL_POLL_MS
+
+    # Without a cancel the wait's own timeout is raised at the deadline
+    with pytest.raises(PlaywrightTimeoutError):
+        scraper._wait_cancellable(wait, 300)
+
+def test_cancel_drops_scan_queued_for_a_browser():
+    """Test a scan cancelled while waiting for a pooled browser never runs"""
+    import threading
+    from concurrent.futures import CancelledError
+    from browser_pool import BrowserPool
+
+    pool = BrowserPool(size=1)
+    cancel = threading.Event()
+    cancel.set()
+    # No worker is started, so the job stays queued until run() drops it
+    pool._threads = [threading.current_thread()]
+    with pytest.raises(CancelledError):
+        pool.run(lambda browser, cancel=None: "ran", cancel=cancel)
+
+def test_default_pool_size_follows_memory_limit(monkeypatch):
+    """Test the unset pool size fits browsers to the memory limit, within 2..4"""
+    import browser_pool
+
+    for limit_mb, size in ((512, 2), (1024, 4), (8192, 4), (256, 2)):
+        monkeypatch.setattr(browser_pool, "_memory_limit", lambda: limit_mb * 2**20)
+        assert browser_pool.default_pool_size() == size
+    monkeypatch.setattr(browser_pool, "_memory_limit", lambda: None)
+    assert browser_pool.default_pool_size() == 2
+
+def test_pipeline_without_schedule_is_not_an_error(monkeypatch):
+    """Test a train with no schedule returns an empty result with the span still ok"""
+    import metrics
+
+    class Context:
+        closed = False
+        def new_page(self):
+            return FakePage()
+        def close(self):
+            Context.closed = True
+
+    monkeypatch.setattr(scraper, "_goto", lambda page, url, timeout_ms: None)
+    monkeypatch.setattr(scraper, "new_stealth_context", lambda browser, state=None: Context())
+    monkeypatch.setattr(scraper, "_select_train", lambda page, train_no: None)
+    monkeypatch.setattr(scraper, "_read_schedule", lambda page, train_no: [])
+    monkeypatch.setattr(scraper, "_pause", lambda page, ms: None)
+
+    events = []
+    listener = lambda stage, event: events.append(event) if stage == "end" and event["phase"] == "total" else None
+    metrics.add_listener(listener)
+    try:
+        stations, result = scraper._get_route_and_vacancies(None, "12345", "2026-01-01")
+    finally:
+        metrics.remove_listener(listener)
+
+    assert stations == [] and list(result) == [] and result.coaches == []
+    assert Context.closed
+    assert events[0]["status"] == "ok"
+
+class SlowNavigationPage(FakePage):
+    """goto times out before commit; the navigation commits after commit_after_ms of waiting"""
+    main_frame = "main"
+
+    def __init__(self, commit_after_ms=None, **kwargs):
+        super().__init__(**kwargs)
+        self.commit_after_ms = commit_after_ms
+        self.listeners = []
+        self.loaded = False
+
+    def on(self, event, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, event, listener):
+        self.listeners.remove(listener)
+
+    def goto(self, url, timeout, wait_until):
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+        raise PlaywrightTimeoutError(f"goto timed out after {timeout} ms")
+
+    def wait_for_timeout(self, ms):
+        super().wait_for_timeout(ms)
+        if self.commit_after_ms is not None and self.waited_ms >= self.commit_after_ms:
+            for listener in list(self.listeners):
+                listener(self.main_frame)
+
+    def wait_for_load_state(self, state, timeout):
+        self.loaded = True
+
+def test_slow_navigation_stays_cancellable():
+    """Test a navigation slower than its first try is waited for in slices, and can be cancelled"""
+    import threading
+
+    page = SlowNavigationPage(commit_after_ms=500)
+    scraper._goto(page, "https://example.test/charts", 60000)
+    assert page.loaded and page.listeners == []
+
+    cancel = threading.Event()
+    page = SlowNavigationPage(cancel=cancel, cancel_after=scraper.CANCEL_POLL_MS)
+    started = time.monotonic()
+    with scraper._cancel_scope(cancel):
+        with pytest.raises(scraper.ScanCancelled):
+            scraper._goto(page, "https://example.test/charts", 60000)
+    assert time.monotonic() - started < 1
+    assert not page.loaded and page.listeners == []
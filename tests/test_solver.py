@@ -6,7 +6,11 @@ import pytest
 # Add parent directory to path to import solver
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from solver import process_vacancies, find_all_seat_chains
+import random
+from itertools import combinations
+
+from solver import (process_vacancies, find_all_seat_chains, best_partial_plan, availability_profile, ScanGoal, rank_coaches,
+                    compile_filter, register_filter, VACANCY_FILTERS)
 
 # Mock Data
 MOCK_STATION_MAP = {
@@ -45,6 +49,35 @@ def test_process_vacancies_filter_ac():
     assert len(result) == 1
     assert result[0]["Coach"] == "B1"
 
+def test_compiled_filters():
+    """Test compiled filters by class, coach and coverage, their cache and a registered filter"""
+    raw_vacancies = [
+        {"Coach": "B1", "Berth": 1, "Type": "LB", "From": "NDLS", "To": "PNBE"},
+        {"Coach": "B2", "Berth": 2, "Type": "UB", "From": "NDLS", "To": "CNB"},  # 40%
+        {"Coach": "A1", "Berth": 3, "Type": "LB", "From": "NDLS", "To": "PNBE"},
+        {"Coach": "S1", "Berth": 4, "Type": "SL", "From": "NDLS", "To": "PNBE"}
+    ]
+    run = lambda **filters: [v["Coach"] for v in process_vacancies(
+        raw_vacancies, MOCK_STATION_MAP, "NDLS", "PNBE", filters=compile_filter(**filters))]
+
+    assert run(coach_classes=["b"]) == ["B1", "B2"]
+    assert run(coaches=["A1", "S1"], ac_only=True) == ["A1"]
+    assert run(min_coverage_pct=50, berth_preferences=["LB", "UB"]) == ["B1", "A1"]
+    assert compile_filter(berth_preferences=["UB", "LB"]) is compile_filter(berth_preferences=("LB", "UB"))
+    with pytest.raises(ValueError):
+        compile_filter(colour="blue")
+
+    # Type was always optional in raw dicts: the berth filter drops such a row, no filter keeps it
+    untyped = [{"Coach": "B1", "Berth": 5, "From": "NDLS", "To": "PNBE"}]
+    assert process_vacancies(untyped, MOCK_STATION_MAP, "NDLS", "PNBE", berth_preferences=["LB"]) == []
+    assert process_vacancies(untyped, MOCK_STATION_MAP, "NDLS", "PNBE")[0]["Type"] is None
+
+    register_filter("odd_berths")(lambda on: (lambda v: v[1] % 2 == 1) if on else None)
+    try:
+        assert run(odd_berths=True) == ["B1", "A1"]
+    finally:
+        del VACANCY_FILTERS["odd_berths"]
+
 def test_process_vacancies_no_overlap():
     """Test vacancy clearly outside journey"""
     raw_vacancies = [
@@ -57,6 +90,52 @@ def test_process_vacancies_no_overlap():
     result = process_vacancies(raw_vacancies, MOCK_STATION_MAP, "NDLS", "CNB")
     assert len(result) == 0
 
+def test_process_vacancies_on_loop_route():
+    """Test a station the route passes twice is resolved to the stop after the vacancy starts"""
+    stations = [
+        {"code": "A", "name": "A", "dist": 0},
+        {"code": "J", "name": "J", "dist": 100},
+        {"code": "B", "name": "B", "dist": 150},
+        {"code": "J", "name": "J", "dist": 200},
+        {"code": "C", "name": "C", "dist": 300}
+    ]
+    raw_vacancies = [{"Coach": "B1", "Berth": 1, "Type": "LB", "From": "B", "To": "J"}]
+
+    result = process_vacancies(raw_vacancies, stations, "A", "C")
+    assert len(result) == 1
+    assert (result[0]["Start_Dist"], result[0]["End_Dist"]) == (150, 200)
+
+def test_journey_from_second_stop_of_loop_route():
+    """Test boarding at the second stop of a repeated code, given by position, solves that journey"""
+    stations = [
+        {"code": "A", "name": "A", "dist": 0},
+        {"code": "J", "name": "J", "dist": 100},
+        {"code": "B", "name": "B", "dist": 150},
+        {"code": "J", "name": "J", "dist": 200},
+        {"code": "C", "name": "C", "dist": 300}
+    ]
+    raw_vacancies = [{"Coach": "B1", "Berth": 1, "Type": "LB", "From": "B", "To": "C"}]
+
+    # By code, J is its first stop and the seat leaves 100-150 uncovered
+    assert process_vacancies(raw_vacancies, stations, "J", "C")[0]["Coverage_Pct"] == 75.0
+
+    # The dropdowns give positions: J's second stop (3) to C (4)
+    processed = process_vacancies(raw_vacancies, stations, 3, 4)
+    assert processed[0]["Coverage_Pct"] == 100.0
+    assert processed[0]["Coverage_Km"] == 100
+    assert len(find_all_seat_chains(processed, stations, 3, 4)) == 1
+    assert find_all_seat_chains(processed, stations, "J", "C") == []
+    assert best_partial_plan(processed, stations, 3, 4)["coverage_pct"] == 100.0
+
+    goal = ScanGoal(stations, 3, 4, max_swaps=0)
+    assert goal.add(raw_vacancies)
+
+    # A berth free from J, on a journey boarding at B, is free from the J stop after B
+    from_j = [{"Coach": "B2", "Berth": 2, "Type": "UB", "From": "J", "To": "C"}]
+    processed = process_vacancies(from_j, stations, "B", "C")
+    assert (processed[0]["Start_Dist"], processed[0]["End_Dist"]) == (200, 300)
+    assert processed[0]["Coverage_Pct"] == 66.7
+
 def test_find_all_seat_chains_success():
     """Test successful chain finding"""
     # Chain: B1 (NDLS->CNB) + B2 (CNB->PNBE)
@@ -82,3 +161,101 @@ def test_find_all_seat_chains_broken():
     
     chains = find_all_seat_chains(vacancies, MOCK_STATION_MAP, "NDLS", "PNBE")
     assert len(chains) == 0
+
+def test_best_partial_plan_reports_gaps():
+    """Test the plan covers the most km with bounded swaps and lists what's left"""
+    seat = lambda coach, frm, to: {"Coach": coach, "Berth": 1, "Type": "LB", "From": frm, "To": to,
+                                   "Start_Dist": MOCK_STATION_MAP[frm], "End_Dist": MOCK_STATION_MAP[to]}
+    vacancies = [
+        seat("B1", "NDLS", "CNB"),
+        seat("B2", "CNB", "PRYJ"),
+        seat("B3", "NDLS", "PRYJ"),  # same stretch as B1 + B2 without the swap
+        seat("B4", "DDU", "PNBE")
+    ]
+
+    plan = best_partial_plan(vacancies, MOCK_STATION_MAP, "NDLS", "PNBE")
+    assert plan["covered_km"] == 800
+    assert plan["coverage_pct"] == 80.0
+    assert [leg["Coach"] for leg in plan["legs"]] == ["B3", "B4"]
+    assert plan["swaps"] == 1
+    assert plan["gaps"] == [{"From": "PRYJ", "To": "DDU", "Km": 200}]
+
+    # No swaps allowed: the single longest seat
+    plan = best_partial_plan(vacancies, MOCK_STATION_MAP, "NDLS", "PNBE", max_swaps=0)
+    assert [leg["Coach"] for leg in plan["legs"]] == ["B3"]
+    assert plan["gaps"] == [{"From": "PRYJ", "To": "PNBE", "Km": 400}]
+
+def test_best_partial_plan_boards_overlapping_seat_midway():
+    """Test a seat overlapping the previous one is boarded where that one ends"""
+    station_map = {"A": 0, "B": 10, "C": 20, "D": 30, "E": 40}
+    seat = lambda coach, frm, to: {"Coach": coach, "Berth": 1, "Type": "LB", "From": frm, "To": to,
+                                   "Start_Dist": station_map[frm], "End_Dist": station_map[to]}
+    plan = best_partial_plan([seat("B1", "A", "C"), seat("B2", "B", "D")], station_map, "A", "E")
+    assert plan["covered_km"] == 30
+    assert [(leg["From"], leg["To"]) for leg in plan["legs"]] == [("A", "C"), ("C", "D")]
+    assert plan["legs"][1]["Vacant_From"] == "B"
+    assert plan["gaps"] == [{"From": "D", "To": "E", "Km": 10}]
+
+def test_best_partial_plan_matches_brute_force():
+    """Test the DP against trying every combination of seats on random charts"""
+    rng = random.Random(7)
+    station_map = {f"S{i}": i * 10 for i in range(12)}
+    for _ in range(200):
+        vacancies = []
+        for n in range(rng.randint(1, 7)):
+            a, b = sorted(rng.sample(range(12), 2))
+            vacancies.append({"Coach": f"B{n}", "Berth": n, "Type": "LB", "From": f"S{a}", "To": f"S{b}",
+                              "Start_Dist": a * 10, "End_Dist": b * 10})
+        start, end = sorted(rng.sample(range(12), 2))
+        max_swaps = rng.randint(0, 3)
+
+        best = 0
+        for k in range(1, max_swaps + 2):
+            for combo in combinations(vacancies, k):
+                covered = {d for v in combo for d in range(max(v["Start_Dist"], start * 10), min(v["End_Dist"], end * 10), 10)}
+                best = max(best, len(covered) * 10)
+
+        plan = best_partial_plan(vacancies, station_map, f"S{start}", f"S{end}", max_swaps=max_swaps)
+        assert plan["covered_km"] == best
+        assert plan["swaps"] <= max_swaps
+        assert sum(leg["Coverage_Km"] for leg in plan["legs"]) == best
+        assert best + sum(gap["Km"] for gap in plan["gaps"]) == (end - start) * 10
+
+def test_availability_profile_counts_per_segment_and_class():
+    """Test free berths are counted on every segment they cover, split by class"""
+    stations = [{"code": code, "name": code, "dist": dist} for code, dist in MOCK_STATION_MAP.items()]
+    vacancies = [
+        {"Coach": "B1", "Berth": 1, "Type": "LB", "From": "NDLS", "To": "PRYJ"},
+        {"Coach": "B2", "Berth": 5, "Type": "UB", "From": "CNB", "To": "PNBE"},
+        {"Coach": "S1", "Berth": 3, "Type": "SL", "From": "PRYJ", "To": "DDU"},
+        {"Coach": "S1", "Berth": 4, "Type": "SL", "From": "DDU", "To": "CNB"},  # backwards: ignored
+        {"Coach": "A1", "Berth": 2, "Type": "LB", "From": "XYZ", "To": "PNBE"}  # not on the route
+    ]
+    profile = availability_profile(vacancies, stations)
+    assert profile["classes"] == ["B", "S"]
+    assert profile["counts"]["B"] == [1, 2, 1, 1]
+    assert profile["counts"]["S"] == [0, 0, 1, 0]
+    assert profile["total"] == [1, 2, 2, 1]
+
+def test_scan_goal_single_seat_and_chain():
+    """Test goals are met incrementally by coverage or by swaps"""
+    station_map = {"A": 0, "B": 50, "C": 100}
+    seat = lambda coach, berth, frm, to: {"Coach": coach, "Berth": berth, "Type": "LB", "From": frm, "To": to}
+
+    goal = ScanGoal(station_map, "A", "C", min_coverage_pct=80)
+    assert not goal.add([seat("B1", 1, "A", "B")])
+    assert goal.add([seat("B2", 1, "A", "C")])
+
+    goal = ScanGoal(station_map, "A", "C", max_swaps=1)
+    assert not goal.add([seat("B1", 1, "A", "B")])
+    assert goal.add([seat("B2", 2, "B", "C")])
+
+    # Filters apply: a side upper alone can't satisfy a lower-berth-only goal
+    goal = ScanGoal(station_map, "A", "C", min_coverage_pct=50, berth_preferences=["SL"])
+    assert not goal.add([seat("B1", 1, "A", "C")])
+
+def test_rank_coaches_prefers_history_then_class():
+    """Test coaches are ordered by past vacancies, then class prior, non-AC last for ac_only"""
+    assert rank_coaches(["S1", "B1", "A1"]) == ["A1", "B1", "S1"]
+    assert rank_coaches(["S1", "B1", "A1"], {"S1": 9.0, "B1": 1.0}) == ["S1", "A1", "B1"]
+    assert rank_coaches(["S1", "B1", "A1"], {"S1": 9.0, "B1": 1.0}, ac_only=True) == ["A1", "B1", "S1"]
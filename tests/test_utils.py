@@ -0,0 +1,90 @@
+import sys
+import os
+import pytest
+
+# Add parent directory to path to import utils
+from route_index import get_route_index
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+from utils import render_route_map, render_visual_timeline, render_availability_profile
+
+MOCK_STATIONS = (
+    {"code": "NDLS", "name": "NEW DELHI", "dist": 0},
+    {"code": "CNB", "name": "KANPUR CENTRAL", "dist": 400},
+    {"code": "PRYJ", "name": "PRAYAGRAJ JN", "dist": 600},
+    {"code": "DDU", "name": "DDU", "dist": 800},
+    {"code": "PNBE", "name": "PATNA JN", "dist": 1000}
+)
+
+def test_route_map_segment():
+    """Test only the selected segment is rendered, with names hidden when equal to the code"""
+    html = render_route_map(MOCK_STATIONS, "CNB", "DDU")
+    assert "Showing 3 stations from <b>CNB</b> to <b>DDU</b>" in html
+    assert "NDLS" not in html
+    assert 'title="Prayagraj Jn"' in html
+    assert 'title=""' in html  # DDU name matches its code
+
+def test_route_map_unknown_station():
+    """Test unknown stations render nothing"""
+    assert render_route_map(MOCK_STATIONS, "XXX", "DDU") == ""
+
+def test_route_map_is_memoized_per_route_object():
+    """Test repeat renders reuse the cached HTML, while a different route object is rendered fresh"""
+    first = render_route_map(MOCK_STATIONS, "NDLS", "PNBE")
+    assert render_route_map(MOCK_STATIONS, "NDLS", "PNBE") is first
+
+    renamed = tuple(dict(s, name="RENAMED") for s in MOCK_STATIONS)
+    assert "Renamed" in render_route_map(renamed, "NDLS", "PNBE")
+
+    # The pre-rendered stations are kept with the route's shared RouteIndex
+    assert "route_map_fragments" in get_route_index(MOCK_STATIONS)._derived
+
+def test_visual_timeline_intermediates():
+    """Test intermediate stops and swap markers in the timeline"""
+    chain = [
+        {"Coach": "B1", "Berth": 1, "Type": "LB", "From": "NDLS", "To": "PRYJ"},
+        {"Coach": "B2", "Berth": 2, "Type": "UB", "From": "PRYJ", "To": "PNBE"}
+    ]
+    html = render_visual_timeline(chain, MOCK_STATIONS)
+    assert 'title="Stops: CNB"' in html
+    assert 'title="Stops: DDU"' in html
+    assert html.count("&#127939;") == 1  # one swap between two legs
+    assert "#FFC107" in html  # UB leg is highlighted
+
+def test_availability_profile_render_is_cached_per_scan(monkeypatch):
+    """Test the profile highlights the journey and is built once per scan object"""
+    vacancies = (
+        {"Coach": "B1", "Berth": 1, "Type": "LB", "From": "NDLS", "To": "PRYJ"},
+        {"Coach": "S2", "Berth": 7, "Type": "UB", "From": "CNB", "To": "PNBE"}
+    )
+    html = render_availability_profile(vacancies, MOCK_STATIONS, "CNB", "DDU")
+    assert "Most free: <b>2</b> after <b>CNB</b>" in html
+    assert 'title="CNB &#8594; PRYJ: B: 1, S: 1"' in html
+    assert html.count("#2E7D32") == 2  # CNB-PRYJ and PRYJ-DDU
+    assert render_availability_profile(vacancies, MOCK_STATIONS, "CNB", "DDU") is html
+
+    # Only the most recent journeys stay rendered, however many pairs a session tries
+    monkeypatch.setattr(utils, "_PROFILE_JOURNEYS_SIZE", 3)
+    pairs = [(a["code"], b["code"]) for i, a in enumerate(MOCK_STATIONS) for b in MOCK_STATIONS[i + 1:]]
+    for start, end in pairs:
+        render_availability_profile(vacancies, MOCK_STATIONS, start, end)
+    assert list(utils._availability(vacancies, get_route_index(MOCK_STATIONS))["html"]) == pairs[-3:]
+
+    assert render_availability_profile((), MOCK_STATIONS, "CNB", "DDU") == ""
+
+def test_renderers_take_route_positions():
+    """Test the route map and profile highlight the stop picked by position on a loop route"""
+    loop = (
+        {"code": "A", "name": "A", "dist": 0},
+        {"code": "J", "name": "J", "dist": 100},
+        {"code": "B", "name": "B", "dist": 150},
+        {"code": "J", "name": "J", "dist": 200},
+        {"code": "C", "name": "C", "dist": 300}
+    )
+    assert "Showing 2 stations from <b>J</b> to <b>C</b>" in render_route_map(loop, 3, 4)
+    assert "Showing 4 stations from <b>J</b> to <b>C</b>" in render_route_map(loop, "J", "C")
+
+    vacancies = ({"Coach": "B1", "Berth": 1, "Type": "LB", "From": "A", "To": "C"},)
+    assert render_availability_profile(vacancies, loop, 3, 4).count("#2E7D32") == 1
+    assert render_availability_profile(vacancies, loop, "J", "C").count("#2E7D32") == 3
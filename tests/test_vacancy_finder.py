@@ -0,0 +1,49 @@
+import sys
+import os
+import json
+import pytest
+
+# Add parent directory to path to import vacancy_finder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vacancy_finder import read_jobs, read_results, pending_jobs
+
+def test_read_jobs_expands_dates_and_skips_duplicates(tmp_path):
+    """Test CSV and JSON rows are parsed, dateless rows expanded over --dates"""
+    path = tmp_path / "jobs.csv"
+    path.write_text(
+        "# nightly sweep\n"
+        "train,date,boarding\n"
+        "12627,2025-12-15,SBC\n"
+        "12628\n"
+        '{"train_no": "12627", "journey_date": "2025-12-15", "boarding": "SBC"}\n'
+    )
+    jobs = read_jobs(str(path), dates=["2025-12-20", "2025-12-21"])
+    assert jobs == [
+        {"train_no": "12627", "journey_date": "2025-12-15", "boarding": "SBC"},
+        {"train_no": "12628", "journey_date": "2025-12-20", "boarding": None},
+        {"train_no": "12628", "journey_date": "2025-12-21", "boarding": None}
+    ]
+
+    path.write_text("12627,15-12-2025,SBC\n")
+    with pytest.raises(ValueError):
+        read_jobs(str(path))
+
+def test_resume_skips_finished_jobs(tmp_path):
+    """Test resume skips ok jobs, reruns errors, and seeds partial jobs with their vacancies"""
+    out = tmp_path / "out.jsonl"
+    partial_vacancies = [{"Coach": "B1", "Berth": 1, "Type": "LB", "From": "A", "To": "B"}]
+    lines = [
+        {"train_no": "1", "journey_date": "2025-12-15", "boarding": "A", "status": "error"},
+        {"train_no": "1", "journey_date": "2025-12-15", "boarding": "A", "status": "ok"},
+        {"train_no": "2", "journey_date": "2025-12-15", "boarding": "A", "status": "partial", "vacancies": partial_vacancies},
+        {"train_no": "3", "journey_date": "2025-12-15", "boarding": "A", "status": "error"}
+    ]
+    # The last line was torn by a crash
+    out.write_text("".join(json.dumps(l) + "\n" for l in lines) + '{"train_no": "4", "jour')
+
+    jobs = [{"train_no": n, "journey_date": "2025-12-15", "boarding": "A"} for n in ("1", "2", "3", "4")]
+    pending = pending_jobs(jobs, read_results(str(out)))
+    assert [(job["train_no"], previous) for job, previous in pending] == [
+        ("2", partial_vacancies), ("3", None), ("4", None)
+    ]
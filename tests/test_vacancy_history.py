@@ -0,0 +1,61 @@
+import sys
+import os
+import pytest
+
+# Add parent directory to path to import vacancy_history
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pa = pytest.importorskip("pyarrow")
+
+from vacancy_history import VacancyHistory
+from scraper import ScanResult
+
+def vacancy(coach, berth, frm="SBC", to="NDLS"):
+    return {"Coach": coach, "Berth": berth, "Type": "LB", "From": frm, "To": to}
+
+def test_scans_round_trip_with_dictionary_columns(tmp_path):
+    """Test appended scans come back per partition, with stations and coaches dictionary-encoded"""
+    history = VacancyHistory(str(tmp_path))
+    history.append("12627", "2025-12-15", "SBC",
+                   ScanResult([vacancy("B1", 1), vacancy("B2", 7, to="KJM")], coaches=["B1", "B2", "B3"], missing=["B3"]))
+    history.append("12627", "2025-12-15", "SBC", [vacancy("B1", 1)])
+    history.append("12627", "2025-12-16", "SBC", [])
+
+    table = history.read_table("12627", "2025-12-15")
+    assert table.num_rows == 3
+    assert pa.types.is_dictionary(table.schema.field("from_stn").type)
+    assert pa.types.is_dictionary(table.schema.field("coach").type)
+
+    df = history.query("12627", ("2025-12-01", "2025-12-31"), columns=["coach", "berth", "to_stn"])
+    assert list(df.columns) == ["coach", "berth", "to_stn", "train_no", "journey_date"]
+    assert sorted(df["to_stn"].astype(str)) == ["KJM", "NDLS", "NDLS"]
+
+    scans = history.scans("12627")
+    assert sorted(scans["rows"]) == [0, 1, 2]
+    assert ["B3"] in list(scans["missing"])
+
+def test_query_reads_only_matching_partitions(tmp_path):
+    """Test a query never opens files outside the requested train and dates"""
+    history = VacancyHistory(str(tmp_path))
+    history.append("12627", "2025-12-15", "SBC", [vacancy("B1", 1)])
+    broken = tmp_path / "train_no=12628" / "journey_date=2025-12-15"
+    broken.mkdir(parents=True)
+    (broken / "corrupt.arrow").write_bytes(b"not arrow")
+
+    assert history.query("12627").shape[0] == 1
+    assert history.query(journey_dates=["2025-12-16"]).empty
+    with pytest.raises(pa.ArrowInvalid):
+        history.query("12628")
+
+def test_goal_limited_scan_leaves_skipped_coach_means_alone(tmp_path):
+    """Test a scan that skipped a coach does not count as a scan with no vacancies in it"""
+    history = VacancyHistory(str(tmp_path))
+    history.append("12627", "2025-12-15", "SBC", ScanResult([vacancy("B1", 1), vacancy("B2", 7), vacancy("B2", 8)],
+                                                             coaches=["B1", "B2"]))
+    before = history.coach_vacancy_counts("12627")
+    history.append("12627", "2025-12-16", "SBC", ScanResult([vacancy("B1", 3)], coaches=["B1", "B2"], skipped=["B2"]))
+
+    after = history.coach_vacancy_counts("12627")
+    assert before == {"B1": 1.0, "B2": 2.0}
+    assert after == {"B1": 1.0, "B2": 2.0}
+    assert ["B2"] in list(history.scans("12627")["skipped"])
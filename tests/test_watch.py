@@ -0,0 +1,105 @@
+import sys
+import os
+import json
+import time
+import threading
+import pytest
+
+# Add parent directory to path to import watch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scraper
+from scraper import ScanResult, ScanCancelled
+from watch import ChartWatcher, vacancy_diff
+
+def coach_payload(berths):
+    """coachComposition body with the given berth numbers vacant from A to B"""
+    return json.dumps({"bdd": [
+        {"berthNo": n, "berthCode": "LB", "bsd": [{"from": "A", "to": "B", "occupancy": False}]} for n in berths
+    ]}).encode()
+
+class FakeButton:
+    def __init__(self, name):
+        self.name = name
+
+    def inner_text(self):
+        return self.name
+
+class FakePage:
+    def wait_for_timeout(self, ms):
+        pass
+
+class FakeChart:
+    """Stands in for the charts site: scan() follows scan_vacancies' coach_cache contract"""
+    def __init__(self, monkeypatch, coaches):
+        self.coaches = coaches
+        self.parsed = []
+        monkeypatch.setattr(scraper, "_fetch_coach", lambda page, btn, name, **kw: (coach_payload(self.coaches[name]), False))
+        real_parse = scraper.parse_coach_composition
+        def parse(name, data):
+            self.parsed.append(name)
+            return real_parse(name, data)
+        monkeypatch.setattr(scraper, "parse_coach_composition", parse)
+
+    def scan(self, train_no, journey_date, boarding, headless=True, previous=None, coach_cache=None, cancel=None):
+        buttons = [FakeButton(name) for name in self.coaches]
+        vacancies, names, missing, _ = scraper._scan_coaches(FakePage(), buttons, {}, time.monotonic(), coach_cache=coach_cache)
+        return ScanResult(vacancies, coaches=names, missing=missing)
+
+def test_vacancy_diff():
+    """Test diff reports added and removed vacancies, optionally for some coaches only"""
+    before = [{"Coach": "B1", "Berth": 1, "Type": "LB", "From": "A", "To": "B"},
+              {"Coach": "B2", "Berth": 2, "Type": "UB", "From": "A", "To": "B"}]
+    after = [{"Coach": "B1", "Berth": 3, "Type": "LB", "From": "A", "To": "B"},
+             {"Coach": "B2", "Berth": 2, "Type": "UB", "From": "A", "To": "B"}]
+    added, removed = vacancy_diff(before, after)
+    assert [v["Berth"] for v in added] == [3]
+    assert [v["Berth"] for v in removed] == [1]
+    assert vacancy_diff(before, after, coaches=["B2"]) == ([], [])
+
+def test_watcher_reparses_only_changed_coaches(monkeypatch):
+    """Test polls skip parsing unchanged coaches and emit only the changed berths"""
+    chart = FakeChart(monkeypatch, {"B1": [1, 2], "B2": [5], "B3": []})
+    watcher = ChartWatcher("12627", "2025-12-15", "A", scan=chart.scan)
+
+    assert watcher.poll() is None  # baseline
+    assert chart.parsed == ["B1", "B2", "B3"]
+
+    chart.parsed.clear()
+    assert watcher.poll() is None
+    assert chart.parsed == []
+
+    chart.coaches["B2"] = [5, 6]
+    chart.coaches["B1"] = [2]
+    diff = watcher.poll()
+    assert chart.parsed == ["B1", "B2"]
+    assert diff["changed_coaches"] == ["B1", "B2"]
+    assert [(v["Coach"], v["Berth"]) for v in diff["added"]] == [("B2", 6)]
+    assert [(v["Coach"], v["Berth"]) for v in diff["removed"]] == [("B1", 1)]
+    assert len(watcher.latest) == 3
+
+def test_stop_cancels_the_poll_in_progress():
+    """Test stop() ends a running poll through its cancel event, without recording an error"""
+    scanning = threading.Event()
+    def scan(train_no, journey_date, boarding, cancel=None, **kwargs):
+        scanning.set()
+        if cancel.wait(5):
+            raise ScanCancelled()
+        return ScanResult([])
+
+    watcher = ChartWatcher("12627", "2025-12-15", "A", scan=scan).start()
+    assert scanning.wait(5)
+    started = time.monotonic()
+    watcher.stop()
+    watcher._thread.join(5)
+    assert time.monotonic() - started < 1
+    assert not watcher.running
+    assert watcher.error is None
+
+def test_watcher_stops_when_its_session_ends():
+    """Test the watcher polls only while alive() holds"""
+    sessions = iter([True, True, False])
+    watcher = ChartWatcher("12627", "2025-12-15", "A", interval=0, alive=lambda: next(sessions),
+                           scan=lambda *args, **kwargs: ScanResult([]))
+    watcher.run()
+    assert watcher.polls == 2
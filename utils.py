@@ -1,9 +1,15 @@
-from fpdf import FPDF
+import threading
+from collections import OrderedDict
+
+from route_index import get_route_index
 
 def generate_ticket_pdf(chain, train_no, date, start_stn, end_stn):
     """
     Generates a PDF 'Hacker Ticket' for the journey.
     """
+    # fpdf is only needed once a ticket is actually downloaded
+    from fpdf import FPDF
+
     class PDF(FPDF):
         def header(self):
             self.set_fill_color(46, 125, 50) # Green
@@ -63,102 +69,243 @@ def generate_ticket_pdf(chain, train_no, date, start_stn, end_stn):
 
     return pdf.output(dest='S').encode('latin-1')
 
-def render_route_map(station_list, start_code, end_code):
-    """
-    Renders a visual map of the full route segment.
-    """
-    # Filter stations between start and end
-    try:
-        start_idx = next(i for i, s in enumerate(station_list) if s['code'] == start_code)
-        end_idx = next(i for i, s in enumerate(station_list) if s['code'] == end_code)
-        segment = station_list[start_idx : end_idx+1]
-    except StopIteration:
-        return ""
+# --- Precompiled HTML fragments ---
+# Filled with str.format; kept byte-for-byte identical to the original inline markup.
 
-    html = f"""
+_ROUTE_MAP_HEADER = """
 <div style="font-family: 'Segoe UI', sans-serif; background: white; padding: 15px; border-radius: 8px; border: 1px solid #e0e0e0; margin-bottom: 20px;">
-    <div style="font-size: 12px; color: #666; margin-bottom: 15px;">Showing {len(segment)} stations from <b>{start_code}</b> to <b>{end_code}</b></div>
+    <div style="font-size: 12px; color: #666; margin-bottom: 15px;">Showing {count} stations from <b>{start_code}</b> to <b>{end_code}</b></div>
     <div style="display: flex; overflow-x: auto; padding-bottom: 15px; align-items: flex-start;">
-"""
-    
-    for i, stn in enumerate(segment):
-        is_start = i == 0
-        is_end = i == len(segment) - 1
-        is_active = is_start or is_end
-        
-        dot_color = "#2E7D32" if is_active else "#bdbdbd"
-        dot_size = "14px" if is_active else "10px"
-        font_weight = "bold" if is_active else "normal"
-        text_color = "#000" if is_active else "#555"
-        
-        # Line colors
-        line_left = "transparent" if is_start else "#e0e0e0"
-        line_right = "transparent" if is_end else "#e0e0e0"
-        
-        # Format name
-        name_display = stn['name'].title() if stn['name'] else ""
-        if name_display.upper() == stn['code']: name_display = "" # Hide if same
-        
-        html += f"""
+""".format
+
+_ROUTE_MAP_STATION = """
 <div style="display: flex; flex-direction: column; align-items: center; min-width: 100px; position: relative;">
     <div style="display: flex; align-items: center; width: 100%; height: 20px; margin-bottom: 8px;">
         <div style="height: 2px; background: {line_left}; width: 50%;"></div>
         <div style="width: {dot_size}; height: {dot_size}; background: {dot_color}; border-radius: 50%; flex-shrink: 0; z-index: 1;"></div>
         <div style="height: 2px; background: {line_right}; width: 50%;"></div>
     </div>
-    <span style="font-weight: {font_weight}; color: {text_color}; font-size: 13px;">{stn['code']}</span>
-    <span style="font-size: 11px; color: #666; text-align: center; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; max-width: 90px;" title="{name_display}">{name_display}</span>
-    <span style="font-size: 10px; color: #999; margin-top: 2px;">{stn['dist']} km</span>
+    <span style="font-weight: {font_weight}; color: {text_color}; font-size: 13px;">{code}</span>
+    <span style="font-size: 11px; color: #666; text-align: center; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; max-width: 90px;" title="{name}">{name}</span>
+    <span style="font-size: 10px; color: #999; margin-top: 2px;">{dist} km</span>
 </div>
-"""
-            
-    html += """
+""".format
+
+_ROUTE_MAP_FOOTER = """
     </div>
 </div>
 """
+
+_TIMELINE_HEADER = '<div style="display: flex; align-items: center; overflow-x: auto; padding: 20px 0; font-family: sans-serif;">'
+
+_TIMELINE_STOPS = '<div title="Stops: {names}" style="font-size: 10px; color: #eee; margin-top: 2px; cursor: help; border-top: 1px dashed rgba(255,255,255,0.5); padding-top: 2px;">{count} stops ℹ️</div>'.format
+
+_TIMELINE_LEG = '<div style="flex: 1; min-width: 140px; text-align: center; position: relative;"><div style="background: {color}; color: white; padding: 10px; border-radius: 8px; margin: 0 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);"><div style="font-weight: bold; font-size: 16px;">{coach} - {berth}</div><div style="font-size: 12px; opacity: 0.9;">{type}</div><div style="font-size: 11px; margin-top: 4px;">{frm} &#8594; {to}</div>{stops}</div>{swap}</div>'.format
+
+_TIMELINE_SWAP = '<div style="position: absolute; right: -12px; top: 50%; transform: translateY(-50%); z-index: 1; background: white; border: 1px solid #ccc; border-radius: 50%; width: 24px; height: 24px; display: flex; align-items: center; justify-content: center; font-size: 12px;">&#127939;</div>'
+
+_TIMELINE_WARN_TYPES = frozenset(['MB', 'UB', 'SM', 'SU', 'M', 'U'])
+
+_PROFILE_HEADER = """
+<div style="font-family: 'Segoe UI', sans-serif; background: white; padding: 15px; border-radius: 8px; border: 1px solid #e0e0e0; margin-bottom: 20px;">
+    <div style="font-size: 12px; color: #666; margin-bottom: 15px;">Free berths on each stretch of the route, <b>{start_code}</b> to <b>{end_code}</b> highlighted. Most free: <b>{peak}</b> after <b>{peak_code}</b></div>
+    <div style="display: flex; overflow-x: auto; padding-bottom: 15px; align-items: flex-end;">
+""".format
+
+_PROFILE_SEGMENT = """
+<div title="{frm} &#8594; {to}: {breakdown}" style="display: flex; flex-direction: column; align-items: center; min-width: 60px; cursor: help;">
+    <span style="font-size: 11px; color: #333;">{count}</span>
+    <div style="width: 24px; height: {height}px; background: {color}; border-radius: 3px 3px 0 0;"></div>
+    <span style="font-weight: {font_weight}; font-size: 11px; color: #555; margin-top: 4px;">{frm}</span>
+</div>
+""".format
+
+_PROFILE_BAR_HEIGHT = 80
+
+# --- Render memo ---
+# Keyed by id(RouteIndex). Routes come from the shared STORE with their index, and
+# each cache entry holds a strong reference to that index, so an id cannot be reused
+# for a different route while it is cached. Station lists are looked up through
+# route_index's cache, which also keeps what is derived from each route.
+
+_RENDER_CACHE_SIZE = 256
+_PROFILE_CACHE_SIZE = 32
+# Rendered journeys kept per cached profile
+_PROFILE_JOURNEYS_SIZE = 16
+# Keyed by id(vacancies) of a stored scan; entries hold the scan and route they came from
+_profiles = OrderedDict()
+_render_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _station_fragment(code, name, dist, is_start, is_end):
+    is_active = is_start or is_end
+    name_display = name.title() if name else ""
+    if name_display.upper() == code: name_display = "" # Hide if same
+    return _ROUTE_MAP_STATION(
+        line_left="transparent" if is_start else "#e0e0e0",
+        line_right="transparent" if is_end else "#e0e0e0",
+        dot_color="#2E7D32" if is_active else "#bdbdbd",
+        dot_size="14px" if is_active else "10px",
+        font_weight="bold" if is_active else "normal",
+        text_color="#000" if is_active else "#555",
+        code=code,
+        name=name_display,
+        dist=dist
+    )
+
+def _route_fragments(route):
+    """
+    Each station's pre-rendered (inactive) route-map fragment, built once per route.
+    """
+    return route.derived(
+        "route_map_fragments",
+        lambda r: [_station_fragment(code, name, dist, False, False) for code, name, dist in zip(r.codes, r.names, r.dists)]
+    )
+
+def _memoized(key, route, build):
+    with _cache_lock:
+        cached = _render_cache.get(key)
+        if cached is not None and cached[0] is route:
+            _render_cache.move_to_end(key)
+            return cached[1]
+    html = build()
+    with _cache_lock:
+        _render_cache[key] = (route, html)
+        while len(_render_cache) > _RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
     return html
 
-def render_visual_timeline(chain, station_list):
+def render_route_map(route, start, end):
+    """
+    Renders a visual map of the full route segment. route is the RouteIndex stored with
+    the route (or a station list, see get_route_index); start and end are station codes
+    or route positions (see RouteIndex.journey).
+    Memoized per (route, start, end); routes are treated as immutable.
+    """
+    route = get_route_index(route)
+    return _memoized(("route_map", id(route), start, end), route, lambda: _build_route_map(route, start, end))
+
+def _build_route_map(route, start, end):
+    # On a loop route a destination code is its next stop after boarding
+    journey = route.journey(start, end)
+    if journey is None:
+        return ""
+    start_idx, end_idx = journey
+
+    parts = [_ROUTE_MAP_HEADER(
+        count=max(0, end_idx - start_idx + 1), start_code=route.codes[start_idx], end_code=route.codes[end_idx]
+    )]
+    stop = lambda i, is_start, is_end: _station_fragment(route.codes[i], route.names[i], route.dists[i], is_start, is_end)
+    if start_idx == end_idx:
+        parts.append(stop(start_idx, True, True))
+    elif start_idx < end_idx:
+        parts.append(stop(start_idx, True, False))
+        parts.extend(_route_fragments(route)[start_idx + 1 : end_idx])
+        parts.append(stop(end_idx, False, True))
+    parts.append(_ROUTE_MAP_FOOTER)
+    return "".join(parts)
+
+def render_visual_timeline(chain, route):
     """
     Returns HTML for a horizontal visual timeline of the journey.
     Includes intermediate stations.
+    Memoized per (route, chain signature); routes are treated as immutable.
     """
-    total_legs = len(chain)
-    
-    # Helper to find station index
-    stn_indices = {s['code']: i for i, s in enumerate(station_list)}
-    
-    # Start of HTML string (Single line)
-    html = '<div style="display: flex; align-items: center; overflow-x: auto; padding: 20px 0; font-family: sans-serif;">'
-    
-    for i, leg in enumerate(chain):
+    route = get_route_index(route)
+    chain_sig = tuple((leg['Coach'], leg['Berth'], leg['Type'], leg['From'], leg['To']) for leg in chain)
+    return _memoized(("timeline", id(route), chain_sig), route, lambda: _build_visual_timeline(chain_sig, route))
+
+def _build_visual_timeline(chain_sig, route):
+    total_legs = len(chain_sig)
+
+    parts = [_TIMELINE_HEADER]
+    for i, (coach, berth, berth_type, frm, to) in enumerate(chain_sig):
         # Color code based on berth type
-        color = "#4CAF50" # Green (Default/LB)
-        if leg['Type'] in ['MB', 'UB', 'SM', 'SU', 'M', 'U']:
-            color = "#FFC107" # Yellow (Warning)
-            
-        # Calculate intermediates
-        try:
-            s_idx = stn_indices.get(leg['From'])
-            e_idx = stn_indices.get(leg['To'])
-            intermediates = []
-            if s_idx is not None and e_idx is not None and e_idx > s_idx + 1:
-                # Get stations between start and end
-                intermediates = [s['code'] for s in station_list[s_idx+1 : e_idx]]
-        except Exception:
-            intermediates = []
-            
-        int_text = ""
-        if intermediates:
-            count = len(intermediates)
-            names = ", ".join(intermediates)
-            # Use a simple, robust title tooltip. 
-            # Streamlit strips some interactive JS/CSS, so standard title is safest.
-            int_text = f'<div title="Stops: {names}" style="font-size: 10px; color: #eee; margin-top: 2px; cursor: help; border-top: 1px dashed rgba(255,255,255,0.5); padding-top: 2px;">{count} stops ℹ️</div>'
-        
-        # Build leg HTML (Minified)
-        leg_html = f"""<div style="flex: 1; min-width: 140px; text-align: center; position: relative;"><div style="background: {color}; color: white; padding: 10px; border-radius: 8px; margin: 0 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);"><div style="font-weight: bold; font-size: 16px;">{leg['Coach']} - {leg['Berth']}</div><div style="font-size: 12px; opacity: 0.9;">{leg['Type']}</div><div style="font-size: 11px; margin-top: 4px;">{leg['From']} &#8594; {leg['To']}</div>{int_text}</div>{f'<div style="position: absolute; right: -12px; top: 50%; transform: translateY(-50%); z-index: 1; background: white; border: 1px solid #ccc; border-radius: 50%; width: 24px; height: 24px; display: flex; align-items: center; justify-content: center; font-size: 12px;">&#127939;</div>' if i < total_legs-1 else ''}</div>"""
-        html += leg_html
-    
-    html += '</div>'
+        color = "#FFC107" if berth_type in _TIMELINE_WARN_TYPES else "#4CAF50"
+
+        # Intermediate stations between boarding and alighting
+        stretch = route.segment(frm, to)
+        stops = ""
+        if stretch is not None and stretch[1] > stretch[0] + 1:
+            intermediates = route.codes[stretch[0] + 1 : stretch[1]]
+            # Streamlit strips some interactive JS/CSS, so a plain title tooltip is safest
+            stops = _TIMELINE_STOPS(names=", ".join(intermediates), count=len(intermediates))
+
+        parts.append(_TIMELINE_LEG(
+            color=color, coach=coach, berth=berth, type=berth_type, frm=frm, to=to,
+            stops=stops, swap=_TIMELINE_SWAP if i < total_legs - 1 else ''
+        ))
+
+    parts.append('</div>')
+    return "".join(parts)
+
+def _availability(vacancies, route):
+    """
+    The scan's availability profile and its rendered segments, computed once per
+    (scan, route) pair; vacancies is treated as immutable, like the route.
+    """
+    key = id(vacancies)
+    with _cache_lock:
+        cached = _profiles.get(key)
+        if cached is not None and cached[0] is vacancies and cached[1] is route:
+            _profiles.move_to_end(key)
+            return cached[2]
+
+    # solver is only needed once there are results to show
+    from solver import availability_profile
+    entry = {"profile": availability_profile(vacancies, route), "html": OrderedDict()}
+    with _cache_lock:
+        _profiles[key] = (vacancies, route, entry)
+        while len(_profiles) > _PROFILE_CACHE_SIZE:
+            _profiles.popitem(last=False)
+    return entry
+
+def render_availability_profile(vacancies, route, start, end):
+    """
+    Renders free berths per route segment as a bar chart, with the journey's segments
+    (start and end as codes or route positions) highlighted and a per-class breakdown on
+    hover. Cached per (scan, route, journey), so reruns of the results page cost a
+    dictionary lookup.
+    """
+    route = get_route_index(route)
+    entry = _availability(vacancies, route)
+    journeys = entry["html"]
+    key = (start, end)
+    with _cache_lock:
+        html = journeys.get(key)
+        if html is not None:
+            journeys.move_to_end(key)
+            return html
+    html = _build_availability_profile(entry["profile"], route, start, end)
+    with _cache_lock:
+        journeys[key] = html
+        while len(journeys) > _PROFILE_JOURNEYS_SIZE:
+            journeys.popitem(last=False)
     return html
+
+def _build_availability_profile(profile, route, start, end):
+    total = profile["total"]
+    if not total or not any(total):
+        return ""
+    journey = route.journey(start, end)
+    if journey is None or journey[0] >= journey[1]:
+        journey = (0, len(total))
+    start_idx, end_idx = journey
+    codes = profile["codes"]
+    peak_idx = max(range(len(total)), key=lambda i: total[i])
+    peak = total[peak_idx]
+
+    parts = [_PROFILE_HEADER(
+        start_code=codes[start_idx], end_code=codes[end_idx], peak=peak, peak_code=codes[peak_idx]
+    )]
+    for i, count in enumerate(total):
+        in_journey = start_idx <= i < end_idx
+        breakdown = ", ".join(f"{cls}: {profile['counts'][cls][i]}" for cls in profile["classes"] if profile["counts"][cls][i])
+        parts.append(_PROFILE_SEGMENT(
+            frm=codes[i], to=codes[i + 1], breakdown=breakdown or "none", count=count,
+            height=max(round(count / peak * _PROFILE_BAR_HEIGHT), 2 if count else 0),
+            color="#2E7D32" if in_journey else "#bdbdbd",
+            font_weight="bold" if in_journey else "normal"
+        ))
+    parts.append(_ROUTE_MAP_FOOTER)
+    return "".join(parts)
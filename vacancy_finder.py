@@ -1,311 +1,261 @@
-import asyncio
-import pandas as pd
-from playwright.sync_api import sync_playwright, TimeoutError
+"""
+Batch vacancy scanner for nightly sweeps.
+
+Reads (train, date, boarding) jobs from a file, scans them across a pool of worker
+processes, each with a bounded number of browsers, and appends one JSON line per
+finished job to the output file as it completes. Rerunning with the same output
+resumes: jobs already recorded as "ok" are skipped, and partial ones are rescanned
+with their earlier vacancies as the fallback for coaches that fail again.
+
+Jobs file: one job per line, "train,date,boarding" (CSV, '#' comments allowed) or
+JSON objects with train_no / journey_date / boarding keys. The date and boarding
+columns may be left out: rows without a date are expanded over --dates, and rows
+without a boarding station start from the train's first station.
+
+    python vacancy_finder.py jobs.csv --out sweep.jsonl --workers 2 --browsers 2
+"""
+import os
+import sys
+import csv
+import json
 import time
+import queue
 import logging
-import json
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, 
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("last_run.log", mode='w'),
-        logging.StreamHandler()
-    ]
-)
+import argparse
+import datetime
+import threading
+import multiprocessing
 
-def main():
-    TRAIN_NO = "12627"  # Example Train Number
-    JOURNEY_DATE = "2025-12-15" # Example Date (YYYY-MM-DD) - Adjust as needed for valid dates
-    
-    # Extract day for UI selection
-    journey_day = str(int(JOURNEY_DATE.split("-")[2])) # e.g., "15" from "2025-12-15"
-    
-    # Note: JOURNEY_DATE needs to be a valid running date for the train. 
-    # The script attempts to select this date.
+STATUS_OK = "ok"
+STATUS_PARTIAL = "partial"
+STATUS_ERROR = "error"
 
-    with sync_playwright() as p:
-        logging.info("Launching browser...")
-        browser = p.chromium.launch(headless=False) # Headless=False for debugging/visuals
-        context = browser.new_context()
-        page = context.new_page()
+def job_key(job):
+    return (job["train_no"], job["journey_date"], job.get("boarding") or "")
 
-        try:
-            logging.info("Navigating to IRCTC Online Charts...")
-            page.goto("https://www.irctc.co.in/online-charts/", timeout=60000)
-            page.wait_for_load_state("domcontentloaded")
-            page.wait_for_timeout(2000) # Extra wait for dynamic elements
+def read_jobs(path, dates=()):
+    """
+    Parses a jobs file into job dicts (train_no, journey_date, boarding or None),
+    in file order and without duplicates.
+    """
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                obj = json.loads(line)
+                row = [obj.get("train_no", ""), obj.get("journey_date", ""), obj.get("boarding", "")]
+            else:
+                row = next(csv.reader([line]))
+            row = [str(cell).strip() for cell in row] + ["", ""]
+            if row[0].lower() in ("train", "train_no"):
+                continue  # header
+            if not row[0]:
+                raise ValueError(f"{path}:{line_no}: missing train number")
+            rows.append((line_no, row[0], row[1], row[2] or None))
 
-            # --- Phase 1: Fetch Dynamic Schedule ---
-            logging.info(f"Inputting Train Number: {TRAIN_NO}")
-            
-            # Robust Strategy: Click the label to focus the input, then type.
-            try:
-                page.locator("label").filter(has_text="Train Name/Number").first.click()
-            except Exception as e:
-                logging.warning(f"Label click failed: {e}. Trying generic input click.")
-                page.locator("input[aria-autocomplete='list']").first.click()
-            
-            page.wait_for_timeout(500)
-            
-            # Type the train number
-            page.keyboard.type(TRAIN_NO, delay=100)
-            page.wait_for_timeout(2000) # Wait for dropdown options
-            
-            # Select the first option (The train itself)
-            page.keyboard.press("ArrowDown")
-            page.wait_for_timeout(500)
-            page.keyboard.press("Enter")
-            
-            logging.info("Train selected. Waiting for Boarding Station to load...")
-            page.wait_for_timeout(3000) # Increased wait
-            
-            # --- Select Boarding Station ---
-            logging.info("Selecting Boarding Station (First Option)...")
+    jobs = []
+    seen = set()
+    for line_no, train_no, journey_date, boarding in rows:
+        row_dates = [journey_date] if journey_date else list(dates)
+        if not row_dates:
+            raise ValueError(f"{path}:{line_no}: no date given and --dates not set")
+        for d in row_dates:
             try:
-                page.locator("label").filter(has_text="Boarding Station").first.click()
-            except:
-                page.locator("input[aria-autocomplete='list']").nth(1).click()
-                
-            page.wait_for_timeout(1000)
-            page.keyboard.press("Space")
-            page.wait_for_timeout(1000)
-            page.keyboard.press("ArrowDown")
-            page.wait_for_timeout(500)
-            page.keyboard.press("Enter")
-            
-            logging.info("Boarding Station selected.")
-            page.wait_for_timeout(1000) # Wait after selection
-            
-            # --- Get Distances ---
-            logging.info("Fetching Schedule...")
-            # The Schedule button appears after train selection
-            # It might take a while or might not appear if data is cached/different.
-            # We'll try to find it, but if it fails, we shouldn't crash the whole script if we can proceed.
-            # However, we need station map for distance calc.
-            
-            station_map = {}
+                datetime.date.fromisoformat(d)
+            except ValueError:
+                raise ValueError(f"{path}:{line_no}: invalid date {d!r}, expected YYYY-MM-DD")
+            job = {"train_no": train_no, "journey_date": d, "boarding": boarding}
+            if job_key(job) not in seen:
+                seen.add(job_key(job))
+                jobs.append(job)
+    return jobs
+
+def read_results(path):
+    """
+    Latest result per job key from an earlier (possibly interrupted) run.
+    A torn last line from a crash is ignored.
+    """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, encoding="utf-8") as f:
+        for line in f:
             try:
-                schedule_btn = page.locator("button:has-text('Schedule')").first
-                if schedule_btn.is_visible(timeout=5000):
-                    schedule_btn.click()
-                    
-                    # Wait for modal/table
-                    page.wait_for_selector("table", state="visible", timeout=10000)
-                    
-                    logging.info("Scraping Station Distances...")
-                    rows = page.locator("table tr").all()
-                    
-                    for row in rows[1:]: # Skip header row
-                        cells = row.locator("td").all()
-                        if len(cells) >= 4: # Station No, Code, Name, Distance
-                            try:
-                                name_text = cells[2].inner_text().strip() # 3rd col is name
-                                dist_text = cells[3].inner_text().strip() # 4th col is distance
-                                dist_val = int(''.join(filter(str.isdigit, dist_text)))
-                                station_map[name_text] = dist_val
-                            except Exception as e:
-                                logging.warning(f"Error parsing row: {e}")
-                                continue
+                record = json.loads(line)
+                results[job_key(record)] = record
+            except (ValueError, KeyError):
+                continue
+    return results
 
-                    logging.info(f"Loaded {len(station_map)} stations.")
-                    
-                    # Close modal
-                    page.keyboard.press("Escape")
-                    page.wait_for_timeout(500)
-                else:
-                    logging.warning("Schedule button not visible. Skipping distance calculation.")
-            except Exception as e:
-                 logging.warning(f"Error fetching schedule: {e}. Proceeding without distance data.")
+def pending_jobs(jobs, previous_results):
+    """
+    Jobs still to run, each paired with the vacancies of its last partial result (or None).
+    """
+    pending = []
+    for job in jobs:
+        record = previous_results.get(job_key(job))
+        if record and record.get("status") == STATUS_OK:
+            continue
+        previous = record.get("vacancies") if record and record.get("status") == STATUS_PARTIAL else None
+        pending.append((job, previous))
+    return pending
 
-            # --- Phase 2: Access Charts ---
-            logging.info("Selecting Date...")
-            
-            # Strategy 1: UI Interaction
-            try:
-                # Click the input to open calendar
-                date_input = page.locator("input.jss466").first
-                if not date_input.is_visible():
-                     date_input = page.locator("input[placeholder*='Date']").first
-                
-                date_input.click()
-                page.wait_for_timeout(1000) # Wait for animation
-                
-                # Try to find the day
-                # Common MUI selectors: button with text "15", or div/span with text "15" inside a button
-                day_locator = page.locator("button").filter(has_text=journey_day).first
-                if day_locator.is_visible():
-                    day_locator.click()
-                    logging.info(f"Clicked day '{journey_day}' via button.")
-                else:
-                    # Try generic text click if button not found
-                    page.locator(f"text='{journey_day}'").last.click()
-                    logging.info(f"Clicked day '{journey_day}' via text.")
-                    
-            except Exception as e:
-                logging.warning(f"UI Date selection failed: {e}. Trying JS fallback.")
-            
-            page.wait_for_timeout(500)
-            
-            # Strategy 2: Verify and Force if needed
-            # Check if value is correct (simple check)
-            current_val = date_input.input_value()
-            if journey_day not in current_val:
-                logging.info("Date not updated via UI. Forcing via JS...")
-                try:
-                    # Remove readonly attribute
-                    page.evaluate("document.querySelector('input.jss466').removeAttribute('readonly')")
-                    page.wait_for_timeout(200)
-                    date_input.fill(JOURNEY_DATE)
-                    page.keyboard.press("Enter")
-                    logging.info("Forced date via JS fill.")
-                except Exception as e2:
-                    logging.error(f"JS Force failed: {e2}")
+def scan_job(job, previous=None, headless=True):
+    """
+    Runs one job in this process and returns its result record.
+    """
+    from scraper import scan_vacancies, get_route_and_vacancies
 
-            logging.info("Submitting...")
-            # Force click to bypass any potential overlays
-            get_chart_btn = page.locator("button:has-text('Get Train Chart')")
-            get_chart_btn.click(force=True)
-            
-            # Wait for charts page
-            # The URL might be .../vacant-berth or .../traincomposition
-            page.wait_for_url(lambda url: "vacant-berth" in url or "traincomposition" in url, timeout=45000) 
-            
-            # --- Phase 3: Find the Vacancy ---
-            logging.info("Scanning for Vacancies...")
-            
-            # Hardcoded fallback station map for 12627 (Karnataka Express)
-            # Distances are approximate km from SBC
-            fallback_station_map = {
-                "SBC": 0, "BNC": 4, "BNCE": 7, "KJM": 14, "YNK": 18, 
-                "DBU": 45, "GBD": 65, "HUP": 106, "PKD": 154, "SSPN": 174,
-                "DMM": 186, "ATP": 219, "GY": 276, "GTL": 287, "AD": 342,
-                "RC": 409, "YG": 478, "WADI": 516, "KLBG": 553, "SUR": 666,
-                "KWV": 779, "DD": 853, "ANG": 937, "BAP": 1004, "KPG": 1049,
-                "MMR": 1091, "JL": 1251, "BSL": 1275, "BAU": 1344, "KNW": 1399,
-                "ET": 1582, "BPL": 1674, "BINA": 1812, "VGLJ": 1965, "GWL": 2062,
-                "AGC": 2180, "MTJ": 2234, "NZM": 2368, "NDLS": 2375
-            }
-            
-            if not station_map:
-                logging.info("Using fallback station map for distance calculations.")
-                station_map = fallback_station_map
+    record = dict(job)
+    started = time.perf_counter()
+    try:
+        if job.get("boarding"):
+            result = scan_vacancies(job["train_no"], job["journey_date"], job["boarding"],
+                                    headless=headless, previous=previous)
+        else:
+            stations, result = get_route_and_vacancies(job["train_no"], job["journey_date"],
+                                                       headless=headless, previous=previous)
+            record["stations"] = stations
+        if not result.coaches:
+            record["status"] = STATUS_ERROR
+            record["error"] = "no coaches found on the chart"
+        else:
+            record["status"] = STATUS_OK if result.complete else STATUS_PARTIAL
+        record["coaches"] = result.coaches
+        record["missing"] = result.missing
+        record["stale"] = result.stale
+        record["vacancies"] = list(result)
+    except Exception as e:
+        record["status"] = STATUS_ERROR
+        record["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+    record["elapsed_s"] = round(time.perf_counter() - started, 2)
+    record["finished_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    return record
 
-            # Wait for page to settle
-            try:
-                page.wait_for_load_state("networkidle", timeout=10000)
-            except Exception as e:
-                logging.warning(f"Wait for load state failed: {e}")
-            
-            # Inspect all buttons to find coaches
-            logging.info("Inspecting all buttons to find coaches...")
-            all_buttons = page.locator("button").all()
-            coach_buttons = []
-            
-            for i, btn in enumerate(all_buttons):
-                try:
-                    txt = btn.inner_text()
-                    if len(txt) < 5 and any(c.isdigit() for c in txt):
-                        coach_buttons.append(btn)
-                except Exception as e:
-                    logging.warning(f"Error filtering button: {e}")
-                    continue
-            
-            logging.info(f"Found {len(coach_buttons)} coach buttons.")
-            
-            all_vacancies = []
-            
-            
-            for btn in coach_buttons:
-                coach_name = btn.inner_text()
-                logging.info(f"Checking Coach {coach_name}...")
-                
+def _worker(jobs, results, browsers, headless):
+    """
+    Worker process: `browsers` threads share one browser pool of that size and pull
+    jobs until they get the stop sentinel (None).
+    """
+    os.environ["BROWSER_POOL_SIZE"] = str(browsers)
+
+    def loop():
+        while True:
+            item = jobs.get()
+            if item is None:
+                return
+            job, previous = item
+            results.put(scan_job(job, previous, headless))
+
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(browsers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def _append(out, record):
+    out.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+    out.flush()
+    os.fsync(out.fileno())
+
+def run_batch(pending, out_path, workers=2, browsers=1, headless=True, on_result=None):
+    """
+    Scans pending (job, previous) pairs across `workers` processes and appends each
+    result to out_path as it arrives. Returns the number of jobs that got no result
+    because their worker died; rerunning picks them up.
+    """
+    # spawn: workers start clean instead of inheriting the parent's threads and locks
+    ctx = multiprocessing.get_context("spawn")
+    jobs = ctx.Queue()
+    results = ctx.Queue()
+    for item in pending:
+        jobs.put(item)
+    for _ in range(workers * browsers):
+        jobs.put(None)
+
+    procs = [ctx.Process(target=_worker, args=(jobs, results, browsers, headless), daemon=True)
+             for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+
+    outstanding = len(pending)
+    # A torn line from an earlier crash must not swallow the first new record
+    needs_newline = os.path.exists(out_path) and os.path.getsize(out_path) > 0
+    if needs_newline:
+        with open(out_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    try:
+        with open(out_path, "a", encoding="utf-8") as out:
+            if needs_newline:
+                out.write("\n")
+            while outstanding:
                 try:
-                    # Intercept the API call
-                    with page.expect_response(lambda response: "coachComposition" in response.url and response.status == 200, timeout=10000) as response_info:
-                        btn.click()
-                    
-                    response = response_info.value
-                    data = response.json()
-                    
-                    # Parse vacancies from JSON
-                    if "bdd" in data:
-                        for seat in data["bdd"]:
-                            berth_no = seat.get("berthNo")
-                            berth_code = seat.get("berthCode")
-                            bsd = seat.get("bsd", [])
-                            
-                            current_vacancy = None
-                            
-                            for segment in bsd:
-                                is_occupied = segment.get("occupancy", True)
-                                from_stn = segment.get("from")
-                                to_stn = segment.get("to")
-                                
-                                if not is_occupied:
-                                    # Found a vacant segment
-                                    if current_vacancy and current_vacancy["To"] == from_stn:
-                                        # Extend current vacancy
-                                        current_vacancy["To"] = to_stn
-                                    else:
-                                        # Start new vacancy
-                                        if current_vacancy:
-                                            all_vacancies.append(current_vacancy)
-                                        
-                                        current_vacancy = {
-                                            "Coach": coach_name,
-                                            "Berth": berth_no,
-                                            "Type": berth_code,
-                                            "From": from_stn,
-                                            "To": to_stn,
-                                            "Distance": 0
-                                        }
-                                else:
-                                    # Segment is occupied, close current vacancy if any
-                                    if current_vacancy:
-                                        all_vacancies.append(current_vacancy)
-                                        current_vacancy = None
-                            
-                            # Append the last vacancy if exists
-                            if current_vacancy:
-                                all_vacancies.append(current_vacancy)
-                    
-                    page.wait_for_timeout(500) # Rate limiting
-                    
-                except Exception as e:
-                    logging.warning(f"Could not fetch/parse data for {coach_name}: {e}")
+                    record = results.get(timeout=5)
+                except queue.Empty:
+                    if not any(proc.is_alive() for proc in procs):
+                        break
                     continue
+                _append(out, record)
+                outstanding -= 1
+                if on_result:
+                    on_result(record)
+    finally:
+        for proc in procs:
+            proc.join(timeout=30 if not outstanding else 0)
+            if proc.is_alive():
+                proc.terminate()
+    return outstanding
 
-            # Calculate distances for all found vacancies
-            for vac in all_vacancies:
-                if vac["From"] in station_map and vac["To"] in station_map:
-                    vac["Distance"] = abs(station_map[vac["To"]] - station_map[vac["From"]])
-            
-            # Sort vacancies by distance (descending)
-            all_vacancies.sort(key=lambda x: x["Distance"], reverse=True)
+def main():
+    parser = argparse.ArgumentParser(description="Scan many (train, date, boarding) jobs and stream results as JSON Lines.")
+    parser.add_argument("jobs", help="Jobs file: train,date,boarding per line (CSV) or JSON objects")
+    parser.add_argument("--out", default="vacancies.jsonl", help="JSON Lines output; rerun with the same file to resume")
+    parser.add_argument("--dates", default="", help="Comma-separated YYYY-MM-DD dates for rows without one")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes")
+    parser.add_argument("--browsers", type=int, default=1, help="Browsers (and concurrent scans) per worker")
+    parser.add_argument("--headed", action="store_true", help="Show the browser windows (Developer Mode)")
+    parser.add_argument("--fresh", action="store_true", help="Ignore earlier results in --out and rescan everything")
+    args = parser.parse_args()
 
-            # --- Output ---
-            print("\n" + "="*30)
-            print(f"Scanning Train: {TRAIN_NO}")
-            print(f"Coaches Scanned: {len(coach_buttons)}")
-            print(f"Total Vacancies Found: {len(all_vacancies)}")
-            
-            if all_vacancies:
-                print("\nTop 5 Longest Vacant Segments:")
-                for i, vac in enumerate(all_vacancies[:5]):
-                    print(f"{i+1}. Coach {vac['Coach']}, Berth {vac['Berth']} ({vac['Type']})")
-                    print(f"   {vac['From']} -> {vac['To']} ({vac['Distance']} km)")
-            else:
-                print("No vacancies found.")
-            print("="*30 + "\n")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    dates = [d.strip() for d in args.dates.split(",") if d.strip()]
+    try:
+        jobs = read_jobs(args.jobs, dates)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Could not read jobs: {e}")
+
+    previous_results = {} if args.fresh else read_results(args.out)
+    pending = pending_jobs(jobs, previous_results)
+    logging.info(f"{len(jobs)} jobs, {len(jobs) - len(pending)} already done, {len(pending)} to scan "
+                 f"on {args.workers} workers x {args.browsers} browsers")
+    if not pending:
+        return
+
+    from scraper import ScanResult
+    from vacancy_history import get_vacancy_history
+    history = get_vacancy_history()
+
+    done = [0]
+    def report(record):
+        done[0] += 1
+        if history and record["status"] != STATUS_ERROR:
+            boarding = record.get("boarding") or record["stations"][0]["code"]
+            history.record(record["train_no"], record["journey_date"], boarding, ScanResult(
+                record["vacancies"], coaches=record["coaches"], missing=record["missing"], stale=record["stale"]
+            ))
+        logging.info(f"[{done[0]}/{len(pending)}] {record['train_no']} {record['journey_date']} "
+                     f"{record.get('boarding') or '-'}: {record['status']}, "
+                     f"{len(record.get('vacancies', []))} vacancies in {record['elapsed_s']}s")
 
-        except Exception as e:
-            logging.error(f"An error occurred: {e}", exc_info=True)
-            page.screenshot(path="error_screenshot.png")
-            logging.info("Screenshot saved as error_screenshot.png")
-        finally:
-            browser.close()
+    lost = run_batch(pending, args.out, workers=args.workers, browsers=args.browsers,
+                     headless=not args.headed, on_result=report)
+    if lost:
+        logging.error(f"{lost} jobs got no result (a worker died). Rerun the same command to resume.")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import threading
+import datetime
+
+from debug_sink import new_scan_id
+
+# Opt-in: every scan is appended here when VACANCY_HISTORY_DIR is set for the environment.
+VACANCY_HISTORY_DIR_ENV = "VACANCY_HISTORY_DIR"
+
+HISTORY_FILE_SUFFIX = ".arrow"
+
+_history = None
+_history_lock = threading.Lock()
+
+def _schema():
+    import pyarrow as pa
+
+    # Stations, coaches and berth types repeat on every row, so they are stored once per
+    # file as dictionaries and the rows hold small integer indices into them
+    return pa.schema([
+        ("scan_id", pa.dictionary(pa.int32(), pa.string())),
+        ("scanned_at", pa.timestamp("s", tz="UTC")),
+        ("boarding", pa.dictionary(pa.int8(), pa.string())),
+        ("coach", pa.dictionary(pa.int16(), pa.string())),
+        ("berth", pa.int16()),
+        ("berth_type", pa.dictionary(pa.int8(), pa.string())),
+        ("from_stn", pa.dictionary(pa.int16(), pa.string())),
+        ("to_stn", pa.dictionary(pa.int16(), pa.string()))
+    ])
+
+def _partition_dir(directory, train_no, journey_date):
+    return os.path.join(directory, f"train_no={train_no}", f"journey_date={journey_date}")
+
+class VacancyHistory:
+    """
+    Append-only history of scans as Arrow IPC files, partitioned by train and date:
+        <directory>/train_no=12627/journey_date=2025-12-15/<scan_id>.arrow
+    One file per scan, uncompressed so that reads can memory-map it. The scan's
+    coach list and its missing, stale and skipped coaches are kept in the file's schema metadata.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, train_no, journey_date, boarding_stn_code, vacancies, scanned_at=None, scan_id=None):
+        """
+        Writes one scan (raw vacancy dicts or a ScanResult) and returns its scan ID.
+        """
+        import pyarrow as pa
+
+        scan_id = scan_id or new_scan_id()
+        scanned_at = scanned_at or datetime.datetime.now(datetime.timezone.utc)
+        rows = len(vacancies)
+        schema = _schema().with_metadata({
+            "coaches": json.dumps(list(getattr(vacancies, "coaches", []))),
+            "missing": json.dumps(list(getattr(vacancies, "missing", []))),
+            "stale": json.dumps(list(getattr(vacancies, "stale", []))),
+            "skipped": json.dumps(list(getattr(vacancies, "skipped", [])))
+        })
+        table = pa.Table.from_pydict({
+            "scan_id": [scan_id] * rows,
+            "scanned_at": [scanned_at] * rows,
+            "boarding": [boarding_stn_code] * rows,
+            "coach": [v["Coach"] for v in vacancies],
+            "berth": [v["Berth"] for v in vacancies],
+            "berth_type": [v["Type"] for v in vacancies],
+            "from_stn": [v["From"] for v in vacancies],
+            "to_stn": [v["To"] for v in vacancies]
+        }, schema=schema)
+
+        partition = _partition_dir(self.directory, train_no, journey_date)
+        os.makedirs(partition, exist_ok=True)
+        path = os.path.join(partition, scan_id + HISTORY_FILE_SUFFIX)
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        return scan_id
+
+    def record(self, train_no, journey_date, boarding_stn_code, vacancies):
+        """
+        append() for callers that must not fail because of the history: errors are logged.
+        """
+        try:
+            return self.append(train_no, journey_date, boarding_stn_code, vacancies)
+        except Exception as e:
+            logging.warning(f"Could not record scan of {train_no} {journey_date} in vacancy history: {e}")
+            return None
+
+    def partitions(self, train_no=None, journey_dates=None):
+        """
+        (train_no, journey_date, path) of the partitions matching the filters, found by
+        listing directory names only. journey_dates: one date, a list, or an inclusive
+        (start, end) tuple of YYYY-MM-DD strings.
+        """
+        if isinstance(journey_dates, str):
+            journey_dates = [journey_dates]
+        if isinstance(journey_dates, tuple):
+            start, end = journey_dates
+            wanted_date = lambda d: start <= d <= end
+        elif journey_dates is not None:
+            dates = set(journey_dates)
+            wanted_date = lambda d: d in dates
+        else:
+            wanted_date = lambda d: True
+
+        if train_no is not None:
+            trains = [str(train_no)]
+        else:
+            trains = sorted(name.split("=", 1)[1] for name in os.listdir(self.directory) if name.startswith("train_no="))
+
+        found = []
+        for train in trains:
+            train_dir = os.path.join(self.directory, f"train_no={train}")
+            if not os.path.isdir(train_dir):
+                continue
+            for name in sorted(os.listdir(train_dir)):
+                if name.startswith("journey_date=") and wanted_date(name.split("=", 1)[1]):
+                    found.append((train, name.split("=", 1)[1], os.path.join(train_dir, name)))
+        return found
+
+    def read_table(self, train_no=None, journey_dates=None, boarding=None, columns=None, memory_map=True):
+        """
+        The matching scans as one Arrow table, with train_no and journey_date columns
+        added from the partition path. With memory_map, files are mapped rather than
+        read, so only the pages of the requested columns are ever loaded.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        tables = []
+        for train, date, path in self.partitions(train_no, journey_dates):
+            for name in sorted(os.listdir(path)):
+                if not name.endswith(HISTORY_FILE_SUFFIX):
+                    continue
+                file_path = os.path.join(path, name)
+                source = pa.memory_map(file_path) if memory_map else pa.OSFile(file_path)
+                table = pa.ipc.open_file(source).read_all()
+                if boarding is not None:
+                    table = table.filter(pc.equal(table["boarding"].cast(pa.string()), boarding))
+                if columns is not None:
+                    table = table.select([c for c in columns if c in table.column_names])
+                table = table.replace_schema_metadata(None)
+                tables.append(table
+                              .append_column("train_no", pa.array([train] * table.num_rows, pa.dictionary(pa.int16(), pa.string())))
+                              .append_column("journey_date", pa.array([date] * table.num_rows, pa.dictionary(pa.int16(), pa.string()))))
+        if not tables:
+            schema = _schema()
+            if columns is not None:
+                schema = pa.schema([f for f in schema if f.name in columns])
+            for name in ("train_no", "journey_date"):
+                schema = schema.append(pa.field(name, pa.dictionary(pa.int16(), pa.string())))
+            return schema.empty_table()
+        return pa.concat_tables(tables)
+
+    def scans(self, train_no=None, journey_dates=None):
+        """
+        pandas DataFrame with one row per recorded scan (including scans that found
+        nothing): train_no, journey_date, scan_id, rows, coaches, missing, stale, skipped.
+        Files are memory-mapped, so only their footers and batch headers are touched.
+        """
+        import pyarrow as pa
+        import pandas as pd
+
+        rows = []
+        for train, date, path in self.partitions(train_no, journey_dates):
+            for name in sorted(os.listdir(path)):
+                if not name.endswith(HISTORY_FILE_SUFFIX):
+                    continue
+                with pa.memory_map(os.path.join(path, name)) as source:
+                    reader = pa.ipc.open_file(source)
+                    metadata = reader.schema.metadata or {}
+                    rows.append({
+                        "train_no": train,
+                        "journey_date": date,
+                        "scan_id": name[:-len(HISTORY_FILE_SUFFIX)],
+                        "rows": sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches)),
+                        **{key: json.loads(metadata.get(key.encode(), b"[]")) for key in ("coaches", "missing", "stale", "skipped")}
+                    })
+        return pd.DataFrame(rows, columns=["train_no", "journey_date", "scan_id", "rows", "coaches", "missing", "stale", "skipped"])
+
+    def query(self, train_no=None, journey_dates=None, boarding=None, columns=None, memory_map=True):
+        """
+        pandas DataFrame of the matching scans, one row per vacant segment; station,
+        coach and berth type columns come back as categoricals.
+        """
+        return self.read_table(train_no, journey_dates, boarding, columns, memory_map).to_pandas()
+
+    def coach_vacancy_counts(self, train_no, boarding=None, last_scans=20):
+        """
+        Mean vacancies per coach over the train's last `last_scans` scans (any date) that
+        found vacancies, e.g. for solver.rank_coaches. Empty when there is no history.
+        A coach's mean only counts the scans that scanned it: a scan stopped at its goal
+        says nothing about the coaches it skipped.
+        """
+        df = self.query(train_no, boarding=boarding, columns=["scan_id", "scanned_at", "coach"])
+        if df.empty:
+            return {}
+        recent = [str(s) for s in df.groupby("scan_id", observed=True)["scanned_at"].max().nlargest(last_scans).index]
+        df = df[df["scan_id"].astype(str).isin(recent)]
+        scans = self.scans(train_no)
+        skipped = {row.scan_id: set(row.skipped) for row in scans[scans["scan_id"].isin(recent)].itertuples()}
+        counts = df.groupby("coach", observed=True).size()
+        result = {}
+        for coach, n in counts.items():
+            scanned = sum(1 for scan_id in recent if str(coach) not in skipped.get(scan_id, ()))
+            result[str(coach)] = float(n) / scanned
+        return result
+
+def get_vacancy_history():
+    """
+    Returns the process-wide VacancyHistory, or None when VACANCY_HISTORY_DIR is not set.
+    """
+    global _history
+    directory = os.environ.get(VACANCY_HISTORY_DIR_ENV)
+    if not directory:
+        return None
+    with _history_lock:
+        if _history is None or _history.directory != directory:
+            _history = VacancyHistory(directory)
+        return _history
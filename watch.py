@@ -0,0 +1,223 @@
+"""
+Watch mode: polls one chart (train, date, boarding) and reports only what changed.
+
+Each poll is a normal scan with a coach cache, so coaches whose coachComposition
+payload hashes the same as last time are neither decoded nor parsed. Vacancies added
+or removed since the previous poll are sent to a callback and/or a local webhook:
+
+    python watch.py 12627 2025-12-15 SBC --interval 120 --webhook http://localhost:9000/chart
+"""
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import datetime
+import threading
+
+# Limits for watchers started from the app
+WATCH_INTERVAL_ENV = "WATCH_INTERVAL_SECONDS"
+WATCH_MAX_MINUTES_ENV = "WATCH_MAX_MINUTES"
+
+VACANCY_KEY = ("Coach", "Berth", "Type", "From", "To")
+
+def _vacancy_key(v):
+    return tuple(v.get(k) for k in VACANCY_KEY)
+
+def vacancy_diff(before, after, coaches=None):
+    """
+    Vacancies in `after` but not `before` (added) and the reverse (removed), in
+    `after` / `before` order. coaches: Only compare these coaches.
+    """
+    if coaches is not None:
+        coaches = set(coaches)
+        before = [v for v in before if v["Coach"] in coaches]
+        after = [v for v in after if v["Coach"] in coaches]
+    before_keys = {_vacancy_key(v) for v in before}
+    after_keys = {_vacancy_key(v) for v in after}
+    added = [v for v in after if _vacancy_key(v) not in before_keys]
+    removed = [v for v in before if _vacancy_key(v) not in after_keys]
+    return added, removed
+
+def post_webhook(url, payload, timeout=5):
+    """
+    POSTs payload as JSON. Failures are logged, never raised: a dead receiver must not stop the watch.
+    """
+    import urllib.request
+
+    request = urllib.request.Request(
+        url, data=json.dumps(payload, default=str).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+    except Exception as e:
+        logging.warning(f"Watch webhook {url} failed: {e}")
+
+class ChartWatcher:
+    """
+    Polls a chart every `interval` seconds (with +-10% jitter) until stopped or
+    max_duration passes. Each poll that changes anything produces a diff dict:
+    {train_no, journey_date, boarding, poll, ts, added, removed, changed_coaches, missing}
+    passed to on_diff(diff) and POSTed to webhook_url. The first poll only sets the
+    baseline, unless an earlier ScanResult of the chart is given as `baseline`.
+    alive: Optional callable checked before each poll; the watch stops once it
+    returns False, e.g. when the UI session that started it has gone.
+    """
+    def __init__(self, train_no, journey_date, boarding_stn_code, interval=120, on_diff=None,
+                 webhook_url=None, max_duration=None, headless=True, baseline=None, scan=None, alive=None):
+        self.train_no = train_no
+        self.journey_date = journey_date
+        self.boarding_stn_code = boarding_stn_code
+        self.interval = interval
+        self.on_diff = on_diff
+        self.webhook_url = webhook_url
+        self.max_duration = max_duration
+        self.headless = headless
+        self.polls = 0
+        self.latest = baseline  # ScanResult of the last poll
+        self.error = None
+        self._scan = scan
+        self._alive = alive
+        self._coach_cache = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """
+        Scans once and returns the diff against the previous poll (None for the
+        baseline poll or when nothing changed).
+        """
+        if self._scan is None:
+            from scraper import scan_vacancies
+            self._scan = scan_vacancies
+
+        digests_before = {coach: digest for coach, (digest, _) in self._coach_cache.items()}
+        previous = self.latest
+        result = self._scan(
+            self.train_no, self.journey_date, self.boarding_stn_code,
+            headless=self.headless, previous=previous, coach_cache=self._coach_cache, cancel=self._stop
+        )
+        self.polls += 1
+        self.latest = result
+        if previous is None:
+            return None
+
+        # Coaches that failed this poll keep their old vacancies (carried over as stale),
+        # so only fetched coaches whose payload changed, or that left the chart, can differ
+        changed = []
+        for coach in result.coaches:
+            if coach in result.missing or coach in result.stale:
+                continue
+            if self._coach_cache.get(coach, (None,))[0] != digests_before.get(coach):
+                changed.append(coach)
+        changed += [c for c in previous.coaches if c not in result.coaches]
+        if not changed:
+            return None
+        added, removed = vacancy_diff(previous, result, coaches=changed)
+        if not added and not removed:
+            return None
+        return {
+            "train_no": self.train_no,
+            "journey_date": self.journey_date,
+            "boarding": self.boarding_stn_code,
+            "poll": self.polls,
+            "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "added": added,
+            "removed": removed,
+            "changed_coaches": changed,
+            "missing": list(result.missing)
+        }
+
+    def _emit(self, diff):
+        logging.info(
+            f"Chart {self.train_no} {self.journey_date} changed in {', '.join(diff['changed_coaches'])}: "
+            f"+{len(diff['added'])} / -{len(diff['removed'])} vacancies"
+        )
+        if self.on_diff:
+            try:
+                self.on_diff(diff)
+            except Exception as e:
+                logging.warning(f"Watch callback failed: {e}")
+        if self.webhook_url:
+            post_webhook(self.webhook_url, diff)
+
+    def run(self):
+        """
+        Polls until stop(), max_duration or alive() turning False. Blocks; see start()
+        for a background thread. stop() also cancels the poll in progress.
+        """
+        from scraper import ScanCancelled
+
+        ends = time.monotonic() + self.max_duration if self.max_duration else None
+        while not self._stop.is_set():
+            if self._alive is not None and not self._alive():
+                logging.info(f"Watch of {self.train_no} {self.journey_date} stopped: its session ended.")
+                break
+            try:
+                diff = self.poll()
+                self.error = None
+                if diff:
+                    self._emit(diff)
+            except ScanCancelled:
+                break
+            except Exception as e:
+                self.error = str(e)
+                logging.error(f"Watch poll of {self.train_no} failed: {e}")
+            if ends is not None and time.monotonic() >= ends:
+                logging.info(f"Watch of {self.train_no} {self.journey_date} reached its time limit.")
+                break
+            self._stop.wait(self.interval * random.uniform(0.9, 1.1))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=f"watch-{self.train_no}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+def app_watcher(train_no, journey_date, boarding_stn_code, on_diff, baseline=None, headless=True, alive=None):
+    """
+    A started watcher with the pod's interval and lifetime limits, for a UI session.
+    alive: Whether that session is still connected; the watcher stops once it is not.
+    """
+    return ChartWatcher(
+        train_no, journey_date, boarding_stn_code, on_diff=on_diff, headless=headless, baseline=baseline, alive=alive,
+        interval=float(os.environ.get(WATCH_INTERVAL_ENV, "120")),
+        max_duration=float(os.environ.get(WATCH_MAX_MINUTES_ENV, "120")) * 60
+    ).start()
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll a chart and report vacancies added or removed.")
+    parser.add_argument("train_no")
+    parser.add_argument("journey_date", help="YYYY-MM-DD")
+    parser.add_argument("boarding", help="Boarding station code")
+    parser.add_argument("--interval", type=float, default=120, help="Seconds between polls")
+    parser.add_argument("--duration", type=float, default=0, help="Stop after this many minutes (0 = until interrupted)")
+    parser.add_argument("--webhook", help="POST each diff as JSON to this URL")
+    args = parser.parse_args()
+
+    def print_diff(diff):
+        for v in diff["added"]:
+            print(f"+ {v['Coach']} {v['Berth']} ({v['Type']}) {v['From']} -> {v['To']}")
+        for v in diff["removed"]:
+            print(f"- {v['Coach']} {v['Berth']} ({v['Type']}) {v['From']} -> {v['To']}")
+
+    watcher = ChartWatcher(
+        args.train_no, args.journey_date, args.boarding, interval=args.interval,
+        on_diff=print_diff, webhook_url=args.webhook, max_duration=args.duration * 60 or None
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+if __name__ == "__main__":
+    main()